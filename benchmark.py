@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+"""Measure scanner throughput against a simulated game API
+
+Runs the overseer, workers, database processor and notifier end to end
+without accounts, proxies, hashing keys or network access, using the map
+and settings from config.py. Everything written goes to a temporary
+directory and database unless --directory or --db are given.
+"""
+
+import monocle.sanitized as conf
+
+from argparse import ArgumentParser
+from asyncio import gather, sleep, Task, wait_for, TimeoutError
+from json import dump
+from logging import WARNING
+from os.path import join
+from statistics import mean
+from tempfile import mkdtemp
+from time import monotonic, process_time
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--duration', type=float, default=300,
+                        help='Seconds to measure for, after the warmup')
+    parser.add_argument('--warmup', type=float, default=30,
+                        help='Seconds to run before measuring, to let workers log in')
+    parser.add_argument('--directory',
+                        help='Where to put pickles, logs and the database (default: a new temporary directory)')
+    parser.add_argument('--db', help='Database URL (default: SQLite in the directory)')
+    parser.add_argument('--spawn-density', type=float, default=50,
+                        help='Spawn points per square kilometer')
+    parser.add_argument('--fort-density', type=float, default=5,
+                        help='Forts per square kilometer')
+    parser.add_argument('--latency', type=float, default=0.3,
+                        help='Mean response time in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='Standard deviation of the response time')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests that fail')
+    parser.add_argument('--captcha-rate', type=float, default=0.0,
+                        help='Fraction of requests that trigger a CAPTCHA')
+    parser.add_argument('--hashes-per-minute', type=int, default=1500)
+    parser.add_argument('--spare-accounts', type=int, default=None,
+                        help='Accounts in addition to one per worker (default: a quarter of the workers)')
+    parser.add_argument('--scan-delay', type=float, default=None,
+                        help='Override the minimum delay between visits of a worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bootstrap', action='store_true',
+                        help='Bootstrap even if spawns are known')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        default=WARNING)
+    return parser.parse_args()
+
+
+def configure(args):
+    """Point the configuration at the benchmark directory and fake accounts
+
+    Must be done before any other monocle module is imported, since many of
+    them read the configuration at import time.
+    """
+    directory = args.directory or mkdtemp(prefix='monocle-benchmark-')
+    workers = conf.GRID[0] * conf.GRID[1]
+    spare = args.spare_accounts if args.spare_accounts is not None else max(workers // 4, 1)
+
+    conf.DIRECTORY = directory
+    conf.DB_ENGINE = args.db or 'sqlite:///' + join(directory, 'benchmark.db')
+    conf.ACCOUNTS = tuple(('simulated{}'.format(i), 'password', 'ptc')
+                          for i in range(workers + spare))
+    conf.ACCOUNTS_CSV = None
+    conf.CAPTCHA_KEY = None
+    conf.GOOGLE_MAPS_KEY = None
+    conf.PROXIES = None
+    conf.MANAGER_ADDRESS = None
+    conf.LEASE_PARTITIONS = False
+    return directory
+
+
+def create_altitudes():
+    """Store made-up altitudes so that none are fetched"""
+    from cyrandom import uniform
+    from monocle import bounds
+    from monocle.utils import dump_pickle, float_range, round_coords
+
+    step = 1 / (10 ** conf.ALT_PRECISION)
+    altitudes = {}
+    for lat in float_range(bounds.south, bounds.north + step, step):
+        for lon in float_range(bounds.west, bounds.east + step, step):
+            altitudes[round_coords((lat, lon), conf.ALT_PRECISION)] = uniform(*conf.ALT_RANGE)
+    dump_pickle('altitudes', {
+        'altitudes': altitudes,
+        'precision': conf.ALT_PRECISION,
+        'bounds_hash': hash(bounds)
+    })
+
+
+def snapshot(overseer):
+    from monocle import db_proc
+
+    return {
+        'time': monotonic(),
+        'cpu': process_time(),
+        'visits': overseer.visits,
+        'skipped': overseer.skipped,
+        'redundant': overseer.redundant,
+        'db_items': db_proc.count
+    }
+
+
+async def measure(overseer, simulator, warmup, duration, interval=1.0):
+    """Returns the results of running for duration after warmup"""
+    from monocle import db_proc
+
+    await sleep(warmup)
+    start = snapshot(overseer)
+    requests, errors, captchas = simulator.requests, simulator.errors, simulator.captchas
+    samples = []
+    while monotonic() < start['time'] + duration:
+        await sleep(interval)
+        samples.append(len(db_proc))
+    end = snapshot(overseer)
+
+    elapsed = end['time'] - start['time']
+    visits = end['visits'] - start['visits']
+    skipped = end['skipped'] - start['skipped']
+    cpu = end['cpu'] - start['cpu']
+    return {
+        'workers': len(overseer.workers),
+        'seconds': round(elapsed, 1),
+        'visits': visits,
+        'visits_per_second': round(visits / elapsed, 3),
+        'skipped': skipped,
+        'skip_rate': round(skipped / (visits + skipped), 4) if visits + skipped else 0.0,
+        'redundant': end['redundant'] - start['redundant'],
+        'cpu_seconds': round(cpu, 2),
+        'cpu_ms_per_visit': round(cpu / visits * 1000, 3) if visits else None,
+        'db_items': end['db_items'] - start['db_items'],
+        'db_queue_mean': round(mean(samples), 1) if samples else 0,
+        'db_queue_max': max(samples) if samples else 0,
+        'requests': simulator.requests - requests,
+        'errors': simulator.errors - errors,
+        'captchas': simulator.captchas - captchas,
+        'notifications': simulator.notifications
+    }
+
+
+def print_results(results):
+    print('{workers} workers for {seconds}s\n'
+          'Visits: {visits} ({visits_per_second}/s), skipped: {skipped} ({skip_rate:.1%}), '
+          'unnecessary: {redundant}\n'
+          'CPU: {cpu_seconds}s, {cpu_ms_per_visit}ms per visit\n'
+          'DB items: {db_items}, queue mean: {db_queue_mean}, max: {db_queue_max}, '
+          'drained in {db_drain_seconds}s\n'
+          'Requests: {requests}, errors: {errors}, CAPTCHAs: {captchas}, '
+          'notifications: {notifications}'.format(**results))
+
+
+def main():
+    args = parse_args()
+    directory = configure(args)
+    create_altitudes()
+
+    from aiopogo import close_sessions
+    from scan import LocalManager, exception_handler, configure_logger
+    from monocle.shared import LOOP, get_logger, SessionManager
+    from monocle.db import Base, _engine, GYM_CACHE, RAID_CACHE, POKESTOP_CACHE
+    from monocle.overseer import Overseer
+    from monocle.simulator import Simulator, SpawnField
+    from monocle.worker import Worker
+    from monocle import db_proc
+
+    configure_logger(filename=join(directory, 'benchmark.log'))
+    get_logger().setLevel(args.log_level)
+    LOOP.set_exception_handler(exception_handler)
+    Base.metadata.create_all(_engine)
+    if args.scan_delay is not None:
+        Worker.scan_delay = args.scan_delay
+
+    print('Generating the spawn field, writing to {}'.format(directory))
+    simulator = Simulator(
+        SpawnField(args.spawn_density, args.fort_density, seed=args.seed),
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        captcha_rate=args.captcha_rate, hashes_per_minute=args.hashes_per_minute,
+        seed=args.seed)
+    simulator.install()
+
+    overseer = Overseer(LocalManager())
+    simulator.silence_notifier(overseer.notifier)
+    overseer.start(False)
+    RAID_CACHE.preload()
+    POKESTOP_CACHE.preload()
+    GYM_CACHE.preload()
+
+    launcher = LOOP.create_task(overseer.launch(args.bootstrap, False))
+    print('Warming up for {:.0f}s, then measuring for {:.0f}s'.format(args.warmup, args.duration))
+    try:
+        output = LOOP.run_until_complete(
+            measure(overseer, simulator, args.warmup, args.duration))
+    except KeyboardInterrupt:
+        print('Interrupted, stopping early.')
+        output = None
+    finally:
+        launcher.cancel()
+        overseer.running = False
+        pending = gather(*Task.all_tasks(loop=LOOP), return_exceptions=True)
+        try:
+            LOOP.run_until_complete(wait_for(pending, 40))
+        except TimeoutError:
+            print('Coroutine completion timed out, moving on.')
+        LOOP.run_until_complete(overseer.cleanup())
+
+        # how long it takes to save what was still queued is the database lag
+        drain_start = monotonic()
+        db_proc.stop()
+        db_proc.join()
+        drain_time = monotonic() - drain_start
+
+        SessionManager.close()
+        close_sessions()
+        LOOP.close()
+
+    if output is None:
+        return
+    output['db_drain_seconds'] = round(drain_time, 2)
+    print_results(output)
+    if args.json:
+        with open(args.json, 'wt') as f:
+            dump(output, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
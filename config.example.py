@@ -55,6 +55,14 @@ SIMULTANEOUS_LOGINS = 4
 # Limit the number of workers simulating the app startup process simultaneously.
 SIMULTANEOUS_SIMULATION = 10
 
+# Skip the app simulation when logging in accounts that made a request within
+# the last x seconds, e.g. when restarting, as if the app had been resumed.
+# 600 (10 minutes) is a sensible value, 0 always simulates the app startup.
+#RESUME_SESSIONS = 0
+# Log in every worker at startup instead of on its first visit, starting with
+# the accounts that will be quickest to log in
+#STARTUP_RAMP = False
+
 # Immediately select workers whose speed are below (SPEED_UNIT)p/h instead of
 # continuing to try to find the worker with the lowest speed.
 # May increase clustering if you have a high density of workers.
@@ -81,11 +89,19 @@ SEARCH_SLEEP = 2.5
 # value: how many requests to keep as spare (0.1 = 10%), False to disable
 #SMART_THROTTLE = 0.1
 
+# Hand out hashes to requests in order of priority, holding back a share of
+# the remaining hashes for more important requests as the quota runs low:
+# known spawns > encounters > mysteries > fort details > spins and items
+#HASH_BUDGET = False
+
 # Swap the worker that has seen the fewest Pokémon every x seconds
 # Defaults to whatever will allow every worker to be swapped within 6 hours
 #SWAP_OLDEST = 300  # 5 minutes
 # Only swap if it's been active for more than x minutes
 #MINIMUM_RUNTIME = 10
+# Keep this many extra accounts logged in and through the app simulation in
+# the background, so that swapped in accounts can start scanning immediately
+#SPARE_ACCOUNTS = 0
 
 ### these next 6 options use more requests but look more like the real client
 APP_SIMULATION = True     # mimic the actual app's login requests
@@ -100,12 +116,30 @@ INCUBATE_EGGS = True      # incubate eggs if available
 # None will never encounter Pokémon
 ENCOUNTER = None
 #ENCOUNTER_IDS = (3, 6, 9, 45, 62, 71, 80, 85, 87, 89, 91, 94, 114, 130, 131, 134)
+# hand encounters to the nearest idle worker instead of encountering during the visit
+#ENCOUNTER_DISPATCH = False
+# seconds to wait for a dispatched encounter before saving and notifying without it
+#ENCOUNTER_TIMEOUT = 20
 
 # PokéStops
 SPIN_POKESTOPS = True  # spin all PokéStops that are within range
 SPIN_COOLDOWN = 300    # spin only one PokéStop every n seconds (default 300)
 LURE_DURATION = 1800 # lure duration (default 30mn)
 
+# Save new forts right away and fetch their names, images and descriptions
+# later, with idle workers near them, instead of during the visit.
+#DEFER_FORT_DETAILS = False
+# maximum number of deferred fort details fetched per minute
+#FORT_DETAILS_RATE = 30
+
+# Remember the forts of every map cell once nothing is left to save for them,
+# and skip them in later responses until they change.
+#FORT_FINGERPRINTS = False
+# Also request every cell with the timestamp of its last response instead of
+# 0. Experimental: the status screen compares the number of forts returned for
+# those cells with the number already known, to see if the game trims them.
+#GMO_SINCE_TIMESTAMPS = False
+
 # minimum number of each item to keep if the bag is cleaned
 # bag cleaning is disabled if this is not present or is commented out
 ''' # triple quotes are comments, remove them to use this ITEM_LIMITS example
@@ -144,6 +178,10 @@ LOGIN_TIMEOUT = 2.5
 # add spawn points reported in cell_ids to the unknown spawns list
 #MORE_POINTS = False
 
+# append every raw GetMapObjects response to this gzipped file, to be
+# replayed later with replay.py
+#GMO_CAPTURE = 'captures.gmo.gz'
+
 # Set to True to kill the scanner when a newer version is forced
 #FORCED_KILL = False
 
@@ -189,6 +227,7 @@ REPORT_MAPS = True  # Show maps on reports
 
 ## Round altitude coordinates to this many decimal places
 ## More precision will lead to larger caches and more Google API calls
+## With NumPy, altitudes between the rounded coordinates are interpolated
 ## Maximum distance from coords to rounded coords for precisions (at Lat40):
 ## 1: 7KM, 2: 700M, 3: 70M, 4: 7M
 #ALT_PRECISION = 2
@@ -202,6 +241,8 @@ REPORT_MAPS = True  # Show maps on reports
 
 # allow displaying the live location of workers on the map
 MAP_WORKERS = True
+# seconds between updates of the worker positions read by the web server
+#MAP_WORKERS_REFRESH = 5
 # filter these Pokemon from the map to reduce traffic and browser load
 #MAP_FILTER_IDS = [161, 165, 16, 19, 167]
 
@@ -232,7 +273,8 @@ FAILURES_ALLOWED = 2
 #MANAGER_ADDRESS = ('127.0.0.1', 5002)  # could be used for CAPTCHA solving and live worker maps on remote systems
 
 # Store the cell IDs so that they don't have to be recalculated every visit.
-# Enabling will (potentially drastically) increase memory usage.
+# They're kept in a table file in the pickles folder, which can be filled
+# ahead of time with scripts/precompute_cells.py.
 #CACHE_CELLS = False
 
 # Only for use with web_sanic (requires PostgreSQL)
@@ -244,6 +286,36 @@ FAILURES_ALLOWED = 2
 # The number of coroutines that are allowed to run simultaneously.
 #COROUTINES_LIMIT = GRID[0] * GRID[1]
 
+# Adjust the number of simultaneous visits at runtime, starting from
+# COROUTINES_LIMIT, based on event loop lag and visit latency.
+# Every adjustment is logged.
+#ADAPTIVE_CONCURRENCY = False
+#COROUTINES_MIN = GRID[0] * GRID[1] // 4
+#COROUTINES_MAX = GRID[0] * GRID[1] * 2
+#LAG_TARGET = 0.05  # seconds of event loop lag to stay under
+
+# Watch the event loop from a helper thread and record the stack of any
+# callback that blocks it for longer than WATCHDOG_THRESHOLD seconds.
+# The slowest ones are shown on the status screen and written to
+# watchdog.txt (watchdog-<shard>.txt when sharded) in DIRECTORY every
+# STAT_REFRESH seconds.
+#LOOP_WATCHDOG = False
+#WATCHDOG_THRESHOLD = 0.25
+
+# Measure the latency, errors, pacing and retries of every type of request,
+# and the hashing and game server round-trips. The busiest requests are shown
+# on the status screen, and everything is written to rpc_stats.prom in
+# DIRECTORY every STAT_REFRESH seconds in the Prometheus text format.
+#RPC_STATS = False
+
+## Share one scan area between several machines using the same database.
+## Each node claims leases on S2 cells of the MAP_START/MAP_END rectangle,
+## renews them while running, and takes over cells whose leases expired.
+#LEASE_PARTITIONS = False
+#LEASE_DURATION = 120  # seconds before an unrenewed lease can be claimed by another node
+#LEASE_LEVEL = 13      # S2 cell level of each partition
+#NODE_NAME = None      # unique name of this node, defaults to hostname-pid
+
 ### FRONTEND CONFIGURATION
 LOAD_CUSTOM_HTML_FILE = False # File path MUST be 'templates/custom.html'
 LOAD_CUSTOM_CSS_FILE = False  # File path MUST be 'static/css/custom.css'
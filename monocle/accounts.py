@@ -0,0 +1,80 @@
+import sqlite3
+
+from os import makedirs
+from os.path import dirname
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+
+
+class AccountStore(dict):
+    """Accounts by username, persisted incrementally to an SQLite database
+
+    Behaves like the dict it replaces, but remembers which accounts were
+    assigned or deleted since the last save so that only those are written.
+    Accounts that are modified in place must be assigned again to be saved.
+    """
+    def __init__(self, path):
+        super().__init__()
+        self.path = str(path)
+        self.changed = set()
+        self.removed = set()
+        connection = self.connect()
+        try:
+            for username, account in connection.execute('SELECT username, account FROM accounts'):
+                dict.__setitem__(self, username, loads(account))
+        finally:
+            connection.close()
+
+    def __setitem__(self, username, account):
+        dict.__setitem__(self, username, account)
+        self.changed.add(username)
+        self.removed.discard(username)
+
+    def __delitem__(self, username):
+        dict.__delitem__(self, username)
+        self.changed.discard(username)
+        self.removed.add(username)
+
+    def connect(self):
+        makedirs(dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS accounts '
+                           '(username TEXT PRIMARY KEY, account BLOB NOT NULL)')
+        return connection
+
+    def replace(self, accounts):
+        """Replace the contents of the store with accounts, marking all as changed"""
+        for username in set(self) - set(accounts):
+            del self[username]
+        for username, account in accounts.items():
+            self[username] = account
+
+    def changes(self):
+        """Serialize the accounts changed since the last call
+
+        Returns what has to be passed to write(). Should be called from the
+        thread that modifies the accounts, the writing can happen elsewhere.
+        """
+        changed, self.changed = self.changed, set()
+        removed, self.removed = self.removed, set()
+        rows = [(username, dumps(self[username], HIGHEST_PROTOCOL))
+                for username in changed if username in self]
+        return rows, removed
+
+    def write(self, changes):
+        """Write changes to the database in a single transaction"""
+        rows, removed = changes
+        if not rows and not removed:
+            return
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO accounts (username, account) VALUES (?, ?)', rows)
+                connection.executemany(
+                    'DELETE FROM accounts WHERE username = ?', ((x,) for x in removed))
+        finally:
+            connection.close()
+
+    def save(self):
+        self.write(self.changes())
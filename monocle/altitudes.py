@@ -1,6 +1,8 @@
 import sys
 
-from asyncio import gather, CancelledError
+from math import ceil, floor
+from os import makedirs
+from os.path import exists, join
 from statistics import mean
 
 from aiohttp import ClientSession
@@ -12,6 +14,11 @@ from . import bounds, sanitized as conf
 from .shared import get_logger, LOOP, run_threaded
 from .utils import dump_pickle, float_range, load_pickle, round_coords
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Altitudes:
     """Manage altitudes"""
@@ -21,25 +28,40 @@ class Altitudes:
         self.log = get_logger('altitudes')
         self.changed = False
         self.load()
-        if len(self.altitudes) > 5:
+        if len(self) > 5:
             self.fallback = self.average
         else:
             self.fallback = self.random
 
-    async def get_all(self):
-        self.log.info('Fetching all altitudes')
+    def __len__(self):
+        return len(self.altitudes)
 
-        coords = self.get_coords()
+    async def fill(self, key=conf.GOOGLE_MAPS_KEY):
+        """Fetch the missing altitudes in the background
 
+        Progress is saved after every chunk, so a restart resumes with the
+        altitudes that are still missing. Lookups use fallback altitudes
+        until then.
+        """
+        coords = await run_threaded(self.get_coords)
+        if not coords:
+            return
+        if not key:
+            self.log.warning('{} altitudes are unknown, set GOOGLE_MAPS_KEY to fetch them.', len(coords))
+            return
+        self.log.info('Fetching {} altitudes in the background.', len(coords))
         async with ClientSession(loop=LOOP) as session:
-            if len(coords) < 300:
-                await self.fetch_alts(coords, session)
-            else:
-                tasks = [self.fetch_alts(chunk, session)
-                         for chunk in self.chunks(coords)]
-                await gather(*tasks, loop=LOOP)
-        self.changed = True
-        LOOP.create_task(run_threaded(self.pickle))
+            for chunk in self.chunks(coords):
+                await self.fetch_alts(chunk, session)
+                self.changed = True
+                await run_threaded(self.pickle)
+        if len(self) > 5:
+            self.fallback = self.average
+            try:
+                del self.mean
+            except AttributeError:
+                pass
+        self.log.info('Finished fetching altitudes, {} are known.', len(self))
 
     async def fetch_alts(self, coords, session, precision=conf.ALT_PRECISION):
         try:
@@ -51,8 +73,8 @@ class Altitudes:
                 response = await resp.json(loads=json_loads)
             for r in response['results']:
                 coords = round_coords((r['location']['lat'], r['location']['lng']), precision)
-                self.altitudes[coords] = r['elevation']
-            if not self.altitudes:
+                self.set(coords, r['elevation'])
+            if not self:
                 self.log.error(response['error_message'])
         except Exception:
             self.log.exception('Error fetching altitudes.')
@@ -62,74 +84,35 @@ class Altitudes:
         alt = self.altitudes[point]
         return randomize(alt - 2.5, alt + 2.5)
 
-    async def fetch(self, point, key=conf.GOOGLE_MAPS_KEY):
-        if not key:
-            return self.fallback()
-        try:
-            async with ClientSession(loop=LOOP) as session:
-                async with session.get(
-                        'https://maps.googleapis.com/maps/api/elevation/json',
-                        params={'locations': '{0[0]},{0[1]}'.format(point),
-                                'key': key},
-                        timeout=10) as resp:
-                    response = await resp.json(loads=json_loads)
-                    altitude = response['results'][0]['elevation']
-                    self.altitudes[point] = altitude
-                    self.changed = True
-                    return altitude
-        except CancelledError:
-            raise
-        except Exception:
-            try:
-                self.log.error(response['error_message'])
-            except (KeyError, NameError):
-                self.log.error('Error fetching altitude for {}.', point)
-            return self.fallback()
+    def set(self, point, altitude):
+        self.altitudes[point] = altitude
 
     def average(self, randomize=uniform):
         self.log.info('Fell back to average altitude.')
         try:
             return randomize(self.mean - 15.0, self.mean + 15.0)
         except AttributeError:
-            self.mean = mean(self.altitudes.values())
+            self.mean = self.mean_altitude()
             return self.average()
 
+    def mean_altitude(self):
+        return mean(self.altitudes.values())
+
     def random(self, alt_range=conf.ALT_RANGE, randomize=uniform):
         self.log.info('Fell back to random altitude.')
         return randomize(*conf.ALT_RANGE)
 
     def load(self):
-        try:
-            state = load_pickle('altitudes', raise_exception=True)
-        except FileNotFoundError:
-            self.log.info('No altitudes pickle found.')
-            self.altitudes = {}
-            LOOP.run_until_complete(self.get_all())
-            return
-
-        if state['bounds_hash'] == hash(bounds):
-            if state['precision'] == conf.ALT_PRECISION and state['altitudes']:
-                self.altitudes = state['altitudes']
-                return
-            elif state['precision'] < conf.ALT_PRECISION:
-                self.altitudes = state['altitudes']
-                LOOP.run_until_complete(self.get_all())
-                return
-        elif state['precision'] <= conf.ALT_PRECISION:
-            pickled_alts = state['altitudes']
-
-            to_remove = []
-            for coords in pickled_alts.keys():
-                if coords not in bounds:
-                    to_remove.append(coords)
-            for key in to_remove:
-                del pickled_alts[key]
-
-            self.altitudes = pickled_alts
-            LOOP.run_until_complete(self.get_all())
-            return
         self.altitudes = {}
-        LOOP.run_until_complete(self.get_all())
+        state = load_pickle('altitudes')
+        if not state or state['precision'] > conf.ALT_PRECISION:
+            self.log.info('No usable altitudes pickle found.')
+        elif state['bounds_hash'] == hash(bounds):
+            self.altitudes = state['altitudes']
+        else:
+            self.altitudes = {coords: altitude
+                              for coords, altitude in state['altitudes'].items()
+                              if coords in bounds}
 
     def pickle(self):
         if self.changed:
@@ -149,12 +132,12 @@ class Altitudes:
             return coords
         step = 1 / (10 ** precision)
         west, east = bounds.west, bounds.east
-        existing = self.altitudes.keys() if self.altitudes else False
+        existing = self.altitudes.keys()
         for lat in float_range(bounds.south, bounds.north, step):
             for lon in float_range(west, east, step):
-                point = lat, lon
-                if not existing or point not in existing:
-                    coords.append(round_coords(point, precision))
+                point = round_coords((lat, lon), precision)
+                if point not in existing:
+                    coords.append(point)
         return coords
 
     @staticmethod
@@ -164,4 +147,101 @@ class Altitudes:
             yield l[i:i + n]
 
 
-sys.modules[__name__] = Altitudes()
+class AltitudeGrid(Altitudes):
+    """Altitudes of a grid of points covering the bounds, in a NumPy array
+
+    Points are ALT_PRECISION decimal places apart, unknown altitudes are NaN.
+    The array is memory-mapped from an .npy file in the pickles folder, so it
+    is saved as it is filled in. Altitudes between points are interpolated
+    from the four surrounding ones.
+    """
+    __slots__ = ('grid', 'scale', 'lat0', 'lon0', 'rows', 'columns')
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.grid)))
+
+    def get(self, point, randomize=uniform):
+        """Bilinear interpolation between the known altitudes around point"""
+        y = point[0] * self.scale - self.lat0
+        x = point[1] * self.scale - self.lon0
+        if not (0 <= y <= self.rows - 1 and 0 <= x <= self.columns - 1):
+            raise KeyError(point)
+        row = min(int(y), self.rows - 2) if self.rows > 1 else 0
+        column = min(int(x), self.columns - 2) if self.columns > 1 else 0
+        dy = y - row
+        dx = x - column
+        block = self.grid[row:row + 2, column:column + 2]
+        total = weights = 0.0
+        for i, wy in enumerate((1 - dy, dy)[:block.shape[0]]):
+            for j, wx in enumerate((1 - dx, dx)[:block.shape[1]]):
+                alt = float(block[i, j])
+                if alt == alt:  # not NaN
+                    total += alt * wy * wx
+                    weights += wy * wx
+        if weights:
+            alt = total / weights
+        elif np.isnan(block).all():
+            raise KeyError(point)
+        else:
+            # only known where the weights are zero
+            alt = float(np.nanmean(block))
+        return randomize(alt - 2.5, alt + 2.5)
+
+    def set(self, point, altitude):
+        row = round(point[0] * self.scale) - self.lat0
+        column = round(point[1] * self.scale) - self.lon0
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            self.grid[row, column] = altitude
+
+    def mean_altitude(self):
+        return float(np.nanmean(self.grid))
+
+    def load(self, precision=conf.ALT_PRECISION):
+        self.scale = 10 ** precision
+        self.lat0 = floor(bounds.south * self.scale)
+        self.lon0 = floor(bounds.west * self.scale)
+        self.rows = ceil(bounds.north * self.scale) - self.lat0 + 1
+        self.columns = ceil(bounds.east * self.scale) - self.lon0 + 1
+
+        folder = join(conf.DIRECTORY, 'pickles')
+        makedirs(folder, exist_ok=True)
+        path = join(folder, 'altitudes_{}_{}_{}x{}_{}.npy'.format(
+            self.lat0, self.lon0, self.rows, self.columns, precision))
+        if exists(path):
+            self.grid = np.load(path, mmap_mode='r+')
+            if self.grid.shape == (self.rows, self.columns):
+                return
+        self.grid = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.float32, shape=(self.rows, self.columns))
+        self.grid.fill(np.nan)
+
+        try:
+            state = load_pickle('altitudes', raise_exception=True)
+            for point, altitude in state['altitudes'].items():
+                self.set(point, altitude)
+            self.log.info('Imported {} altitudes from the old pickle.', len(self))
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            pass
+
+    def pickle(self):
+        self.grid.flush()
+        self.changed = False
+
+    def get_coords(self, bounds=bounds, precision=conf.ALT_PRECISION):
+        """Returns the grid points in bounds with unknown altitudes"""
+        if bounds.multi:
+            coords = []
+            for b in bounds.polygons:
+                coords.extend(self.get_coords(b))
+            return coords
+        south = max(floor(bounds.south * self.scale) - self.lat0, 0)
+        west = max(floor(bounds.west * self.scale) - self.lon0, 0)
+        north = ceil(bounds.north * self.scale) - self.lat0 + 1
+        east = ceil(bounds.east * self.scale) - self.lon0 + 1
+        missing = np.argwhere(np.isnan(self.grid[south:north, west:east]))
+        return [round_coords(((self.lat0 + south + row) / self.scale,
+                              (self.lon0 + west + column) / self.scale), precision)
+                for row, column in missing.tolist()]
+
+
+sys.modules[__name__] = Altitudes() if np is None else AltitudeGrid()
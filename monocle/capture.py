@@ -0,0 +1,64 @@
+"""Capture raw GetMapObjects responses to a file and read them back
+
+Each record is a header with the time of the response and the point it was
+requested for, followed by the serialized response. Records are written to
+a gzip file, which may consist of several members if it was appended to.
+"""
+
+from gzip import open as gzip_open
+from queue import Queue
+from struct import Struct
+from threading import Thread
+from time import time
+
+from .shared import get_logger
+
+# timestamp, latitude, longitude, length of the response that follows
+HEADER = Struct('<dddI')
+
+
+class GMORecorder(Thread):
+    """Appends responses to a capture file from a separate thread"""
+    def __init__(self, path):
+        super().__init__(name='gmo-recorder', daemon=True)
+        self.path = path
+        self.queue = Queue()
+        self.log = get_logger('recorder')
+        self.count = 0
+
+    def add(self, point, map_objects):
+        self.queue.put((time(), point, map_objects.SerializeToString()))
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        with gzip_open(self.path, 'ab') as f:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                timestamp, point, raw = item
+                try:
+                    f.write(HEADER.pack(timestamp, point[0], point[1], len(raw)))
+                    f.write(raw)
+                    self.count += 1
+                except Exception as e:
+                    self.log.exception('A wild {} appeared while capturing a response!', e.__class__.__name__)
+        self.log.warning('Captured {} GetMapObjects responses to {}.', self.count, self.path)
+
+
+def read_captures(path):
+    """Yields (timestamp, point, raw response) for every captured response"""
+    with gzip_open(path, 'rb') as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            timestamp, lat, lon, length = HEADER.unpack(header)
+            raw = f.read(length)
+            if len(raw) < length:
+                # the capture was cut off while this record was being written
+                return
+            yield timestamp, (lat, lon), raw
@@ -0,0 +1,183 @@
+from array import array, typecodes
+from functools import lru_cache
+from math import ceil, floor
+from mmap import mmap
+from os import fstat, makedirs
+from os.path import join
+from struct import Struct
+
+from .shared import get_logger
+from .utils import round_coords
+from . import bounds, sanitized as conf
+
+COUNT = Struct('Q') if 'Q' in typecodes else None
+
+
+class CellTable:
+    """Cell IDs of the points of the map at 4 decimal places
+
+    Every point of a grid covering the bounds has a fixed-size slot in a
+    memory-mapped file, holding the number of cell IDs followed by the IDs.
+    Slots are filled the first time a point is looked up, or all at once by
+    fill(), and persist across runs. The pages are shared by every process
+    scanning the same map. Points outside of the bounds, and the rare ones
+    with more cell IDs than fit in a slot, are kept in an LRU cache instead.
+    """
+    def __init__(self, get_cell_ids, width=24, cache_size=8192, max_size=2 ** 30):
+        self.log = get_logger('cells')
+        self.get_cell_ids = get_cell_ids
+        self.fallback = lru_cache(maxsize=cache_size)(get_cell_ids)
+        self.width = width
+        self.slot_size = width * 8
+        self.lat0 = floor(bounds.south * 10000)
+        self.lon0 = floor(bounds.west * 10000)
+        self.rows = ceil(bounds.north * 10000) - self.lat0 + 1
+        self.columns = ceil(bounds.east * 10000) - self.lon0 + 1
+        self.map = None
+
+        size = self.rows * self.columns * self.slot_size
+        if COUNT is None:
+            self.log.warning('64-bit arrays are not supported, only caching recent cell IDs.')
+        elif size > max_size:
+            self.log.warning('The map is too large for a cell ID table ({:.1f} GiB), '
+                             'only caching recent cell IDs.', size / 2 ** 30)
+        else:
+            self.map = self.open(size)
+
+    def open(self, size):
+        folder = join(conf.DIRECTORY, 'pickles')
+        makedirs(folder, exist_ok=True)
+        path = join(folder, 'cells_{}_{}_{}x{}x{}.table'.format(
+            self.lat0, self.lon0, self.rows, self.columns, self.width))
+        with open(path, 'a+b') as f:
+            if fstat(f.fileno()).st_size != size:
+                # unfilled slots are zero, on most systems without using disk space
+                f.truncate(size)
+            return mmap(f.fileno(), size)
+
+    def slot(self, point):
+        """Returns the offset of the slot of a rounded point, or None if it has none"""
+        row = round(point[0] * 10000) - self.lat0
+        column = round(point[1] * 10000) - self.lon0
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return (row * self.columns + column) * self.slot_size
+
+    def get(self, point):
+        rounded = round_coords(point, 4)
+        if self.map is None:
+            return self.fallback(rounded)
+        offset = self.slot(rounded)
+        if offset is None:
+            return self.fallback(rounded)
+
+        count, = COUNT.unpack_from(self.map, offset)
+        if count >= self.width:
+            return self.fallback(rounded)
+        elif count:
+            cells = array('Q')
+            cells.frombytes(self.map[offset + 8:offset + 8 + count * 8])
+            return cells
+        cells = self.get_cell_ids(rounded)
+        return self.store(offset, cells) or self.fallback(rounded)
+
+    def store(self, offset, cells):
+        count = len(cells)
+        if count >= self.width:
+            # too many to fit, marked so that they're looked up in the LRU cache
+            COUNT.pack_into(self.map, offset, self.width)
+            return None
+        cells = array('Q', cells)
+        # the count goes last so that other processes never see a partial slot
+        self.map[offset + 8:offset + 8 + count * 8] = cells.tobytes()
+        COUNT.pack_into(self.map, offset, count)
+        return cells
+
+    def fill(self):
+        """Calculate the cell IDs of every point that doesn't have them yet"""
+        if self.map is None:
+            return 0
+        filled = 0
+        for row in range(self.rows):
+            lat = (self.lat0 + row) / 10000
+            for column in range(self.columns):
+                offset = (row * self.columns + column) * self.slot_size
+                if not COUNT.unpack_from(self.map, offset)[0]:
+                    point = lat, (self.lon0 + column) / 10000
+                    self.store(offset, self.get_cell_ids(point))
+                    filled += 1
+        self.map.flush()
+        return filled
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+
+
+class CellState:
+    __slots__ = ('timestamp', 'forts')
+
+    def __init__(self):
+        # current_timestamp_ms of the last response that included the cell
+        self.timestamp = 0
+        # fort ID: fingerprint of the fort when nothing was left to do for it
+        self.forts = {}
+
+
+class CellFingerprints:
+    """What every map cell looked like the last time it was processed
+
+    Forts are recorded once they are cached with their details, so a fort
+    that comes back with the same fingerprint can be skipped with a single
+    lookup. The cells' timestamps can be sent as since_timestamp_ms, and the
+    number of forts in the responses to those requests is compared with the
+    number already known, to see whether the game trims them.
+    """
+    def __init__(self):
+        # cell ID: CellState
+        self.cells = {}
+        self.processed = 0
+        self.skipped = 0
+        # cells requested with a timestamp, forts returned for them,
+        # and forts that were already known in them
+        self.since_cells = 0
+        self.since_forts = 0
+        self.since_known = 0
+
+    def __len__(self):
+        return len(self.cells)
+
+    def since(self, cell_ids):
+        """Returns the last timestamp of every cell, 0 for unknown cells"""
+        cells = self.cells
+        return tuple(cells[c].timestamp if c in cells else 0 for c in cell_ids)
+
+    def get(self, map_cell, since=0):
+        """Returns the state of a cell in a response, updating its timestamp"""
+        try:
+            cell = self.cells[map_cell.s2_cell_id]
+        except KeyError:
+            cell = self.cells[map_cell.s2_cell_id] = CellState()
+        if since:
+            self.since_cells += 1
+            self.since_forts += len(map_cell.forts)
+            self.since_known += len(cell.forts)
+        if map_cell.current_timestamp_ms > cell.timestamp:
+            cell.timestamp = map_cell.current_timestamp_ms
+        return cell
+
+    @staticmethod
+    def fingerprint(fort):
+        if fort.type == 1:
+            lure = fort.lure_info
+            return fort.last_modified_timestamp_ms, lure.encounter_id, lure.lure_expires_timestamp_ms
+        raid = fort.raid_info
+        return fort.last_modified_timestamp_ms, raid.raid_end_ms, raid.raid_pokemon.pokemon_id
+
+    @property
+    def status(self):
+        line = 'Forts skipped as unchanged: {}/{} in {} cells'.format(
+            self.skipped, self.processed + self.skipped, len(self.cells))
+        if self.since_cells:
+            line += ', forts returned/known since timestamps: {}/{}'.format(
+                self.since_forts, self.since_known)
+        return line
@@ -0,0 +1,104 @@
+from asyncio import Semaphore
+from time import monotonic
+
+from . import sanitized as conf
+from .shared import get_logger, LOOP
+
+
+class AdaptiveSemaphore(Semaphore):
+    """Semaphore whose number of permits can be changed while in use
+
+    Shrinking takes free permits right away and withholds the rest as they
+    are released.
+    """
+    def __init__(self, value, *, loop):
+        super().__init__(value, loop=loop)
+        self.limit = value
+        self.debt = 0
+
+    def release(self):
+        if self.debt:
+            self.debt -= 1
+        else:
+            super().release()
+
+    def resize(self, limit):
+        difference = limit - self.limit
+        self.limit = limit
+        if difference > 0:
+            for _ in range(difference):
+                self.release()
+        elif difference < 0:
+            taken = min(self._value, -difference)
+            self._value -= taken
+            self.debt += -difference - taken
+
+
+class ConcurrencyController:
+    """AIMD controller for the number of simultaneous visits
+
+    Measures event loop lag and visit latency, cuts the permits by a quarter
+    when the loop falls behind, and adds one at a time while it keeps up and
+    visits are waiting.
+    """
+    def __init__(self, semaphore, pending, minimum=conf.COROUTINES_MIN,
+                 maximum=conf.COROUTINES_MAX, lag_target=conf.LAG_TARGET):
+        self.log = get_logger('concurrency')
+        self.semaphore = semaphore
+        # callable returning the number of visits waiting for a permit
+        self.pending = pending
+        self.minimum = minimum
+        self.maximum = maximum
+        self.lag_target = lag_target
+        self.lag = 0.0
+        self.latency = None
+        self.best_latency = None
+        self.expected = None
+
+    def start(self, probe_interval=0.25, adjust_interval=10):
+        self.probe_interval = probe_interval
+        self.expected = LOOP.time() + probe_interval
+        LOOP.call_later(probe_interval, self.probe)
+        LOOP.call_later(adjust_interval, self.adjust, adjust_interval)
+
+    def probe(self):
+        now = LOOP.time()
+        lag = max(now - self.expected, 0.0)
+        self.lag = self.lag * 0.8 + lag * 0.2
+        self.expected = now + self.probe_interval
+        LOOP.call_later(self.probe_interval, self.probe)
+
+    def record(self, latency):
+        """Record how long a visit took, from getting a permit to finishing"""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.latency * 0.9 + latency * 0.1
+
+    def adjust(self, interval):
+        limit = self.semaphore.limit
+        if self.latency is not None and (
+                self.best_latency is None or self.latency < self.best_latency):
+            self.best_latency = self.latency
+
+        if self.lag > self.lag_target:
+            new_limit = max(self.minimum, int(limit * 0.75))
+            reason = 'loop lag {:.3f}s over {:.3f}s target'.format(self.lag, self.lag_target)
+        elif (self.lag < self.lag_target / 2 and self.pending()
+                and (self.latency is None or self.latency < self.best_latency * 2)):
+            new_limit = min(self.maximum, limit + 1)
+            reason = '{} visits waiting, loop lag {:.3f}s'.format(self.pending(), self.lag)
+        else:
+            new_limit = limit
+
+        if new_limit != limit:
+            self.semaphore.resize(new_limit)
+            self.log.warning('Concurrency {} -> {}: {}, visit latency {}.',
+                             limit, new_limit, reason,
+                             '{:.1f}s'.format(self.latency) if self.latency is not None else 'unknown')
+        LOOP.call_later(interval, self.adjust, interval)
+
+    @property
+    def status(self):
+        return 'Concurrency: {}/{}-{}, loop lag: {:.0f}ms'.format(
+            self.semaphore.limit, self.minimum, self.maximum, self.lag * 1000)
@@ -11,6 +11,7 @@ from sqlalchemy.ext.declarative import declarative_base
 
 from . import bounds, spawns, db_proc, sanitized as conf
 from .utils import time_until_time, dump_pickle, load_pickle
+from .records import FortRecord, PokestopRecord, RaidRecord
 from .shared import call_at, get_logger
 
 try:
@@ -198,11 +199,8 @@ class RaidCache:
                 fort = session.query(Fort) \
                     .filter(Fort.id == raid.fort_id) \
                     .scalar()
-                r = {}
-                r['fort_external_id'] = fort.external_id
-                r['time_end'] = raid.time_end
-                r['pokemon_id'] = raid.pokemon_id
-                self.store[r['fort_external_id']] = r
+                self.store[fort.external_id] = RaidRecord(
+                    fort.external_id, raid.time_end, raid.pokemon_id)
 
 
 class PokestopCache:
@@ -234,13 +232,9 @@ class PokestopCache:
         with session_scope() as session:
             pokestops = session.query(Pokestop)
             for pokestop in pokestops:
-                p = {}
-                p['external_id'] = pokestop.external_id
-                p['name'] = pokestop.name
-                p['lat'] = pokestop.lat
-                p['lon'] = pokestop.lon
-                p['lure_start'] = pokestop.lure_start
-                self.store[p['external_id']] = p
+                self.store[pokestop.external_id] = PokestopRecord(
+                    pokestop.external_id, pokestop.lat, pokestop.lon, pokestop.name,
+                    pokestop.url, pokestop.desc, pokestop.lure_start)
 
 
 class GymCache:
@@ -265,15 +259,8 @@ class GymCache:
         with session_scope() as session:
             gyms = session.query(Fort)
             for gym in gyms:
-                g = {}
-                g['external_id'] = gym.external_id
-                g['name'] = gym.name
-                g['url'] = gym.url
-                g['desc'] = gym.desc
-                g['lat'] = gym.lat
-                g['lon'] = gym.lon
-                g['last_modified'] = 0
-                self.gyms[g['external_id']] = g
+                self.gyms[gym.external_id] = FortRecord(
+                    gym.external_id, gym.lat, gym.lon, gym.name, gym.url, gym.desc)
 
 
 class WeatherCache:
@@ -479,6 +466,23 @@ class Pokestop(Base):
     lure_start = Column(Integer)
 
 
+class Lease(Base):
+    __tablename__ = 'leases'
+
+    id = Column(Integer, primary_key=True)
+    partition = Column(HUGE_TYPE, unique=True)
+    owner = Column(String(64))
+    expires = Column(Integer, index=True)
+
+
+class LeaseNode(Base):
+    __tablename__ = 'lease_nodes'
+
+    id = Column(Integer, primary_key=True)
+    owner = Column(String(64), unique=True)
+    expires = Column(Integer, index=True)
+
+
 @contextmanager
 def session_scope(autoflush=False):
     """Provide a transactional scope around a series of operations."""
@@ -583,7 +587,7 @@ def add_mystery_spawnpoint(session, pokemon):
         failures=0
     ))
 
-    if point in bounds:
+    if point in bounds and spawns.owns(point):
         spawns.add_unknown(point)
 
 
@@ -706,9 +710,11 @@ def add_pokestop(session, raw_pokestop):
     if pokestop:
         pokestop.lat = raw_pokestop['lat']
         pokestop.lon = raw_pokestop['lon']
-        pokestop.name = raw_pokestop['name']
-        pokestop.url = raw_pokestop['url']
-        pokestop.desc = raw_pokestop['desc']
+        if raw_pokestop['name'] is not None:
+            # None if the details haven't been fetched yet
+            pokestop.name = raw_pokestop['name']
+            pokestop.url = raw_pokestop['url']
+            pokestop.desc = raw_pokestop['desc']
         pokestop.lure_start = raw_pokestop['lure_start']
         # Why is it not in the cache? It should be there!
         POKESTOP_CACHE.add(raw_pokestop)
@@ -0,0 +1,59 @@
+from asyncio import Event
+from collections import OrderedDict
+
+from .shared import LOOP
+
+
+class FortDetailQueue:
+    """Forts that were saved without their names, URLs and descriptions
+
+    Forts stay in the queue until their details were fetched or fetching
+    them failed, so that they aren't queued again on every visit.
+    """
+    def __init__(self):
+        # fort ID: raw FortData, oldest first
+        self.pending = OrderedDict()
+        self.fetching = set()
+        self.event = Event(loop=LOOP)
+        self.fetched = 0
+        self.failed = 0
+
+    def __contains__(self, fort_id):
+        return fort_id in self.pending or fort_id in self.fetching
+
+    def __len__(self):
+        return len(self.pending) + len(self.fetching)
+
+    def add(self, fort):
+        self.pending[fort.id] = fort
+        self.event.set()
+
+    def refresh(self, fort):
+        """Replace the data of a queued fort, keeping its place in the queue"""
+        if fort.id in self.pending:
+            self.pending[fort.id] = fort
+
+    async def get(self):
+        while not self.pending:
+            self.event.clear()
+            await self.event.wait()
+        fort_id, fort = self.pending.popitem(last=False)
+        self.fetching.add(fort_id)
+        return fort
+
+    def postpone(self, fort):
+        """Put a fort back at the end of the queue"""
+        self.fetching.discard(fort.id)
+        self.pending[fort.id] = fort
+
+    def done(self, fort, success=True):
+        self.fetching.discard(fort.id)
+        if success:
+            self.fetched += 1
+        else:
+            self.failed += 1
+
+    @property
+    def status(self):
+        return 'Fort details queued: {}, fetched: {}, failed: {}'.format(
+            len(self), self.fetched, self.failed)
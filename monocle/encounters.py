@@ -0,0 +1,90 @@
+from asyncio import PriorityQueue
+from itertools import count
+from time import time
+
+from .shared import LOOP
+
+
+class EncounterJob:
+    __slots__ = ('pokemon', 'spawn_point_id', 'deadline', 'future')
+
+    def __init__(self, pokemon, spawn_point_id, deadline):
+        self.pokemon = pokemon
+        self.spawn_point_id = spawn_point_id
+        self.deadline = deadline
+        self.future = LOOP.create_future()
+
+    @property
+    def point(self):
+        return self.pokemon['lat'], self.pokemon['lon']
+
+    def finish(self, encountered):
+        if not self.future.done():
+            self.future.set_result(encountered)
+
+
+class EncounterQueue:
+    """Encounters waiting for an idle worker, earliest deadline first
+
+    Every encounter ID is queued once. Its future is set to a copy of the
+    Pokemon with the encounter details added, or None if encountering it
+    failed or no worker was free before the deadline. The Pokemon itself is
+    never modified, since whoever was waiting may have given up and saved
+    it already. Jobs whose futures were cancelled are dropped.
+    """
+    def __init__(self, timeout):
+        self.timeout = timeout
+        # encounter ID: EncounterJob
+        self.jobs = {}
+        self.queue = PriorityQueue(loop=LOOP)
+        self.sequence = count()
+        self.succeeded = 0
+        self.failed = 0
+        self.expired = 0
+
+    def __contains__(self, encounter_id):
+        return encounter_id in self.jobs
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def submit(self, pokemon, spawn_point_id):
+        """Returns a future with the result of encountering pokemon"""
+        encounter_id = pokemon['encounter_id']
+        try:
+            return self.jobs[encounter_id].future
+        except KeyError:
+            pass
+        deadline = time() + self.timeout
+        expiration = pokemon.get('expire_timestamp')
+        if expiration:
+            deadline = min(deadline, expiration)
+        job = self.jobs[encounter_id] = EncounterJob(pokemon, spawn_point_id, deadline)
+        self.queue.put_nowait((deadline, next(self.sequence), job))
+        return job.future
+
+    async def get(self):
+        """Returns the next job that hasn't expired"""
+        while True:
+            deadline, _, job = await self.queue.get()
+            if deadline > time() and not job.future.done():
+                return job
+            self.jobs.pop(job.pokemon['encounter_id'], None)
+            self.expired += 1
+            job.finish(None)
+
+    def postpone(self, job):
+        self.queue.put_nowait((job.deadline, next(self.sequence), job))
+
+    def done(self, job, encountered=None):
+        self.jobs.pop(job.pokemon['encounter_id'], None)
+        if encountered is not None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        job.finish(encountered)
+
+    @property
+    def status(self):
+        return 'Encounters queued: {}, succeeded: {}, failed: {}, expired: {}'.format(
+            len(self), self.succeeded, self.failed, self.expired)
@@ -0,0 +1,102 @@
+from asyncio import CancelledError
+from heapq import heappop, heappush
+from itertools import count
+from time import time
+
+from .shared import LOOP
+
+# priority classes of hashed requests, most important first
+SPAWN, ENCOUNTER, MYSTERY, DETAILS, SPIN = range(5)
+NAMES = ('spawns', 'encounters', 'mysteries', 'details', 'spins')
+
+
+class HashBudget:
+    """Hashes left in the current period, handed out in order of priority
+
+    The hashing server reports how many hashes are left after every
+    response, and hashes handed out to requests that haven't been answered
+    yet are subtracted from that. Every priority class leaves a share of the
+    maximum to the classes above it, shrinking as the period runs out since
+    unused hashes don't carry over. Requests that can't be sent yet wait,
+    and are let through most important first as hashes are returned and as
+    the reserves shrink.
+    """
+    def __init__(self, server, reserves=(0, 0.05, 0.1, 0.2, 0.3)):
+        self.server = server
+        self.reserves = reserves
+        self.in_flight = 0
+        # (priority, sequence, future)
+        self.waiting = []
+        self.sequence = count()
+        self.timer = None
+        self.delayed = 0
+
+    def available(self, priority, now=None):
+        now = now or time()
+        try:
+            status = self.server.status
+            maximum = status['maximum']
+            if now > status['period']:
+                # a new period started, but nothing was hashed in it yet
+                remaining = maximum
+                seconds_left = 60
+            else:
+                remaining = status['remaining']
+                seconds_left = status['period'] - now
+        except (KeyError, TypeError):
+            # unknown until the first hashed response
+            return True
+        reserve = maximum * self.reserves[priority] * min(seconds_left / 60, 1)
+        return remaining - self.in_flight > reserve
+
+    async def acquire(self, priority):
+        if ((not self.waiting or self.waiting[0][0] > priority)
+                and self.available(priority)):
+            self.in_flight += 1
+            return
+        future = LOOP.create_future()
+        heappush(self.waiting, (priority, next(self.sequence), future))
+        self.delayed += 1
+        if self.timer is None:
+            self.timer = LOOP.call_later(1, self.wake)
+        try:
+            await future
+        except CancelledError:
+            if future.done() and not future.cancelled():
+                # was let through just before being cancelled
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        if self.waiting:
+            self.wake()
+
+    def wake(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        now = time()
+        while self.waiting:
+            priority, _, future = self.waiting[0]
+            if future.done():
+                heappop(self.waiting)
+            elif self.available(priority, now):
+                heappop(self.waiting)
+                self.in_flight += 1
+                future.set_result(None)
+            else:
+                break
+        if self.waiting:
+            # check again as the reserves shrink
+            self.timer = LOOP.call_later(1, self.wake)
+
+    @property
+    def status(self):
+        waiting = [0] * len(self.reserves)
+        for priority, _, future in self.waiting:
+            if not future.done():
+                waiting[priority] += 1
+        return 'Hashes in flight: {}, requests delayed: {}, waiting: {}'.format(
+            self.in_flight, self.delayed,
+            ', '.join('{} {}'.format(n, w) for n, w in zip(NAMES, waiting)))
@@ -0,0 +1,54 @@
+from asyncio import shield, CancelledError
+
+from .shared import LOOP
+
+
+class InFlight:
+    """Requests in progress, shared by every worker in the process
+
+    The first worker to ask for a key makes the request, and any others that
+    ask for the same key before it finishes wait for its result instead of
+    making their own. Errors aren't shared, since they are often down to the
+    account or proxy of the worker that made the request: if the first
+    worker fails or is cancelled, the others start over and one of them
+    makes the request.
+    """
+    def __init__(self):
+        # key: future of the result
+        self.requests = {}
+        self.made = 0
+        self.shared = 0
+
+    def __contains__(self, key):
+        return key in self.requests
+
+    async def __call__(self, key, request, *args):
+        """Returns the result of awaiting request(*args), or of the one in flight"""
+        while key in self.requests:
+            future = self.requests[key]
+            try:
+                result = await shield(future, loop=LOOP)
+            except CancelledError:
+                if future.cancelled():
+                    continue
+                raise
+            self.shared += 1
+            return result
+
+        future = self.requests[key] = LOOP.create_future()
+        self.made += 1
+        try:
+            result = await request(*args)
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.requests[key]
+
+    @property
+    def status(self):
+        return 'Requests shared between workers: {}/{}'.format(
+            self.shared, self.made + self.shared)
@@ -0,0 +1,140 @@
+from math import ceil
+from os import getpid
+from socket import gethostname
+from time import time
+
+from s2sphere import CellId, LatLng, LatLngRect, RegionCoverer
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from . import bounds, db, sanitized as conf
+from .shared import get_logger
+
+
+class LeaseManager:
+    """Coordinate nodes scanning the same area through the database
+
+    The map is split into S2 cells (partitions). Each node holds time-boxed
+    leases on roughly an equal share of them, renews them while running,
+    and picks up partitions whose leases were abandoned. Nodes also renew a
+    heartbeat of their own, so that a node which just joined counts towards
+    the share even before it holds any leases.
+    """
+    def __init__(self, level=conf.LEASE_LEVEL):
+        self.log = get_logger('leases')
+        self.owner = conf.NODE_NAME or '{}-{}'.format(gethostname(), getpid())
+        self.level = level
+        self.partitions = self.get_partitions()
+        self.owned = frozenset()
+        # {(lat, lon): cell_id}
+        self.cells = {}
+        self.created = False
+
+    def __contains__(self, point):
+        return self.get_cell(point) in self.owned
+
+    def __len__(self):
+        return len(self.owned)
+
+    def get_partitions(self):
+        region = LatLngRect.from_point_pair(
+            LatLng.from_degrees(bounds.south, bounds.west),
+            LatLng.from_degrees(bounds.north, bounds.east))
+        coverer = RegionCoverer()
+        coverer.min_level = self.level
+        coverer.max_level = self.level
+        coverer.max_cells = 1000000
+        # sorted cell IDs follow the Hilbert curve, so claims stay contiguous
+        return sorted(cell.id() for cell in coverer.get_covering(region))
+
+    def get_cell(self, point):
+        try:
+            return self.cells[point]
+        except KeyError:
+            cell = CellId.from_lat_lng(LatLng.from_degrees(*point)).parent(self.level).id()
+            self.cells[point] = cell
+            return cell
+
+    def create_partitions(self):
+        db.Lease.__table__.create(db._engine, checkfirst=True)
+        db.LeaseNode.__table__.create(db._engine, checkfirst=True)
+        try:
+            with db.session_scope() as session:
+                existing = {x[0] for x in session.query(db.Lease.partition)}
+                session.add_all(db.Lease(partition=x, owner=None, expires=0)
+                                for x in self.partitions if x not in existing)
+        except IntegrityError:
+            # another node created them at the same time
+            self.log.info('Partitions were created by another node.')
+        self.created = True
+
+    def renew(self):
+        """Renew our leases and claim or release partitions to hold a fair share
+
+        Must be run in a thread, since it queries the database.
+        """
+        if not self.created:
+            self.create_partitions()
+
+        Lease = db.Lease
+        now = round(time())
+        expires = now + conf.LEASE_DURATION
+        partitions = set(self.partitions)
+        with db.session_scope() as session:
+            self.heartbeat(session, expires)
+            nodes = session.query(func.count(db.LeaseNode.owner)) \
+                .filter(db.LeaseNode.expires > now, db.LeaseNode.owner != self.owner) \
+                .scalar() + 1
+            share = ceil(len(partitions) / nodes)
+
+            owned = sorted(x[0] for x in session.query(Lease.partition)
+                           .filter(Lease.owner == self.owner, Lease.expires > now)
+                           if x[0] in partitions)
+            keep, release = owned[:share], owned[share:]
+            if release:
+                # hand leases back so that nodes which just joined can claim them
+                session.query(Lease) \
+                    .filter(Lease.partition.in_(release), Lease.owner == self.owner) \
+                    .update({'expires': 0}, synchronize_session=False)
+            if keep:
+                session.query(Lease) \
+                    .filter(Lease.partition.in_(keep), Lease.owner == self.owner) \
+                    .update({'expires': expires}, synchronize_session=False)
+
+            claimed = keep
+            if len(claimed) < share:
+                free = sorted(x[0] for x in session.query(Lease.partition)
+                              .filter(Lease.expires <= now)
+                              if x[0] in partitions)
+                for partition in free:
+                    if len(claimed) >= share:
+                        break
+                    # only succeeds if no other node claimed it in the meantime
+                    if session.query(Lease) \
+                            .filter(Lease.partition == partition, Lease.expires <= now) \
+                            .update({'owner': self.owner, 'expires': expires},
+                                    synchronize_session=False):
+                        claimed.append(partition)
+
+        owned = frozenset(claimed)
+        if owned != self.owned:
+            self.log.warning('{} now holds {} of {} partitions ({} nodes).',
+                             self.owner, len(owned), len(partitions), nodes)
+        self.owned = owned
+
+    def heartbeat(self, session, expires):
+        if not session.query(db.LeaseNode) \
+                .filter(db.LeaseNode.owner == self.owner) \
+                .update({'expires': expires}, synchronize_session=False):
+            session.add(db.LeaseNode(owner=self.owner, expires=expires))
+            session.flush()
+
+    def release(self):
+        with db.session_scope() as session:
+            session.query(db.Lease) \
+                .filter(db.Lease.owner == self.owner) \
+                .update({'expires': 0}, synchronize_session=False)
+            session.query(db.LeaseNode) \
+                .filter(db.LeaseNode.owner == self.owner) \
+                .delete(synchronize_session=False)
+        self.owned = frozenset()
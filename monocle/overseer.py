@@ -1,10 +1,10 @@
-from asyncio import gather, Semaphore, sleep, Task, CancelledError
+from asyncio import gather, PriorityQueue, Semaphore, sleep, Task, CancelledError
 from datetime import datetime
 from statistics import median
 from sys import platform
 from cyrandom import shuffle
 from collections import deque
-from itertools import dropwhile
+from itertools import count, dropwhile
 from time import time, monotonic
 
 from aiopogo import HashServer
@@ -12,10 +12,28 @@ from sqlalchemy.exc import OperationalError
 
 from .db import SIGHTING_CACHE, MYSTERY_CACHE, POKESTOP_CACHE, RAID_CACHE, GYM_CACHE
 from .notifier import Notifier
-from .utils import get_current_hour, dump_pickle, get_start_coords, get_bootstrap_points, randomize_point, best_factors, percentage_split
+from .utils import get_current_hour, get_start_coords, get_bootstrap_points, randomize_point, best_factors, percentage_split
 from .shared import get_logger, LOOP, run_threaded, ACCOUNTS
-from . import bounds, db_proc, spawns, sanitized as conf
+from . import altitudes, bounds, db_proc, spawns, sanitized as conf
+from .cells import CellFingerprints
+from .concurrency import AdaptiveSemaphore, ConcurrencyController
+from .details import FortDetailQueue
+from .encounters import EncounterQueue
+from .hashbudget import HashBudget, DETAILS
+from .positions import WorkerPositions
+from .rpcstats import RpcStats
+from .spares import SparePool
 from .worker import Worker
+from .workermap import WorkerMap
+
+if conf.LEASE_PARTITIONS:
+    from .leases import LeaseManager
+
+if conf.LOOP_WATCHDOG:
+    from .watchdog import LoopWatchdog
+
+if conf.GMO_CAPTURE:
+    from .capture import GMORecorder
 
 ANSI = '\x1b[2J\x1b[H'
 if platform == 'win32':
@@ -54,19 +72,53 @@ BAD_STATUSES = (
     'TIMEOUT'
 )
 
+# visit job tiers, lower values are dispatched first
+SPAWN_JOB = 0
+RETRY_JOB = 1
+MYSTERY_JOB = 2
+
+
+def queue_accounts(captcha_queue, extra_queue):
+    for username, account in ACCOUNTS.items():
+        account['username'] = username
+        if account.get('banned') or account.get('warn'):
+            continue
+        if account.get('captcha'):
+            captcha_queue.put(account)
+        else:
+            extra_queue.put(account)
+
 
 class Overseer:
-    def __init__(self, manager):
-        self.log = get_logger('overseer')
+    def __init__(self, manager, shard=None):
+        self.log = get_logger('overseer' if shard is None else 'overseer-{}'.format(shard.index))
         self.notifier = Notifier(loop=LOOP)
         self.workers = []
         self.manager = manager
+        self.shard = shard
+        self.leases = LeaseManager() if conf.LEASE_PARTITIONS else None
+        self.watchdog = LoopWatchdog(None if shard is None else shard.index) if conf.LOOP_WATCHDOG else None
+        self.reshard = False
         self.things_count = deque(maxlen=9)
         self.paused = False
         self.coroutines_count = 0
         self.skipped = 0
         self.visits = 0
-        self.coroutine_semaphore = Semaphore(conf.COROUTINES_LIMIT, loop=LOOP)
+        if conf.ADAPTIVE_CONCURRENCY:
+            limit = min(max(conf.COROUTINES_LIMIT, conf.COROUTINES_MIN), conf.COROUTINES_MAX)
+            self.coroutine_semaphore = AdaptiveSemaphore(limit, loop=LOOP)
+            self.concurrency = ConcurrencyController(
+                self.coroutine_semaphore, lambda: self.due_jobs)
+        else:
+            self.coroutine_semaphore = Semaphore(conf.COROUTINES_LIMIT, loop=LOOP)
+            self.concurrency = None
+        # (tier, deadline, sequence, point, spawn_time, spawn_id)
+        self.visit_queue = PriorityQueue(loop=LOOP)
+        self.job_sequence = count()
+        # spawn and retry jobs waiting, mysteries are only there to fill gaps
+        self.due_jobs = 0
+        self.dispatchers = ()
+        self.visit_dispatchers = 0
         self.redundant = 0
         self.running = True
         self.all_seen = False
@@ -80,26 +132,70 @@ class Overseer:
         Worker.captcha_queue = self.manager.captcha_queue()
         self.extra_queue = self.manager.extra_queue()
         Worker.extra_queue = self.manager.extra_queue()
-        if conf.MAP_WORKERS:
-            Worker.worker_dict = self.manager.worker_dict()
 
-        for username, account in ACCOUNTS.items():
-            account['username'] = username
-            if account.get('banned') or account.get('warn'):
-                continue
-            if account.get('captcha'):
-                self.captcha_queue.put(account)
-            else:
-                self.extra_queue.put(account)
+        if self.shard is None:
+            queue_accounts(self.captcha_queue, self.extra_queue)
+            worker_nos = range(conf.GRID[0] * conf.GRID[1])
+            self.row_length = conf.GRID[1]
+        else:
+            # accounts have already been queued by the parent process
+            spawns.shard = self.shard
+            worker_nos = self.shard.worker_nos
+            self.row_length = self.shard.columns
+            self.shard_status = self.manager.shard_status()
+
+        if conf.DEFER_FORT_DETAILS:
+            Worker.fort_details = FortDetailQueue()
+
+        if conf.FORT_FINGERPRINTS:
+            Worker.fingerprints = CellFingerprints()
 
+        if conf.HASH_BUDGET:
+            Worker.hash_budget = HashBudget(HashServer)
+
+        if conf.RPC_STATS:
+            Worker.rpc_stats = RpcStats(None if self.shard is None else self.shard.index)
+            Worker.rpc_stats.install()
+            LOOP.call_later(conf.STAT_REFRESH, self.publish_rpc_stats)
+
+        if conf.ENCOUNTER_DISPATCH and conf.ENCOUNTER:
+            Worker.encounters = EncounterQueue(conf.ENCOUNTER_TIMEOUT)
+
+        if conf.MAP_WORKERS:
+            Worker.worker_map = WorkerMap(None if self.shard is None else self.shard.index)
+            LOOP.call_later(conf.MAP_WORKERS_REFRESH, self.publish_workers)
+
+        if conf.GMO_CAPTURE:
+            capture = str(conf.GMO_CAPTURE)
+            if self.shard is not None:
+                capture += '-{}'.format(self.shard.index)
+            Worker.recorder = GMORecorder(capture)
+            Worker.recorder.start()
+
+        if WorkerPositions.available():
+            Worker.positions = WorkerPositions(worker_nos, Worker.scan_delay)
+        else:
+            self.log.info('NumPy not available, calculating worker speeds one at a time.')
         self.workers = tuple(Worker(worker_no=x, notifier=self.notifier)
-            for x in range(conf.GRID[0] * conf.GRID[1]))
+            for x in worker_nos)
+        if conf.SPARE_ACCOUNTS:
+            # only once the workers have their accounts
+            Worker.spares = SparePool(conf.SPARE_ACCOUNTS)
         db_proc.start()
         LOOP.call_later(10, self.update_count)
         LOOP.call_later(max(conf.SWAP_OLDEST, conf.MINIMUM_RUNTIME), self.swap_oldest)
+        if Worker.multiproxy:
+            LOOP.call_later(60, self.rebalance_proxies)
         LOOP.call_soon(self.update_stats)
         if status_bar:
             LOOP.call_soon(self.print_status)
+        if self.shard is not None:
+            LOOP.call_soon(self.publish_status)
+        if self.concurrency:
+            self.concurrency.start()
+        if self.watchdog:
+            self.watchdog.start()
+            LOOP.call_later(conf.STAT_REFRESH, self.publish_watchdog)
 
     def update_count(self):
         self.things_count.append(str(db_proc.count))
@@ -116,6 +212,80 @@ class Overseer:
                 LOOP.create_task(oldest.lock_and_swap(minutes))
         LOOP.call_later(interval, self.swap_oldest)
 
+    async def ramp_up(self):
+        """Log in every worker that isn't yet, quickest first
+
+        Workers are locked while logging in, so that points are only
+        dispatched to workers that are ready to scan instead of waiting on
+        logins behind the login and simulation semaphores.
+        """
+        start = monotonic()
+        workers = sorted((w for w in self.workers if not w.authenticated),
+                         key=Worker.login_order)
+        if not workers:
+            return
+        self.log.info('Logging in {} of {} workers.', len(workers), len(self.workers))
+        await gather(*(w.warm_up() for w in workers), loop=LOOP)
+        self.log.warning('{} workers logged in after {:.0f}s.',
+                         sum(w.authenticated for w in self.workers), monotonic() - start)
+
+    def rebalance_proxies(self, interval=60):
+        """Move some idle workers off quarantined or much slower proxies"""
+        pool = Worker.proxies
+        moves = len(self.workers) // 10 + 1
+        for worker in self.workers:
+            if not moves:
+                break
+            if not worker.busy.locked() and pool.should_leave(worker.proxy):
+                worker.swap_proxy()
+                moves -= 1
+        LOOP.call_later(interval, self.rebalance_proxies)
+
+    def publish_status(self, refresh=conf.STAT_REFRESH):
+        """Share a summary of this shard with the parent process"""
+        try:
+            self.update_coroutines_count()
+            dots, messages = self.get_dots_and_messages()
+            self.shard_status[self.shard.index] = {
+                'visits': self.visits,
+                'skipped': self.skipped,
+                'redundant': self.redundant,
+                'seen': Worker.g['seen'],
+                'captchas': Worker.g['captchas'],
+                'workers': len(self.workers),
+                'coroutines': self.coroutines_count,
+                'queued': self.visit_queue.qsize(),
+                'known': len(spawns),
+                'unknown': len(spawns.unknown),
+                'db_queue': len(db_proc),
+                'paused': self.paused,
+                'dots': [' '.join(row) for row in dots],
+                'messages': messages
+            }
+        except (EOFError, BrokenPipeError, FileNotFoundError, ConnectionRefusedError):
+            self.log.warning('Lost connection to the parent process.')
+        except Exception as e:
+            self.log.exception('{} occurred while publishing status.', e.__class__.__name__)
+        LOOP.call_later(refresh, self.publish_status)
+
+    def publish_workers(self, refresh=conf.MAP_WORKERS_REFRESH):
+        """Write the positions of the workers for the web server"""
+        worker_map = Worker.worker_map
+        LOOP.create_task(run_threaded(worker_map.write, worker_map.snapshot()))
+        LOOP.call_later(refresh, self.publish_workers)
+
+    def publish_rpc_stats(self, refresh=conf.STAT_REFRESH):
+        """Write the request statistics for scraping"""
+        rpc_stats = Worker.rpc_stats
+        LOOP.create_task(run_threaded(rpc_stats.dump, rpc_stats.prometheus()))
+        LOOP.call_later(refresh, self.publish_rpc_stats)
+
+    def publish_watchdog(self, refresh=conf.STAT_REFRESH):
+        """Write the event loop report"""
+        watchdog = self.watchdog
+        LOOP.create_task(run_threaded(watchdog.dump, watchdog.report()))
+        LOOP.call_later(refresh, self.publish_watchdog)
+
     def print_status(self, refresh=conf.REFRESH_RATE):
         try:
             self._print_status()
@@ -143,7 +313,7 @@ class Overseer:
             except Exception as e:
                 self.log.exception('A wild {} appeared in exit_progress!', e.__class__.__name__)
 
-    def update_stats(self, refresh=conf.STAT_REFRESH, med=median, count=conf.GRID[0] * conf.GRID[1]):
+    def update_stats(self, refresh=conf.STAT_REFRESH, med=median):
         visits = []
         seen_per_worker = []
         after_spawns = []
@@ -171,13 +341,14 @@ class Overseer:
 
         self.update_coroutines_count()
         self.counts = (
-            'Known spawns: {}, unknown: {}, more: {}\n'
-            '{} workers, {} coroutines\n'
+            'Known spawns: {}, unknown: {}, more: {}{}\n'
+            '{} workers, {} coroutines, {} queued visits\n'
             'sightings cache: {}, mystery cache: {}, DB queue: {}\n'
             'pokestops cache: {}, gyms cache: {}, raids cache: {}\n'
         ).format(
             len(spawns), len(spawns.unknown), spawns.cells_count,
-            count, self.coroutines_count,
+            ', leases: {}/{}'.format(len(self.leases), len(self.leases.partitions)) if self.leases else '',
+            len(self.workers), self.coroutines_count, self.visit_queue.qsize(),
             len(SIGHTING_CACHE), len(MYSTERY_CACHE), len(db_proc),
             len(POKESTOP_CACHE), len(GYM_CACHE), len(RAID_CACHE)
         )
@@ -196,6 +367,7 @@ class Overseer:
         $ = spinning a PokéStop
         * = sending a notification
         ~ = encountering a Pokémon
+        ? = fetching the details of a fort
         I = initial, haven't done anything yet
         » = waiting to log in (limited by SIMULTANEOUS_LOGINS)
         ° = waiting to start app simulation (limited by SIMULTANEOUS_SIMULATION)
@@ -212,7 +384,7 @@ class Overseer:
         messages = []
         row = []
         for i, worker in enumerate(self.workers):
-            if i > 0 and i % conf.GRID[1] == 0:
+            if i > 0 and i % self.row_length == 0:
                 dots.append(row)
                 row = []
             if worker.error_code in BAD_STATUSES:
@@ -276,6 +448,26 @@ class Overseer:
         except (KeyError, TypeError):
             pass
 
+        if self.concurrency:
+            output.append(self.concurrency.status)
+        if Worker.fort_details is not None:
+            output.append(Worker.fort_details.status)
+        if Worker.encounters is not None:
+            output.append(Worker.encounters.status)
+        if Worker.fingerprints is not None:
+            output.append(Worker.fingerprints.status)
+        output.append(Worker.inflight.status)
+        if Worker.hash_budget is not None:
+            output.append(Worker.hash_budget.status)
+        if Worker.spares is not None:
+            output.append(Worker.spares.status)
+        if Worker.multiproxy:
+            output.append(Worker.proxies.status)
+        if Worker.rpc_stats is not None:
+            output.append(Worker.rpc_stats.status)
+        if self.watchdog:
+            output.append(self.watchdog.status)
+
         if _notify:
             sent = self.notifier.get_sent_count()
             output.append('Notifications sent: {}, per hour {:.1f}'.format(
@@ -350,6 +542,11 @@ class Overseer:
         exceptions = 0
         self.next_mystery_reload = 0
 
+        if self.leases:
+            await run_threaded(self.leases.renew)
+            spawns.shard = self.leases
+            LOOP.create_task(self.maintain_leases())
+
         if not pickle or not spawns.unpickle():
             await self.update_spawns(initial=True)
 
@@ -358,34 +555,62 @@ class Overseer:
                 if not conf.IGNORE_SENDER_TEST:
                     return
 
-        if not spawns or bootstrap:
-            try:
-                await self.bootstrap()
-                await self.update_spawns()
-            except CancelledError:
-                return
+        self.visit_dispatchers = conf.COROUTINES_MAX if self.concurrency else conf.COROUTINES_LIMIT
+        self.dispatchers = tuple(LOOP.create_task(self.dispatch())
+                                 for _ in range(self.visit_dispatchers))
+        if Worker.fort_details is not None:
+            self.dispatchers += (LOOP.create_task(self.fetch_fort_details()),)
+        if Worker.encounters is not None:
+            self.dispatchers += (LOOP.create_task(self.dispatch_encounters()),)
+        if Worker.spares is not None:
+            self.dispatchers += (LOOP.create_task(Worker.spares.maintain()),)
+        if conf.STARTUP_RAMP:
+            self.dispatchers += (LOOP.create_task(self.ramp_up()),)
+        # only one process fetches missing altitudes
+        if self.shard is None or self.shard.index == 0:
+            altitude_task = LOOP.create_task(altitudes.fill())
+        else:
+            altitude_task = None
+        try:
+            if self.leases is not None and not self.leases.owned:
+                # nothing to bootstrap until other nodes hand over partitions
+                self.log.warning('No partitions leased yet, skipping bootstrap.')
+            elif not spawns or bootstrap:
+                try:
+                    await self.bootstrap()
+                    await self.update_spawns()
+                except CancelledError:
+                    return
 
-        update_spawns = False
-        self.mysteries = spawns.mystery_gen()
-        while True:
-            try:
-                await self._launch(update_spawns)
-                update_spawns = True
-            except CancelledError:
-                return
-            except Exception:
-                exceptions += 1
-                if exceptions > 25:
-                    self.log.exception('Over 25 errors occured in launcher loop, exiting.')
-                    return False
-                else:
-                    self.log.exception('Error occured in launcher loop.')
-                    update_spawns = False
+            update_spawns = False
+            self.mysteries = spawns.mystery_gen()
+            while True:
+                try:
+                    await self._launch(update_spawns)
+                    # resume from the current time if leases changed mid-hour
+                    update_spawns = not self.reshard
+                    self.reshard = False
+                except CancelledError:
+                    return
+                except Exception:
+                    exceptions += 1
+                    if exceptions > 25:
+                        self.log.exception('Over 25 errors occured in launcher loop, exiting.')
+                        return False
+                    else:
+                        self.log.exception('Error occured in launcher loop.')
+                        update_spawns = False
+        finally:
+            for dispatcher in self.dispatchers:
+                dispatcher.cancel()
+            if altitude_task is not None:
+                altitude_task.cancel()
 
     async def _launch(self, update_spawns):
         if update_spawns:
             await self.update_spawns()
-            LOOP.create_task(run_threaded(dump_pickle, 'accounts', ACCOUNTS))
+            # shards write their own accounts, the store is shared safely
+            LOOP.create_task(run_threaded(ACCOUNTS.write, ACCOUNTS.changes()))
             spawns_iter = iter(spawns.items())
         else:
             start_point = self.get_start_point()
@@ -401,14 +626,20 @@ class Overseer:
 
         captcha_limit = conf.MAX_CAPTCHAS
         skip_spawn = conf.SKIP_SPAWN
+        # the CAPTCHA queue is a proxy in shards, don't ask it for every spawn
+        next_captcha_check = 0
         for point, (spawn_id, spawn_seconds) in spawns_iter:
-            try:
-                if self.captcha_queue.qsize() > captcha_limit:
-                    self.paused = True
-                    self.idle_seconds += await run_threaded(self.captcha_queue.full_wait, conf.MAX_CAPTCHAS)
-                    self.paused = False
-            except (EOFError, BrokenPipeError, FileNotFoundError):
-                pass
+            if self.reshard:
+                return
+            if monotonic() >= next_captcha_check:
+                next_captcha_check = monotonic() + 1
+                try:
+                    if self.captcha_queue.qsize() > captcha_limit:
+                        self.paused = True
+                        self.idle_seconds += await run_threaded(self.captcha_queue.full_wait, conf.MAX_CAPTCHAS)
+                        self.paused = False
+                except (EOFError, BrokenPipeError, FileNotFoundError):
+                    pass
 
             spawn_time = spawn_seconds + current_hour
 
@@ -417,17 +648,9 @@ class Overseer:
             time_diff = time() - spawn_time
 
             while time_diff < 0.5:
-                try:
-                    mystery_point = next(self.mysteries)
-
-                    await self.coroutine_semaphore.acquire()
-                    LOOP.create_task(self.try_point(mystery_point))
-                except StopIteration:
-                    if self.next_mystery_reload < monotonic():
-                        self.mysteries = spawns.mystery_gen()
-                        self.next_mystery_reload = monotonic() + conf.RESCAN_UNKNOWN
-                    else:
-                        await sleep(min(spawn_time - time() + .5, self.next_mystery_reload - monotonic()), loop=LOOP)
+                # keep idle dispatchers busy with mysteries until the spawn
+                self.queue_mysteries()
+                await sleep(min(spawn_time - time() + .5, 1.0), loop=LOOP)
                 time_diff = time() - spawn_time
 
             if time_diff > 5 and spawn_id in SIGHTING_CACHE.store:
@@ -437,8 +660,146 @@ class Overseer:
                 self.skipped += 1
                 continue
 
-            await self.coroutine_semaphore.acquire()
-            LOOP.create_task(self.try_point(point, spawn_time, spawn_id))
+            self.add_job(SPAWN_JOB, spawn_time + skip_spawn, point, spawn_time, spawn_id)
+
+    async def maintain_leases(self):
+        while self.running:
+            await sleep(conf.LEASE_DURATION / 3, loop=LOOP)
+            try:
+                owned = self.leases.owned
+                await run_threaded(self.leases.renew)
+                if self.leases.owned != owned:
+                    await run_threaded(spawns.update)
+                    spawns.apply_shard(self.leases)
+                    self.reshard = True
+            except CancelledError:
+                raise
+            except Exception as e:
+                self.log.exception('A wild {} appeared while renewing leases!', e.__class__.__name__)
+
+    def add_job(self, tier, deadline, point, spawn_time=None, spawn_id=None):
+        if tier != MYSTERY_JOB:
+            self.due_jobs += 1
+        self.visit_queue.put_nowait(
+            (tier, deadline, next(self.job_sequence), point, spawn_time, spawn_id))
+
+    def queue_mysteries(self):
+        """Top up the visit queue with mysteries until every dispatcher has a job"""
+        while self.visit_queue.qsize() < self.visit_dispatchers:
+            try:
+                point = next(self.mysteries)
+            except StopIteration:
+                if self.next_mystery_reload < monotonic():
+                    self.mysteries = spawns.mystery_gen()
+                    self.next_mystery_reload = monotonic() + conf.RESCAN_UNKNOWN
+                    continue
+                return
+            self.add_job(MYSTERY_JOB, time() + conf.GIVE_UP_UNKNOWN, point)
+
+    async def dispatch(self):
+        """Visit queued points in order of tier and deadline"""
+        while True:
+            tier, deadline, _, point, spawn_time, spawn_id = await self.visit_queue.get()
+            if tier != MYSTERY_JOB:
+                self.due_jobs -= 1
+            now = time()
+            if now > deadline:
+                if tier == SPAWN_JOB:
+                    self.skipped += 1
+                continue
+            if tier == SPAWN_JOB and now - spawn_time > 5 and spawn_id in SIGHTING_CACHE.store:
+                self.redundant += 1
+                continue
+            if self.leases and not spawns.owns(point):
+                # the partition was handed over to another node
+                continue
+            async with self.coroutine_semaphore:
+                start = monotonic()
+                if tier == SPAWN_JOB:
+                    skip_time = start + conf.GIVE_UP_KNOWN
+                else:
+                    # the deadline already allows GIVE_UP_UNKNOWN
+                    skip_time = start + deadline - time()
+                await self.try_point(point, spawn_time, spawn_id,
+                                     skip_time=skip_time)
+                if self.concurrency:
+                    self.concurrency.record(monotonic() - start)
+
+    async def fetch_fort_details(self, rate=conf.FORT_DETAILS_RATE):
+        """Have idle workers near deferred forts fetch their details
+
+        Fetches one fort at a time outside of the visit coroutines, so that
+        busy visits don't hold it back, while the details priority of the
+        hash budget keeps it from using hashes that visits need. Never runs
+        more than rate times per minute.
+        """
+        queue = Worker.fort_details
+        find_worker = self.find_worker if Worker.positions is None else self.find_worker_vectorized
+        while True:
+            fort = await queue.get()
+            if not self.hashes_to_spare():
+                queue.postpone(fort)
+                await sleep(conf.SEARCH_SLEEP, loop=LOOP)
+                continue
+            worker, speed = find_worker((fort.latitude, fort.longitude))
+            if worker is None or speed > conf.SPEED_LIMIT or not worker.authenticated:
+                queue.postpone(fort)
+                await sleep(conf.SEARCH_SLEEP, loop=LOOP)
+                continue
+            try:
+                async with worker.busy:
+                    worker.speed = speed
+                    await worker.fetch_fort_details(fort)
+                queue.done(fort)
+            except CancelledError:
+                queue.postpone(fort)
+                raise
+            except Exception as e:
+                queue.done(fort, False)
+                self.log.warning('{} while fetching the details of fort {}', e.__class__.__name__, fort.id)
+            await sleep(60 / rate, loop=LOOP)
+
+    async def dispatch_encounters(self):
+        """Hand queued encounters to the nearest idle workers
+
+        Waits for a worker that can reach the Pokemon without exceeding the
+        speed limit, locks it and lets it encounter in the background, so
+        that any number of encounters can run at once.
+        """
+        queue = Worker.encounters
+        find_worker = self.find_worker if Worker.positions is None else self.find_worker_vectorized
+        while True:
+            job = await queue.get()
+            worker, speed = find_worker(job.point, authenticated=True)
+            if worker is None or speed > conf.SPEED_LIMIT:
+                queue.postpone(job)
+                await sleep(conf.SEARCH_SLEEP, loop=LOOP)
+                continue
+            # never waits, find_worker only returns unlocked workers
+            await worker.busy.acquire()
+            worker.speed = speed
+            LOOP.create_task(self.run_encounter(worker, job))
+
+    async def run_encounter(self, worker, job):
+        encountered = None
+        try:
+            encountered = await worker.encounter_nearby(job.pokemon, job.spawn_point_id)
+        except CancelledError:
+            raise
+        except Exception as e:
+            self.log.warning('{} while encountering #{}', e.__class__.__name__, job.pokemon['pokemon_id'])
+        finally:
+            worker.busy.release()
+            Worker.encounters.done(job, encountered)
+
+    @staticmethod
+    def hashes_to_spare(reserve=0.2):
+        if Worker.hash_budget is not None:
+            return Worker.hash_budget.available(DETAILS)
+        try:
+            return HashServer.status['remaining'] > HashServer.status['maximum'] * reserve
+        except (KeyError, TypeError):
+            return True
 
     async def try_again(self, point):
         async with self.coroutine_semaphore:
@@ -474,8 +835,10 @@ class Overseer:
     async def bootstrap_one(self):
         async def visit_release(worker, num, *args):
             async with self.coroutine_semaphore:
+                point = get_start_coords(num, *args)
+                if not spawns.owns(point):
+                    return
                 async with worker.busy:
-                    point = get_start_coords(num, *args)
                     self.log.warning('start_coords: {}', point)
                     self.visits += await worker.bootstrap_visit(point)
 
@@ -490,27 +853,27 @@ class Overseer:
                 tasks.extend(visit_release(w, n, grid, bounds.polygons[i])
                              for n, w in enumerate(workers))
         else:
-            tasks = (visit_release(w, n) for n, w in enumerate(self.workers))
+            tasks = (visit_release(w, w.worker_no) for w in self.workers)
         await gather(*tasks, loop=LOOP)
 
     async def bootstrap_two(self):
         async def bootstrap_try(point):
             async with self.coroutine_semaphore:
                 randomized = randomize_point(point, randomization)
-                LOOP.call_later(1790, LOOP.create_task, self.try_again(randomized))
+                LOOP.call_later(1790, self.add_job, RETRY_JOB, time() + 1790 + conf.GIVE_UP_UNKNOWN, randomized)
                 worker = await self.best_worker(point, False)
                 async with worker.busy:
                     self.visits += await worker.bootstrap_visit(point)
 
         # randomize to within ~140m of the nearest neighbor on the second visit
         randomization = conf.BOOTSTRAP_RADIUS / 155555 - 0.00045
-        tasks = (bootstrap_try(x) for x in get_bootstrap_points(bounds))
+        tasks = (bootstrap_try(x) for x in get_bootstrap_points(bounds)
+                 if spawns.owns(x))
         await gather(*tasks, loop=LOOP)
 
-    async def try_point(self, point, spawn_time=None, spawn_id=None):
+    async def try_point(self, point, spawn_time=None, spawn_id=None, skip_time=False):
         try:
             point = randomize_point(point)
-            skip_time = monotonic() + (conf.GIVE_UP_KNOWN if spawn_time else conf.GIVE_UP_UNKNOWN)
             worker = await self.best_worker(point, skip_time)
             if not worker:
                 if spawn_time:
@@ -526,25 +889,11 @@ class Overseer:
             raise
         except Exception:
             self.log.exception('An exception occurred in try_point')
-        finally:
-            self.coroutine_semaphore.release()
 
     async def best_worker(self, point, skip_time):
-        good_enough = conf.GOOD_ENOUGH
+        find_worker = self.find_worker if Worker.positions is None else self.find_worker_vectorized
         while self.running:
-            gen = (w for w in self.workers if not w.busy.locked())
-            try:
-                worker = next(gen)
-                lowest_speed = worker.travel_speed(point)
-            except StopIteration:
-                lowest_speed = float('inf')
-            for w in gen:
-                speed = w.travel_speed(point)
-                if speed < lowest_speed:
-                    lowest_speed = speed
-                    worker = w
-                    if speed < good_enough:
-                        break
+            worker, lowest_speed = find_worker(point)
             if lowest_speed < conf.SPEED_LIMIT:
                 worker.speed = lowest_speed
                 return worker
@@ -552,15 +901,66 @@ class Overseer:
                 return None
             await sleep(conf.SEARCH_SLEEP, loop=LOOP)
 
+    def find_worker(self, point, good_enough=conf.GOOD_ENOUGH, authenticated=False):
+        gen = (w for w in self.workers
+               if not w.busy.locked() and (not authenticated or w.authenticated))
+        try:
+            worker = next(gen)
+            lowest_speed = worker.travel_speed(point)
+        except StopIteration:
+            return None, float('inf')
+        for w in gen:
+            speed = w.travel_speed(point)
+            if speed < lowest_speed:
+                lowest_speed = speed
+                worker = w
+                if speed < good_enough:
+                    break
+        return worker, lowest_speed
+
+    def find_worker_vectorized(self, point, authenticated=False):
+        speeds = Worker.positions.speeds(
+            point, WorkerPositions.busy_mask(self.workers, authenticated))
+        index = speeds.argmin()
+        return self.workers[index], float(speeds[index])
+
     async def cleanup(self):
         """Release any remaining open resources.
         Call this after all workers have stopped.
         """
         if conf.NOTIFY:
             await self.notifier.close_senders()
+        if self.leases:
+            try:
+                await run_threaded(self.leases.release)
+            except Exception as e:
+                self.log.exception('A wild {} appeared while releasing leases!', e.__class__.__name__)
+        if Worker.recorder is not None:
+            await run_threaded(Worker.recorder.stop)
+        if Worker.spares is not None:
+            Worker.spares.release()
+        if Worker.rpc_stats is not None:
+            try:
+                location = await run_threaded(Worker.rpc_stats.dump, Worker.rpc_stats.prometheus())
+                self.log.warning('Request statistics written to {}', location)
+            except Exception as e:
+                self.log.exception('A wild {} appeared while writing request statistics!', e.__class__.__name__)
+        if self.watchdog:
+            self.watchdog.stop()
+            try:
+                location = await run_threaded(self.watchdog.dump, self.watchdog.report())
+                self.log.warning('Event loop report written to {}', location)
+            except Exception as e:
+                self.log.exception('A wild {} appeared while writing the event loop report!', e.__class__.__name__)
 
     def refresh_dict(self):
         while not self.extra_queue.empty():
             account = self.extra_queue.get()
             username = account['username']
             ACCOUNTS[username] = account
+
+    def return_accounts(self):
+        """Hand the accounts of a shard's workers back to the parent process"""
+        for worker in self.workers:
+            worker.update_accounts_dict()
+            self.extra_queue.put(worker.account)
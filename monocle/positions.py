@@ -0,0 +1,73 @@
+from math import radians
+from time import time
+
+from .utils import Units
+from . import sanitized as conf
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# mean Earth radius in each of the supported speed units
+RADII = {
+    Units.miles: 3958.7613,
+    Units.kilometers: 6371.0088,
+    Units.meters: 6371008.8
+}
+
+
+class WorkerPositions:
+    """Locations and last request times of all workers, packed into arrays
+
+    Allows the travel speeds from every worker to a point to be calculated
+    in a single vectorized haversine pass instead of one call per worker.
+    """
+    def __init__(self, worker_nos, scan_delay, unit=conf.SPEED_UNIT):
+        self.radius = RADII[getattr(Units, unit.lower())]
+        self.scan_delay = scan_delay
+        # {worker_no: array index}, in the same order as Overseer.workers
+        self.slots = {worker_no: i for i, worker_no in enumerate(worker_nos)}
+        count = len(self.slots)
+        # coordinates are stored in radians
+        self.lats = np.zeros(count)
+        self.lons = np.zeros(count)
+        self.cos_lats = np.ones(count)
+        self.last_requests = np.zeros(count)
+
+    def set_location(self, worker_no, point):
+        slot = self.slots[worker_no]
+        lat = radians(point[0])
+        self.lats[slot] = lat
+        self.lons[slot] = radians(point[1])
+        self.cos_lats[slot] = np.cos(lat)
+
+    def set_last_request(self, worker_no, timestamp):
+        self.last_requests[self.slots[worker_no]] = timestamp
+
+    def speeds(self, point, busy=None):
+        """Returns the travel speed of every worker to point
+
+        Workers flagged in the busy mask get an infinite speed.
+        """
+        lat = radians(point[0])
+        lon = radians(point[1])
+        a = (np.sin((self.lats - lat) / 2) ** 2
+             + np.cos(lat) * self.cos_lats * np.sin((self.lons - lon) / 2) ** 2)
+        distances = 2 * self.radius * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        time_diffs = np.maximum(time() - self.last_requests, self.scan_delay)
+        # conversion from seconds to hours
+        speeds = distances / time_diffs * 3600
+        if busy is not None:
+            speeds[busy] = np.inf
+        return speeds
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    @staticmethod
+    def busy_mask(workers, authenticated=False):
+        """Flags the workers that are busy, or not logged in if authenticated is set"""
+        return np.fromiter((w.busy.locked() or (authenticated and not w.authenticated)
+                            for w in workers), bool, len(workers))
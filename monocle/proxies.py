@@ -0,0 +1,138 @@
+from time import monotonic
+
+
+class ProxyHealth:
+    __slots__ = ('url', 'workers', 'successes', 'failures', 'failure_rate', 'latency',
+                 'bans', 'strikes', 'backoff', 'quarantined_until')
+
+    def __init__(self, url, latency):
+        self.url = url
+        self.workers = 0
+        self.successes = 0
+        self.failures = 0
+        # exponentially weighted moving averages
+        self.failure_rate = 0.0
+        self.latency = latency
+        self.bans = 0
+        # failures since the last success
+        self.strikes = 0
+        self.backoff = 0
+        self.quarantined_until = 0
+
+    @property
+    def quarantined(self):
+        return self.quarantined_until > monotonic()
+
+    def score(self, workers=1):
+        """Seconds per request if workers more used the proxy, lower is better"""
+        return self.latency * (self.workers + workers) / max(1 - self.failure_rate, 0.05)
+
+
+class ProxyPool:
+    """Hands out the proxies with the best health to workers
+
+    Every request reports its proxy's latency, or whether it failed, and
+    the proxy's score is its average latency, scaled up by the number of
+    workers sharing it and by its failure rate. Proxies that fail several
+    times in a row, or get IP banned, are quarantined for a backoff that
+    doubles each time and resets once they work again.
+    """
+    def __init__(self, urls, alpha=0.2, initial_latency=1.0, strikes=3,
+                 backoff=30, max_backoff=1800, ban_backoff=900):
+        self.alpha = alpha
+        self.max_strikes = strikes
+        self.min_backoff = backoff
+        self.max_backoff = max_backoff
+        self.ban_backoff = ban_backoff
+        # url: ProxyHealth
+        self.proxies = {url: ProxyHealth(url, initial_latency) for url in urls}
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def assign(self, current=None, leave=False):
+        """Returns the best proxy, releasing current
+
+        Current is kept unless it's quarantined or another proxy scores
+        better, or leave is set to always move to another one.
+        """
+        if current in self.proxies:
+            self.proxies[current].workers -= 1
+        if leave:
+            candidates = [p for p in self.proxies.values() if p.url != current] or list(self.proxies.values())
+        else:
+            # current first, so that it wins ties
+            candidates = sorted(self.proxies.values(), key=lambda p: p.url != current)
+        available = [p for p in candidates if not p.quarantined]
+        if available:
+            best = min(available, key=ProxyHealth.score)
+        else:
+            # every proxy is quarantined, use the one that will be released first
+            best = min(candidates, key=lambda p: p.quarantined_until)
+        best.workers += 1
+        return best.url
+
+    def release(self, url):
+        if url in self.proxies:
+            self.proxies[url].workers -= 1
+
+    def success(self, url, latency):
+        try:
+            proxy = self.proxies[url]
+        except KeyError:
+            return
+        proxy.successes += 1
+        proxy.strikes = 0
+        proxy.backoff = 0
+        proxy.latency += self.alpha * (latency - proxy.latency)
+        proxy.failure_rate -= self.alpha * proxy.failure_rate
+
+    def failure(self, url):
+        try:
+            proxy = self.proxies[url]
+        except KeyError:
+            return
+        proxy.failures += 1
+        proxy.strikes += 1
+        proxy.failure_rate += self.alpha * (1 - proxy.failure_rate)
+        if proxy.strikes >= self.max_strikes:
+            self.quarantine(proxy, self.min_backoff)
+
+    def ban(self, url):
+        try:
+            proxy = self.proxies[url]
+        except KeyError:
+            return
+        proxy.bans += 1
+        proxy.failure_rate += self.alpha * (1 - proxy.failure_rate)
+        self.quarantine(proxy, self.ban_backoff)
+
+    def quarantine(self, proxy, minimum):
+        proxy.backoff = min(max(proxy.backoff * 2, minimum), self.max_backoff)
+        proxy.quarantined_until = monotonic() + proxy.backoff
+        proxy.strikes = 0
+
+    def should_leave(self, url, ratio=2.0):
+        """Would a worker using url be much better off with another proxy?"""
+        try:
+            proxy = self.proxies[url]
+        except KeyError:
+            return False
+        if proxy.quarantined:
+            return True
+        others = [p for p in self.proxies.values() if p is not proxy and not p.quarantined]
+        if not others:
+            return False
+        # the worker is already counted in its own proxy's workers
+        return proxy.score(workers=0) > min(p.score() for p in others) * ratio
+
+    @property
+    def status(self):
+        quarantined = sum(p.quarantined for p in self.proxies.values())
+        working = [p for p in self.proxies.values() if not p.quarantined]
+        line = 'Proxies: {} working, {} quarantined, {} IP bans'.format(
+            len(working), quarantined, sum(p.bans for p in self.proxies.values()))
+        if working:
+            best = min(working, key=ProxyHealth.score)
+            line += ', best: {:.2f}s with {} workers'.format(best.latency, best.workers)
+        return line
@@ -0,0 +1,143 @@
+from collections.abc import MutableMapping
+
+
+class Record(MutableMapping):
+    """A normalized object with a slot for each of its fields
+
+    Smaller and faster to create than the dict it replaces, but can be used
+    as one, so the caches, the database processor and the notifier
+    (including user-defined rules and formats) keep working with keys.
+    Fields that haven't been set behave like missing keys.
+    """
+    __slots__ = ()
+    _fields = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError('{} has no field {!r}'.format(self.__class__.__name__, key))
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        try:
+            if key in self._fields:
+                delattr(self, key)
+                return
+        except AttributeError:
+            pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, ', '.join(
+            '{}={!r}'.format(key, getattr(self, key)) for key in self))
+
+    def copy(self):
+        record = object.__new__(self.__class__)
+        for key in self:
+            setattr(record, key, getattr(self, key))
+        return record
+
+
+class PokemonRecord(Record):
+    """A wild or lured Pokemon, type is 'mystery' if its despawn time is unknown"""
+    __slots__ = ('type', 'encounter_id', 'pokemon_id', 'lat', 'lon', 'spawn_id',
+                 'seen', 'expire_timestamp', 'time_till_hidden', 'inferred', 'display',
+                 # from encounters
+                 'move_1', 'move_2', 'individual_attack', 'individual_defense',
+                 'individual_stamina', 'height', 'weight', 'gender', 'cp', 'level')
+    _fields = frozenset(__slots__)
+
+    def __init__(self, type, encounter_id, pokemon_id, lat, lon, spawn_id):
+        self.type = type
+        self.encounter_id = encounter_id
+        self.pokemon_id = pokemon_id
+        self.lat = lat
+        self.lon = lon
+        self.spawn_id = spawn_id
+
+
+class FortRecord(Record):
+    """A gym sighting"""
+    __slots__ = ('type', 'external_id', 'lat', 'lon', 'name', 'url', 'desc', 'team',
+                 'prestige', 'guard_pokemon_id', 'last_modified', 'slots_available')
+    _fields = frozenset(__slots__)
+
+    def __init__(self, external_id, lat, lon, name, url, desc, team=None, prestige=None,
+                 guard_pokemon_id=None, last_modified=0, slots_available=None):
+        self.type = 'fort'
+        self.external_id = external_id
+        self.lat = lat
+        self.lon = lon
+        self.name = name
+        self.url = url
+        self.desc = desc
+        self.team = team
+        self.prestige = prestige
+        self.guard_pokemon_id = guard_pokemon_id
+        self.last_modified = last_modified
+        self.slots_available = slots_available
+
+
+class RaidRecord(Record):
+    __slots__ = ('type', 'external_id', 'fort_external_id', 'lat', 'lon', 'level',
+                 'pokemon_id', 'move_1', 'move_2', 'time_spawn', 'time_battle', 'time_end')
+    _fields = frozenset(__slots__)
+
+    def __init__(self, fort_external_id, time_end, pokemon_id, external_id=None,
+                 lat=None, lon=None, level=None, move_1=0, move_2=0, time_spawn=None,
+                 time_battle=None):
+        self.type = 'raid'
+        self.external_id = external_id
+        self.fort_external_id = fort_external_id
+        self.lat = lat
+        self.lon = lon
+        self.level = level
+        self.pokemon_id = pokemon_id
+        self.move_1 = move_1
+        self.move_2 = move_2
+        self.time_spawn = time_spawn
+        self.time_battle = time_battle
+        self.time_end = time_end
+
+
+class PokestopRecord(Record):
+    __slots__ = ('type', 'external_id', 'lat', 'lon', 'name', 'url', 'desc', 'lure_start')
+    _fields = frozenset(__slots__)
+
+    def __init__(self, external_id, lat, lon, name, url=None, desc=None, lure_start=0):
+        self.type = 'pokestop'
+        self.external_id = external_id
+        self.lat = lat
+        self.lon = lon
+        self.name = name
+        self.url = url
+        self.desc = desc
+        self.lure_start = lure_start
+
+
+class WeatherRecord(Record):
+    __slots__ = ('type', 's2_cell_id', 'condition', 'alert_severity', 'warn', 'day')
+    _fields = frozenset(__slots__)
+
+    def __init__(self, s2_cell_id, condition, alert_severity, warn, day):
+        self.type = 'weather'
+        self.s2_cell_id = s2_cell_id
+        self.condition = condition
+        self.alert_severity = alert_severity
+        self.warn = warn
+        self.day = day
@@ -0,0 +1,176 @@
+"""Latency and retries of the game API requests made by every worker
+
+Worker.call records how long each attempt took, the exceptions attempts
+failed with, and how long it waited for action pacing and for retries. Hash and
+game server round-trips are timed by wrapping aiopogo's hashing and RPC
+methods. The totals are shown in the status output and periodically written
+to a file in the Prometheus text format, for node_exporter's textfile
+collector or anything else that can read it.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from os import replace
+from os.path import join
+from time import monotonic
+
+from aiopogo.hash_server import HashServer
+from aiopogo.rpc_api import RpcApi
+
+from . import sanitized as conf
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+
+def request_name(request):
+    """Name of the main RPC of a request, e.g. GetMapObjects"""
+    try:
+        return RpcApi.get_request_name(request._req_method_list)
+    except AttributeError:
+        return 'unknown'
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, fraction):
+        """Estimate a percentile, interpolating within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+    def prometheus(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for upper, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            le = '+Inf' if upper == float('inf') else upper
+            lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, labels, le, cumulative))
+        labels = '{' + labels.rstrip(',') + '}' if labels else ''
+        lines.append('{}_sum{} {:.6f}'.format(name, labels, self.sum))
+        lines.append('{}_count{} {}'.format(name, labels, self.count))
+        return lines
+
+
+class RequestStats:
+    __slots__ = ('latency', 'errors', 'pacing', 'retrying')
+
+    def __init__(self):
+        # of every attempt that got a response
+        self.latency = Histogram()
+        # exception name: count
+        self.errors = Counter()
+        # seconds spent waiting for the time the previous action would take
+        self.pacing = 0.0
+        # seconds spent on failed attempts and sleeping after them
+        self.retrying = 0.0
+
+
+class RpcStats:
+    def __init__(self, shard=None):
+        self.shard = shard
+        # labels of every metric, so that the files of each shard can be combined
+        self.labels = '' if shard is None else 'shard="{}",'.format(shard)
+        # request name: RequestStats
+        self.requests = {}
+        self.hashing = Histogram()
+        self.game = Histogram()
+
+    def __getitem__(self, name):
+        try:
+            return self.requests[name]
+        except KeyError:
+            stats = self.requests[name] = RequestStats()
+            return stats
+
+    def install(self):
+        """Time the round-trips to the hashing and game servers"""
+        stats = self
+        hash_request = HashServer.hash
+        make_rpc = RpcApi._make_rpc
+
+        async def timed_hash(self, *args, **kwargs):
+            start = monotonic()
+            try:
+                return await hash_request(self, *args, **kwargs)
+            finally:
+                stats.hashing.add(monotonic() - start)
+
+        async def timed_rpc(self, *args, **kwargs):
+            start = monotonic()
+            try:
+                return await make_rpc(self, *args, **kwargs)
+            finally:
+                stats.game.add(monotonic() - start)
+
+        HashServer.hash = timed_hash
+        RpcApi._make_rpc = timed_rpc
+
+    @property
+    def status(self):
+        busiest = sorted(self.requests.items(), key=lambda x: x[1].latency.count, reverse=True)
+        line = 'Requests: ' + ', '.join(
+            '{} {} p50 {:.2f}s p95 {:.2f}s errors {}'.format(
+                name, stats.latency.count, stats.latency.percentile(.5),
+                stats.latency.percentile(.95), sum(stats.errors.values()))
+            for name, stats in busiest[:3])
+        if self.hashing.count or self.game.count:
+            line += '\nRound-trips p50/p95: hashing {:.2f}/{:.2f}s, game {:.2f}/{:.2f}s'.format(
+                self.hashing.percentile(.5), self.hashing.percentile(.95),
+                self.game.percentile(.5), self.game.percentile(.95))
+        return line
+
+    def prometheus(self):
+        labels = self.labels
+        lines = ['# TYPE monocle_request_seconds histogram']
+        for name, stats in self.requests.items():
+            lines.extend(stats.latency.prometheus(
+                'monocle_request_seconds', '{}request="{}",'.format(labels, name)))
+        lines.append('# TYPE monocle_request_errors_total counter')
+        for name, stats in self.requests.items():
+            for error, count in stats.errors.items():
+                lines.append('monocle_request_errors_total{{{}request="{}",error="{}"}} {}'.format(
+                    labels, name, error, count))
+        for metric in ('pacing', 'retrying'):
+            lines.append('# TYPE monocle_request_{}_seconds_total counter'.format(metric))
+            for name, stats in self.requests.items():
+                lines.append('monocle_request_{}_seconds_total{{{}request="{}"}} {:.6f}'.format(
+                    metric, labels, name, getattr(stats, metric)))
+        lines.append('# TYPE monocle_hashing_seconds histogram')
+        lines.extend(self.hashing.prometheus('monocle_hashing_seconds', labels))
+        lines.append('# TYPE monocle_rpc_seconds histogram')
+        lines.extend(self.game.prometheus('monocle_rpc_seconds', labels))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, text):
+        if self.shard is None:
+            filename = 'rpc_stats.prom'
+        else:
+            filename = 'rpc_stats-{}.prom'.format(self.shard)
+        location = join(conf.DIRECTORY, filename)
+        temporary = location + '.tmp'
+        with open(temporary, 'wt') as f:
+            f.write(text)
+        replace(temporary, location)
+        return location
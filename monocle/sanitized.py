@@ -20,6 +20,7 @@ worker_count = config.GRID[0] * config.GRID[1]
 _valid_types = {
     'ACCOUNTS': set_sequence,
     'ACCOUNTS_CSV': path,
+    'ADAPTIVE_CONCURRENCY': bool,
     'ALT_PRECISION': int,
     'ALT_RANGE': sequence,
     'ALWAYS_NOTIFY': int,
@@ -34,10 +35,13 @@ _valid_types = {
     'CAPTCHA_KEY': str,
     'COMPLETE_TUTORIAL': bool,
     'COROUTINES_LIMIT': int,
+    'COROUTINES_MAX': int,
+    'COROUTINES_MIN': int,
     'DATETIME_FORMAT_SPEC': str,
     'DATETIME_RANGE_FORMAT': str,
     'DB': dict,
     'DB_ENGINE': str,
+    'DEFER_FORT_DETAILS': bool,
     'DIRECTORY': path,
     'DISCORD_INVITE_ID': str,
     'DISCORD_RAID_AVATAR': str,
@@ -71,21 +75,28 @@ _valid_types = {
     'DURATION_RANGE_FORMAT': str,
     'EMULATE_LEGACY_RARITY_BUGS': bool,
     'ENCOUNTER': str,
+    'ENCOUNTER_DISPATCH': bool,
     'ENCOUNTER_IDS': set_sequence_range,
+    'ENCOUNTER_TIMEOUT': Number,
     'FAILURES_ALLOWED': int,
     'FAVOR_CAPTCHA': bool,
     'FB_PAGE_ID': str,
     'FIXED_OPACITY': bool,
     'FORCED_KILL': bool,
+    'FORT_DETAILS_RATE': Number,
+    'FORT_FINGERPRINTS': bool,
     'FULL_TIME': Number,
     'GENDER_SYMBOLS': dict,
     'GENDER_TEXT': dict,
     'GIVE_UP_KNOWN': Number,
     'GIVE_UP_UNKNOWN': Number,
+    'GMO_CAPTURE': path,
+    'GMO_SINCE_TIMESTAMPS': bool,
     'GOOD_ENOUGH': Number,
     'GOOGLE_MAPS_KEY': str,
     'GRID': sequence,
     'HASHTAGS': set_sequence,
+    'HASH_BUDGET': bool,
     'HASH_KEY': (str,) + set_sequence,
     'HEATMAP': bool,
     'IGNORE_IVS': bool,
@@ -97,11 +108,16 @@ _valid_types = {
     'ITEM_LIMITS': dict,
     'IV_FONT': str,
     'LANDMARKS': object,
+    'LAG_TARGET': Number,
     'LANGUAGE': str,
     'LAST_MIGRATION': Number,
+    'LEASE_DURATION': Number,
+    'LEASE_LEVEL': int,
+    'LEASE_PARTITIONS': bool,
     'LOAD_CUSTOM_CSS_FILE': bool,
     'LOAD_CUSTOM_HTML_FILE': bool,
     'LOAD_CUSTOM_JS_FILE': bool,
+    'LOOP_WATCHDOG': bool,
     'LOGIN_TIMEOUT': Number,
     'LURE_DURATION': Number,
     'MANAGER_ADDRESS': (str, tuple, list),
@@ -111,6 +127,7 @@ _valid_types = {
     'MAP_PROVIDER_URL': str,
     'MAP_START': sequence,
     'MAP_WORKERS': bool,
+    'MAP_WORKERS_REFRESH': Number,
     'MAX_CAPTCHAS': int,
     'MAX_RETRIES': int,
     'MINIMUM_RUNTIME': Number,
@@ -120,6 +137,7 @@ _valid_types = {
     'NAME_FONT': str,
     'NAV_URL_FORMAT': str,
     'NEVER_NOTIFY_IDS': set_sequence_range,
+    'NODE_NAME': str,
     'NON_NESTING_IDS': set_sequence_range,
     'NOTIFY': (bool, object),
     'NOTIFY_DEFAULT_CONNECT_TIMEOUT': Number,
@@ -151,6 +169,8 @@ _valid_types = {
     'REPORT_MAPS': bool,
     'REPORT_SINCE': datetime,
     'RESCAN_UNKNOWN': Number,
+    'RESUME_SESSIONS': Number,
+    'RPC_STATS': bool,
     'SCAN_DELAY': Number,
     'SEARCH_SLEEP': Number,
     'SHOW_TIMER': bool,
@@ -175,11 +195,13 @@ _valid_types = {
     'SMTP_TLS': bool,
     'SMTP_TO': (str, tuple, list, set, frozenset),
     'SMTP_USERNAME': str,
+    'SPARE_ACCOUNTS': int,
     'SPAWN_ID_INT': bool,
     'SPEED_LIMIT': Number,
     'SPEED_UNIT': str,
     'SPIN_COOLDOWN': Number,
     'SPIN_POKESTOPS': bool,
+    'STARTUP_RAMP': bool,
     'STAT_REFRESH': Number,
     'STAY_WITHIN_MAP': bool,
     'SWAP_OLDEST': Number,
@@ -209,6 +231,7 @@ _valid_types = {
     'TWITTER_TEXT_LIMIT': int,
     'TZ_OFFSET': Number,
     'UVLOOP': bool,
+    'WATCHDOG_THRESHOLD': Number,
     'WEBHOOKS': set_sequence,
     'WEBHOOK_TIMEOUT': Number,
     'WEBHOOK_VERIFY_TLS': bool,
@@ -217,6 +240,7 @@ _valid_types = {
 _defaults = {
     'ACCOUNTS': None,
     'ACCOUNTS_CSV': None,
+    'ADAPTIVE_CONCURRENCY': False,
     'ALT_PRECISION': 2,
     'ALT_RANGE': (300, 400),
     'ALWAYS_NOTIFY': 0,
@@ -232,8 +256,11 @@ _defaults = {
     'COMPLETE_TUTORIAL': False,
     'CONTROL_SOCKS': None,
     'COROUTINES_LIMIT': worker_count,
+    'COROUTINES_MAX': worker_count * 2,
+    'COROUTINES_MIN': max(worker_count // 4, 1),
     'DATETIME_FORMAT_SPEC': "%X",
     'DATETIME_RANGE_FORMAT': "between {min} and {max}",
+    'DEFER_FORT_DETAILS': False,
     'DIRECTORY': '.',
     'DISCORD_INVITE_ID': None,
     'DISCORD_RAID_EGG_AVATAR': None,
@@ -267,20 +294,27 @@ _defaults = {
     'DURATION_RANGE_FORMAT': "between {min} and {max}",
     'EMULATE_LEGACY_RARITY_BUGS': False,
     'ENCOUNTER': None,
+    'ENCOUNTER_DISPATCH': False,
     'ENCOUNTER_IDS': None,
+    'ENCOUNTER_TIMEOUT': 20,
     'FAVOR_CAPTCHA': True,
     'FAILURES_ALLOWED': 2,
     'FB_PAGE_ID': None,
     'FIXED_OPACITY': False,
     'FORCED_KILL': None,
+    'FORT_DETAILS_RATE': 30,
+    'FORT_FINGERPRINTS': False,
     'FULL_TIME': 1800,
     'GENDER_SYMBOLS': {1: "♂", 2: "♀", 3: "⚲"},
     'GENDER_TEXT': {1: "male", 2: "female", 3: "genderless"},
     'GIVE_UP_KNOWN': 75,
     'GIVE_UP_UNKNOWN': 60,
+    'GMO_CAPTURE': None,
+    'GMO_SINCE_TIMESTAMPS': False,
     'GOOD_ENOUGH': 0.1,
     'GOOGLE_MAPS_KEY': '',
     'HASHTAGS': None,
+    'HASH_BUDGET': False,
     'IGNORE_IVS': False,
     'IGNORE_RARITY': False,
     'IGNORE_SENDER_TEST': False,
@@ -290,11 +324,16 @@ _defaults = {
     'ITEM_LIMITS': None,
     'IV_FONT': 'monospace',
     'LANDMARKS': None,
+    'LAG_TARGET': 0.05,
     'LANGUAGE': 'EN',
     'LAST_MIGRATION': 1481932800,
+    'LEASE_DURATION': 120,
+    'LEASE_LEVEL': 13,
+    'LEASE_PARTITIONS': False,
     'LOAD_CUSTOM_CSS_FILE': False,
     'LOAD_CUSTOM_HTML_FILE': False,
     'LOAD_CUSTOM_JS_FILE': False,
+    'LOOP_WATCHDOG': False,
     'LOGIN_TIMEOUT': 2.5,
     'LURE_DURATION': 1800,
     'MANAGER_ADDRESS': None,
@@ -302,6 +341,7 @@ _defaults = {
     'MAP_PROVIDER_URL': '//{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
     'MAP_PROVIDER_ATTRIBUTION': '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
     'MAP_WORKERS': True,
+    'MAP_WORKERS_REFRESH': 5,
     'MAX_CAPTCHAS': 0,
     'MAX_RETRIES': 3,
     'MINIMUM_RUNTIME': 10,
@@ -310,6 +350,7 @@ _defaults = {
     'NAME_FONT': 'sans-serif',
     'NAV_URL_FORMAT': 'https://www.google.com/maps?q={lat:.5f},{lon:.5f}',
     'NEVER_NOTIFY_IDS': (),
+    'NODE_NAME': None,
     'NON_NESTING_IDS': (),
     'NOTIFY': False,
     'NOTIFY_DEFAULT_CONNECT_TIMEOUT': 7,
@@ -341,6 +382,8 @@ _defaults = {
     'REPORT_MAPS': True,
     'REPORT_SINCE': None,
     'RESCAN_UNKNOWN': 90,
+    'RESUME_SESSIONS': 0,
+    'RPC_STATS': False,
     'SCAN_DELAY': 10,
     'SEARCH_SLEEP': 2.5,
     'SHOW_TIMER': False,
@@ -365,11 +408,13 @@ _defaults = {
     'SMTP_TLS': False,
     'SMTP_TO': [],
     'SMTP_USERNAME': None,
+    'SPARE_ACCOUNTS': 0,
     'SPAWN_ID_INT': True,
     'SPEED_LIMIT': 19.5,
     'SPEED_UNIT': 'miles',
     'SPIN_COOLDOWN': 300,
     'SPIN_POKESTOPS': True,
+    'STARTUP_RAMP': False,
     'STAT_REFRESH': 5,
     'STAY_WITHIN_MAP': True,
     'SWAP_OLDEST': 21600 / worker_count,
@@ -414,6 +459,7 @@ _defaults = {
     'TWITTER_TEXT_LIMIT': 280,
     'TZ_OFFSET': None,
     'UVLOOP': True,
+    'WATCHDOG_THRESHOLD': 0.25,
     'WEBHOOKS': None,
     'WEBHOOK_TIMEOUT': 4,
     'WEBHOOK_VERIFY_TLS': True,
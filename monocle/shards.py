@@ -0,0 +1,33 @@
+from . import bounds, sanitized as conf
+
+
+class Shard:
+    """One scanner process's share of the map when running multiple processes
+
+    The map is cut into equal-width longitude bands, each of which gets the
+    worker grid columns that start inside it.
+    """
+    def __init__(self, index, total, grid=conf.GRID):
+        if not 0 < total <= grid[1]:
+            raise ValueError('The number of scanner processes must be between 1 and the number of GRID columns.')
+        self.index = index
+        self.total = total
+
+        width = (bounds.east - bounds.west) / total
+        # the outer bands are open-ended so that nothing near the edges is lost
+        self.west = bounds.west + width * index if index > 0 else float('-inf')
+        self.east = bounds.west + width * (index + 1) if index < total - 1 else float('inf')
+
+        columns = grid[1]
+        first = columns * index // total
+        last = columns * (index + 1) // total
+        self.columns = last - first
+        self.worker_nos = tuple(row * columns + column
+                                for row in range(grid[0])
+                                for column in range(first, last))
+
+    def __contains__(self, point):
+        return self.west <= point[1] < self.east
+
+    def __str__(self):
+        return '{}/{}'.format(self.index + 1, self.total)
@@ -0,0 +1,327 @@
+"""Simulated game API for benchmarking without accounts or network access
+
+Install it before any workers are created to replace aiopogo's PGoApi and
+HashServer in the worker and overseer modules.
+"""
+
+from asyncio import sleep
+from importlib import import_module
+from math import cos, radians
+from random import Random
+from time import time
+
+from aiopogo import exceptions as ex
+from aiopogo.pogoprotos.networking.requests.request_type_pb2 import RequestType
+from pogeo import get_distance
+
+from . import bounds, sanitized as conf
+from .shared import LOOP
+
+# how far from the requested point things are returned, in meters
+POKEMON_RADIUS = 70
+FORT_RADIUS = 450
+# size of the buckets things are indexed in, in degrees of latitude
+BUCKET_SIZE = 0.005
+
+ERRORS = (ex.TimeoutException, ex.NianticOfflineException, ex.MalformedResponseException)
+
+
+class SimulatedHashServer:
+    """Stand-in for aiopogo.HashServer, only its status is used by Monocle"""
+    status = {}
+
+
+class SimulatedAuth:
+    def __init__(self):
+        self.authenticated = False
+
+
+class SpawnField:
+    """Synthetic spawn points and forts spread over the scan area
+
+    Every spawn point has a Pokemon for the 30 minutes before its despawn
+    second of the hour, just like regular spawn points.
+    """
+    def __init__(self, spawn_density=50, fort_density=5, gym_ratio=0.2, seed=0):
+        self.rng = Random(seed)
+        area = max(bounds.area, 1)
+        self.lon_scale = cos(radians(bounds.center[0]))
+        # [(spawn_id, lat, lon, despawn second)]
+        self.spawns = []
+        for i in range(round(area * spawn_density)):
+            lat, lon = self.random_point()
+            spawn_id = '{:x}'.format(self.rng.getrandbits(56) | 1 << 56)
+            self.spawns.append((spawn_id, lat, lon, self.rng.randrange(3600)))
+        # [(fort_id, lat, lon, is_gym)]
+        self.forts = []
+        for i in range(round(area * fort_density)):
+            lat, lon = self.random_point()
+            gym = self.rng.random() < gym_ratio
+            self.forts.append(('{:032x}.{}'.format(self.rng.getrandbits(128), 16 if gym else 11),
+                               lat, lon, gym))
+        self.spawn_buckets = self.index(self.spawns)
+        self.fort_buckets = self.index(self.forts)
+
+    def random_point(self):
+        return (self.rng.uniform(bounds.south, bounds.north),
+                self.rng.uniform(bounds.west, bounds.east))
+
+    def bucket(self, lat, lon):
+        return int(lat // BUCKET_SIZE), int(lon * self.lon_scale // BUCKET_SIZE)
+
+    def index(self, things):
+        buckets = {}
+        for number, thing in enumerate(things):
+            buckets.setdefault(self.bucket(thing[1], thing[2]), []).append(number)
+        return buckets
+
+    def nearby(self, things, buckets, point, radius):
+        lat, lon = self.bucket(*point)
+        reach = int(radius / 111000 // BUCKET_SIZE) + 1
+        for x in range(lat - reach, lat + reach + 1):
+            for y in range(lon - reach, lon + reach + 1):
+                for number in buckets.get((x, y), ()):
+                    thing = things[number]
+                    if get_distance(point, (thing[1], thing[2])) <= radius:
+                        yield number, thing
+
+    def pokemon(self, point, now):
+        """Yields (spawn number, spawn, despawn timestamp) of visible Pokemon"""
+        for number, spawn in self.nearby(self.spawns, self.spawn_buckets, point, POKEMON_RADIUS):
+            remaining = (spawn[3] - now) % 3600
+            if 0 < remaining <= 1800:
+                yield number, spawn, now + remaining
+
+    def spawn_points(self, point):
+        for number, spawn in self.nearby(self.spawns, self.spawn_buckets, point, FORT_RADIUS):
+            yield spawn
+
+    def get_forts(self, point):
+        for number, fort in self.nearby(self.forts, self.fort_buckets, point, FORT_RADIUS):
+            yield fort
+
+
+class Simulator:
+    """Generates responses and keeps statistics for all simulated APIs"""
+    def __init__(self, field, latency=0.3, jitter=0.1, error_rate=0.0,
+                 captcha_rate=0.0, hashes_per_minute=1500, seed=0):
+        self.field = field
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.hashes_per_minute = hashes_per_minute
+        self.rng = Random(seed)
+        # {rpc name: response class or None}
+        self.classes = {}
+        self.requests = 0
+        self.errors = 0
+        self.captchas = 0
+        self.map_objects = 0
+        self.notifications = 0
+        self.responders = {
+            'CHECK_CHALLENGE': self.check_challenge,
+            'DOWNLOAD_SETTINGS': self.download_settings,
+            'ENCOUNTER': self.encounter,
+            'FORT_DETAILS': self.fort_details,
+            'GET_INVENTORY': self.get_inventory,
+            'GET_MAP_OBJECTS': self.get_map_objects,
+            'GYM_GET_INFO': self.gym_get_info,
+        }
+        SimulatedHashServer.status = {
+            'remaining': hashes_per_minute,
+            'maximum': hashes_per_minute,
+            'period': time() + 60
+        }
+
+    def install(self):
+        from . import overseer, worker
+        simulator = self
+
+        class SimulatedApi(SimulatedPGoApi):
+            def __init__(self, *args, **kwargs):
+                super().__init__(simulator, *args, **kwargs)
+
+        worker.PGoApi = SimulatedApi
+        worker.HashServer = SimulatedHashServer
+        overseer.HashServer = SimulatedHashServer
+
+    def silence_notifier(self, notifier):
+        """Count notifications instead of sending them"""
+        async def send(event, attachments=()):
+            self.notifications += 1
+
+        async def test():
+            pass
+
+        for channel in notifier._channelmap.values():
+            for sender in channel.senders:
+                sender.send = send
+                sender.test = test
+
+    def get_class(self, name):
+        try:
+            return self.classes[name]
+        except KeyError:
+            try:
+                module = import_module('aiopogo.pogoprotos.networking.responses.{}_response_pb2'.format(name.lower()))
+                cls = getattr(module, ''.join(x.title() for x in name.split('_')) + 'Response')
+            except (ImportError, AttributeError):
+                cls = None
+            self.classes[name] = cls
+            return cls
+
+    def use_hash(self):
+        status = SimulatedHashServer.status
+        now = time()
+        if now > status['period']:
+            status['remaining'] = status['maximum']
+            status['period'] = now + 60
+        if status['remaining'] <= 0:
+            raise ex.HashingQuotaExceededException('Simulated hashing quota exceeded.')
+        status['remaining'] -= 1
+
+    async def respond(self, api, calls):
+        self.requests += 1
+        await sleep(max(self.rng.gauss(self.latency, self.jitter), 0.0), loop=LOOP)
+        self.use_hash()
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise self.rng.choice(ERRORS)('Simulated error.')
+
+        responses = {}
+        for name, kwargs in calls:
+            cls = self.get_class(name)
+            if cls is None:
+                continue
+            response = cls()
+            responder = self.responders.get(name)
+            if responder:
+                responder(api, response, **kwargs)
+            responses[name] = response
+        return responses
+
+    def check_challenge(self, api, response, **kwargs):
+        if self.rng.random() < self.captcha_rate:
+            self.captchas += 1
+            response.show_challenge = True
+            response.challenge_url = 'https://simulated.invalid/captcha'
+        else:
+            response.challenge_url = ' '
+
+    def download_settings(self, api, response, **kwargs):
+        response.hash = 'simulated'
+        response.settings.minimum_client_version = '0.91.2'
+
+    def encounter(self, api, response, **kwargs):
+        response.status = 1
+        pdata = response.wild_pokemon.pokemon_data
+        pdata.move_1 = self.rng.randint(200, 280)
+        pdata.move_2 = self.rng.randint(13, 140)
+        pdata.individual_attack = self.rng.randrange(16)
+        pdata.individual_defense = self.rng.randrange(16)
+        pdata.individual_stamina = self.rng.randrange(16)
+        pdata.height_m = self.rng.uniform(0.3, 2.0)
+        pdata.weight_kg = self.rng.uniform(1.0, 100.0)
+        pdata.pokemon_display.gender = self.rng.randint(1, 2)
+
+    def fort_details(self, api, response, fort_id='', **kwargs):
+        response.fort_id = fort_id
+        response.name = 'Pokestop {}'.format(fort_id[:8])
+        response.image_urls.append('https://simulated.invalid/{}.jpg'.format(fort_id[:8]))
+        response.description = 'Simulated Pokestop'
+
+    def get_inventory(self, api, response, **kwargs):
+        response.success = True
+        response.inventory_delta.new_timestamp_ms = int(time() * 1000)
+
+    def gym_get_info(self, api, response, gym_id='', **kwargs):
+        response.name = 'Gym {}'.format(gym_id[:8])
+        response.url = 'https://simulated.invalid/{}.jpg'.format(gym_id[:8])
+        response.description = 'Simulated Gym'
+
+    def get_map_objects(self, api, response, latitude=None, longitude=None, **kwargs):
+        self.map_objects += 1
+        point = latitude, longitude
+        now = time()
+        now_ms = int(now * 1000)
+        response.status = 1
+        response.time_of_day = 1
+        cell = response.map_cells.add()
+        cell.current_timestamp_ms = now_ms
+        for number, spawn, despawn in self.field.pokemon(point, int(now)):
+            hour = despawn // 3600
+            pokemon = cell.wild_pokemons.add()
+            pokemon.encounter_id = (number << 20 | hour & 0xfffff) & 0x7fffffffffffffff
+            pokemon.spawn_point_id = spawn[0]
+            pokemon.latitude = spawn[1]
+            pokemon.longitude = spawn[2]
+            pokemon.last_modified_timestamp_ms = now_ms
+            tth = int((despawn - now) * 1000)
+            # the real API only reveals the time left in the last 90 seconds
+            pokemon.time_till_hidden_ms = tth if tth <= 90000 else -1
+            pokemon.pokemon_data.pokemon_id = (number * 7919 + hour) % 251 + 1
+        for fort_id, lat, lon, gym in self.field.get_forts(point):
+            fort = cell.forts.add()
+            fort.id = fort_id
+            fort.latitude = lat
+            fort.longitude = lon
+            fort.enabled = True
+            fort.type = 0 if gym else 1
+            fort.last_modified_timestamp_ms = now_ms - now_ms % 3600000
+            if gym:
+                fort.owned_by_team = int(fort_id[:2], 16) % 4
+        if conf.MORE_POINTS:
+            for spawn in self.field.spawn_points(point):
+                spawn_point = cell.spawn_points.add()
+                spawn_point.latitude = spawn[1]
+                spawn_point.longitude = spawn[2]
+
+    @property
+    def status(self):
+        return ('Simulated requests: {}, GetMapObjects: {}, errors: {}, CAPTCHAs: {}, '
+                'notifications: {}'.format(self.requests, self.map_objects, self.errors,
+                                           self.captchas, self.notifications))
+
+
+class SimulatedRequest:
+    """Collects RPCs like aiopogo's PGoApiRequest and answers from the simulator"""
+    def __init__(self, api):
+        self.api = api
+        # [(rpc name, kwargs)]
+        self.calls = []
+
+    def __getattr__(self, name):
+        def function(**kwargs):
+            self.calls.append((name.upper(), kwargs))
+            return self
+        return function
+
+    @property
+    def _req_method_list(self):
+        # named like aiopogo's, so that requests are counted by type
+        return [(RequestType.Value(name), kwargs) for name, kwargs in self.calls]
+
+    async def call(self):
+        return await self.api.simulator.respond(self.api, self.calls)
+
+
+class SimulatedPGoApi:
+    """Implements the parts of aiopogo.PGoApi that Monocle's workers use"""
+    def __init__(self, simulator, device_info=None):
+        self.simulator = simulator
+        self.device_info = device_info
+        self.auth_provider = SimulatedAuth()
+        self.proxy = None
+        self.position = None
+        self.start_time = time()
+
+    def set_position(self, lat, lon, alt=None):
+        self.position = lat, lon, alt
+
+    async def set_authentication(self, username=None, password=None, provider=None, timeout=None, refresh_token=None):
+        await sleep(max(self.simulator.rng.gauss(self.simulator.latency, self.simulator.jitter), 0.0), loop=LOOP)
+        self.auth_provider.authenticated = True
+
+    def create_request(self):
+        return SimulatedRequest(self)
@@ -0,0 +1,142 @@
+from asyncio import sleep, CancelledError
+from collections import deque
+from itertools import count
+
+from aiopogo import exceptions as ex
+
+from .shared import get_logger, LOOP
+from .worker import Worker, CaptchaException
+from . import altitudes, hashbudget, sanitized as conf
+
+
+class SpareDiscarded(Exception):
+    """Raised when a spare's account was swapped out while logging in."""
+
+
+class SpareWorker(Worker):
+    """An extra account logging in, to be handed to a worker swapping accounts"""
+
+    # spares aren't among the overseer's workers
+    positions = None
+    worker_map = None
+
+    def __init__(self, spare_no):
+        super().__init__(spare_no % (conf.GRID[0] * conf.GRID[1]), None)
+        self.spare_no = spare_no
+        self.log = get_logger('spare-{}'.format(spare_no))
+
+    async def call(self, request, priority=hashbudget.DETAILS, **kwargs):
+        # logging in ahead of time can wait for the hashes to spare
+        return await super().call(request, priority=priority, **kwargs)
+
+    async def new_account(self):
+        # the account has already been put back in a queue
+        if self.proxies:
+            self.proxies.release(self.proxy)
+        raise SpareDiscarded
+
+    async def prepare(self):
+        """Returns True once logged in, or False if the account was put aside"""
+        try:
+            try:
+                self.altitude = altitudes.get(self.location)
+            except KeyError:
+                self.altitude = altitudes.fallback()
+            self.api.set_position(*self.location, self.altitude)
+            return await self.login()
+        except SpareDiscarded:
+            pass
+        except CaptchaException:
+            self.log.warning('Benching {} due to CAPTCHA.', self.username)
+            self.account['captcha'] = True
+            self.put_back(self.captcha_queue)
+        except ex.WarnAccountException:
+            self.log.warning('Removing {} due to warn.', self.username)
+            self.account['warn'] = True
+            self.put_back()
+        except ex.BannedAccountException:
+            self.log.warning('Removing {} due to ban.', self.username)
+            self.account['banned'] = True
+            self.put_back()
+        except CancelledError:
+            self.put_back(self.extra_queue)
+            raise
+        except Exception as e:
+            self.log.warning('{} while logging in {}: {}', e.__class__.__name__, self.username, e)
+            self.put_back(self.extra_queue)
+        return False
+
+    def put_back(self, queue=None):
+        """Save the account, and return it to queue if given"""
+        if self.proxies:
+            self.proxies.release(self.proxy)
+        self.update_accounts_dict()
+        if queue is not None:
+            queue.put(self.account)
+
+
+class SparePool:
+    """Accounts that are kept logged in, so that swaps don't wait for a login
+
+    Logging in and going through the app simulation takes several requests
+    and a lot of waiting, during which a worker swapping accounts would scan
+    nothing. Instead, spare accounts are taken from the extra queue and
+    logged in ahead of time, and a worker swapping accounts takes over the
+    session of a ready spare if there is one.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.ready = deque()
+        self.preparing = set()
+        self.numbers = count()
+        self.used = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self.ready)
+
+    async def maintain(self, interval=5):
+        """Keep logging in spares until there are enough of them"""
+        try:
+            while True:
+                while (len(self.ready) + len(self.preparing) < self.size
+                        and not Worker.extra_queue.empty()):
+                    task = LOOP.create_task(self.prepare())
+                    task.add_done_callback(self.preparing.discard)
+                    self.preparing.add(task)
+                await sleep(interval, loop=LOOP)
+        finally:
+            for task in tuple(self.preparing):
+                task.cancel()
+
+    async def prepare(self):
+        try:
+            spare = SpareWorker(next(self.numbers))
+        except ValueError:
+            # another process got the last account first
+            return
+        if await spare.prepare():
+            self.ready.append(spare)
+        else:
+            self.failed += 1
+
+    def take(self):
+        """Returns a logged in spare, or None if none are ready"""
+        while self.ready:
+            spare = self.ready.popleft()
+            if spare.authenticated:
+                self.used += 1
+                return spare
+            # its session expired while waiting
+            spare.put_back(Worker.extra_queue)
+        return None
+
+    def release(self):
+        """Put the accounts of every ready spare back in the extra queue"""
+        while self.ready:
+            self.ready.popleft().put_back(Worker.extra_queue)
+
+    @property
+    def status(self):
+        return 'Spare accounts ready: {}/{}, logging in: {}, used: {}, failed: {}'.format(
+            len(self.ready), self.size, len(self.preparing), self.used, self.failed)
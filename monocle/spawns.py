@@ -26,6 +26,8 @@ class BaseSpawns:
         self.class_version = 3
         self.db_hash = sha256(conf.DB_ENGINE.encode()).digest()
         self.log = get_logger('spawns')
+        # set when this process only scans part of the map
+        self.shard = None
 
     def __len__(self):
         return len(self.despawn_times)
@@ -53,7 +55,8 @@ class BaseSpawns:
                     continue
 
                 if not spawn.updated or spawn.updated <= last_migration:
-                    self.unknown.add(point)
+                    if self.owns(point):
+                        self.unknown.add(point)
                     continue
 
                 if spawn.duration == 60:
@@ -61,10 +64,22 @@ class BaseSpawns:
                 else:
                     spawn_time = (spawn.despawn_time + 1800) % 3600
 
+                # despawn times are kept for the whole map, since any
+                # Pokemon seen near the edge of a shard needs one
                 self.despawn_times[spawn.spawn_id] = spawn.despawn_time
-                known[point] = spawn.spawn_id, spawn_time
+                if self.owns(point):
+                    known[point] = spawn.spawn_id, spawn_time
         self.known = OrderedDict(sorted(known.items(), key=lambda k: k[1][1]))
 
+    def owns(self, point):
+        """Is point scanned by this process?"""
+        return self.shard is None or point in self.shard
+
+    def apply_shard(self, shard):
+        self.shard = shard
+        self.known = OrderedDict(x for x in self.known.items() if x[0] in shard)
+        self.unknown = {x for x in self.unknown if x in shard}
+
     def after_last(self):
         try:
             k = next(reversed(self.known))
@@ -86,11 +101,14 @@ class BaseSpawns:
     def unpickle(self):
         try:
             state = load_pickle('spawns', raise_exception=True)
+            state.pop('shard', None)
             if all((state['class_version'] == self.class_version,
                     state['db_hash'] == self.db_hash,
                     state['bounds_hash'] == hash(bounds),
                     state['last_migration'] == conf.LAST_MIGRATION)):
                 self.__dict__.update(state)
+                if self.shard is not None:
+                    self.apply_shard(self.shard)
                 return True
             else:
                 self.log.warning('Configuration changed, reloading spawns from DB.')
@@ -101,6 +119,9 @@ class BaseSpawns:
         return False
 
     def pickle(self):
+        if self.shard is not None:
+            # only the parent process's full view of the map is pickled
+            return
         state = self.__dict__.copy()
         del state['log']
         state.pop('cells_count', None)
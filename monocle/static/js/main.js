@@ -1,4 +1,6 @@
 var _last_pokemon_id = 0;
+var _last_workers_time = 0;
+var _worker_markers = {};
 var _pokemon_count = 386;
 var _raids_count = 5;
 var _raids_labels = ['Normal', 'Normal', 'Rare', 'Rare', 'Legendary'];
@@ -482,10 +484,14 @@ function addScanAreaToMap (data, map) {
 }
 
 function addWorkersToMap (data, map) {
-    overlays.Workers.clearLayers()
-    data.forEach(function (item) {
+    _last_workers_time = data.time;
+    data.workers.forEach(function (item) {
+        if (item.worker_no in _worker_markers) {
+            overlays.Workers.removeLayer(_worker_markers[item.worker_no]);
+        }
         marker = WorkerMarker(item);
         marker.addTo(overlays.Workers);
+        _worker_markers[item.worker_no] = marker;
     });
 }
 
@@ -573,7 +579,7 @@ function getWorkers() {
         return;
     }
     new Promise(function (resolve, reject) {
-        $.get('/workers_data', function (response) {
+        $.get('/workers_data?since=' + _last_workers_time, function (response) {
             resolve(response);
         });
     }).then(function (data) {
@@ -18,6 +18,7 @@ from aiopogo import utilities as pgoapi_utils
 from pogeo import get_distance
 
 from . import bounds, sanitized as conf
+from .accounts import AccountStore
 
 # iPhones 5 and more
 IPHONES = {'iPhone5,1': 'N41AP',
@@ -296,24 +297,28 @@ def dump_pickle(name, var):
 
 
 def load_accounts():
-    pickled_accounts = load_pickle('accounts')
+    store = AccountStore(join(conf.DIRECTORY, 'pickles', 'accounts.sqlite'))
+    # fall back to the pickle that was used before the store
+    pickled_accounts = dict(store) or load_pickle('accounts')
 
     if conf.ACCOUNTS_CSV:
         accounts = load_accounts_csv()
         if pickled_accounts and set(pickled_accounts) == set(accounts):
-            return pickled_accounts
+            accounts = pickled_accounts
         else:
             accounts = accounts_from_csv(accounts, pickled_accounts)
     elif conf.ACCOUNTS:
         if pickled_accounts and set(pickled_accounts) == set(acc[0] for acc in conf.ACCOUNTS):
-            return pickled_accounts
+            accounts = pickled_accounts
         else:
             accounts = accounts_from_config(pickled_accounts)
     else:
         raise ValueError('Must provide accounts in a CSV or your config file.')
 
-    dump_pickle('accounts', accounts)
-    return accounts
+    if accounts is not pickled_accounts or not store:
+        store.replace(accounts)
+        store.save()
+    return store
 
 
 def load_accounts_csv():
@@ -0,0 +1,169 @@
+from collections import deque
+from datetime import datetime
+from inspect import CO_COROUTINE, CO_ITERABLE_COROUTINE
+from os import replace
+from os.path import dirname, join
+from sys import _current_frames, _getframe
+from threading import Event, Lock, Thread, get_ident
+from time import monotonic
+from traceback import format_list, StackSummary, walk_stack
+
+import asyncio
+
+from . import sanitized as conf
+from .shared import get_logger, LOOP
+
+ASYNCIO_DIR = dirname(asyncio.__file__)
+
+
+class Stall:
+    __slots__ = ('callback', 'coroutine', 'stack', 'started', 'duration')
+
+    def __init__(self, callback, coroutine, stack):
+        self.callback = callback
+        self.coroutine = coroutine
+        self.stack = stack
+        self.started = datetime.now()
+        self.duration = None
+
+    def __str__(self):
+        return '{} ({}) blocked the loop for {:.3f}s at {:%H:%M:%S}'.format(
+            self.callback, self.coroutine or 'no coroutine',
+            self.duration or 0.0, self.started)
+
+
+class LoopWatchdog:
+    """Detect callbacks that block the event loop and find out which they are
+
+    A heartbeat callback on the loop records when it last ran. A helper thread
+    checks on it, and when the heartbeat is late by more than the threshold it
+    captures the stack of the loop's thread while the offending callback is
+    still running. The report is rewritten every STAT_REFRESH seconds by the
+    overseer, and once more on exit.
+    """
+    def __init__(self, shard=None, threshold=conf.WATCHDOG_THRESHOLD, interval=0.1, history=100):
+        self.log = get_logger('watchdog')
+        self.shard = shard
+        self.threshold = threshold
+        self.interval = interval
+        self.lock = Lock()
+        self.stopped = Event()
+        self.lag = 0.0
+        self.max_lag = 0.0
+        # most recent stalls, newest last
+        self.stalls = deque(maxlen=history)
+        # {callback: [count, total duration, worst Stall]}
+        self.callbacks = {}
+        self.current = None
+        self.loop_thread = None
+        self.depth = None
+        self.beat = None
+
+    def start(self):
+        LOOP.call_soon(self.heartbeat)
+        self.thread = Thread(target=self.watch, name='watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def heartbeat(self):
+        now = monotonic()
+        if self.loop_thread is None:
+            self.loop_thread = get_ident()
+            # callbacks run one frame below the loop machinery that called us
+            self.depth = sum(1 for _ in walk_stack(_getframe())) - 1
+        else:
+            lag = max(now - self.beat - self.interval, 0.0)
+            self.lag = self.lag * 0.8 + lag * 0.2
+            if lag > self.max_lag:
+                self.max_lag = lag
+            with self.lock:
+                stall, self.current = self.current, None
+            if stall:
+                stall.duration = lag
+                self.record(stall)
+        self.beat = now
+        if not self.stopped.is_set():
+            LOOP.call_later(self.interval, self.heartbeat)
+
+    def watch(self):
+        while not self.stopped.wait(self.interval / 2):
+            beat = self.beat
+            if beat is None or self.current is not None:
+                continue
+            if monotonic() - beat - self.interval > self.threshold:
+                try:
+                    frame = _current_frames()[self.loop_thread]
+                except KeyError:
+                    continue
+                stall = self.inspect(frame)
+                with self.lock:
+                    # only keep it if the heartbeat hasn't run in the meantime
+                    if self.beat == beat:
+                        self.current = stall
+
+    def inspect(self, frame):
+        """Find the callback and coroutine a stack belongs to"""
+        frames = [f for f, _ in walk_stack(frame)]
+        frames.reverse()
+        frames = frames[self.depth:]
+        callback = coroutine = None
+        for f in frames:
+            code = f.f_code
+            if callback is None and not code.co_filename.startswith(ASYNCIO_DIR):
+                callback = '{}.{}'.format(f.f_globals.get('__name__'), code.co_name)
+            if code.co_flags & (CO_COROUTINE | CO_ITERABLE_COROUTINE):
+                coroutine = '{}.{}'.format(f.f_globals.get('__name__'), code.co_name)
+                break
+        stack = StackSummary.extract(((f, f.f_lineno) for f in frames), lookup_lines=True)
+        return Stall(callback or 'unknown', coroutine, stack)
+
+    def record(self, stall):
+        self.stalls.append(stall)
+        try:
+            entry = self.callbacks[stall.callback]
+            entry[0] += 1
+            entry[1] += stall.duration
+            if stall.duration > entry[2].duration:
+                entry[2] = stall
+        except KeyError:
+            self.callbacks[stall.callback] = [1, stall.duration, stall]
+        self.log.warning('{}', stall)
+
+    def slowest(self, limit=10):
+        return sorted(self.callbacks.items(), key=lambda x: x[1][2].duration, reverse=True)[:limit]
+
+    @property
+    def status(self):
+        line = 'Loop lag: {:.0f}ms, max: {:.0f}ms, stalls: {}'.format(
+            self.lag * 1000, self.max_lag * 1000, sum(x[0] for x in self.callbacks.values()))
+        slowest = self.slowest(3)
+        if slowest:
+            line += ', slowest: ' + ', '.join(
+                '{} {:.2f}s'.format(name, entry[2].duration) for name, entry in slowest)
+        return line
+
+    def report(self):
+        lines = ['Event loop report generated {:%Y-%m-%d %H:%M:%S}'.format(datetime.now()),
+                 self.status, '', 'Slowest callbacks:']
+        for name, (count, total, worst) in self.slowest():
+            lines.append('{}: {} stalls, {:.3f}s total, {:.3f}s max, coroutine: {}'.format(
+                name, count, total, worst.duration, worst.coroutine))
+            lines.extend(x.rstrip('\n') for x in format_list(worst.stack))
+            lines.append('')
+        lines.append('Recent stalls:')
+        lines.extend(str(x) for x in reversed(self.stalls))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, report):
+        if self.shard is None:
+            filename = 'watchdog.txt'
+        else:
+            filename = 'watchdog-{}.txt'.format(self.shard)
+        location = join(conf.DIRECTORY, filename)
+        temporary = location + '.tmp'
+        with open(temporary, 'wt') as f:
+            f.write(report)
+        replace(temporary, location)
+        return location
@@ -1,12 +1,12 @@
 from argparse import ArgumentParser
 from datetime import datetime
-from multiprocessing.managers import BaseManager, RemoteError
 from time import time
 
 from monocle import sanitized as conf
 from monocle.db import get_forts, Pokestop, session_scope, Sighting, Spawnpoint, Raid, Fort, FortSighting, Weather
-from monocle.utils import Units, get_address, dump_pickle, load_pickle
+from monocle.utils import Units, dump_pickle, load_pickle
 from monocle.names import DAMAGE, MOVES, POKEMON
+from monocle.workermap import SnapshotReader as Workers
 from monocle.bounds import north, south, east, west
 
 import s2sphere
@@ -47,46 +47,21 @@ def get_args():
     return parser.parse_args()
 
 
-class AccountManager(BaseManager): pass
-AccountManager.register('worker_dict')
-
-
-class Workers:
-    def __init__(self):
-        self._data = {}
-        self._manager = AccountManager(address=get_address(), authkey=conf.AUTHKEY)
-
-    def connect(self):
-        try:
-            self._manager.connect()
-            self._data = self._manager.worker_dict()
-        except (FileNotFoundError, AttributeError, RemoteError, ConnectionRefusedError, BrokenPipeError):
-            print('Unable to connect to manager for worker data.')
-            self._data = {}
-
-    @property
-    def data(self):
-        try:
-            if self._data:
-                return self._data.items()
-            else:
-                raise ValueError
-        except (FileNotFoundError, RemoteError, ConnectionRefusedError, ValueError, BrokenPipeError):
-            self.connect()
-            return self._data.items()
-
-
-def get_worker_markers(workers):
-    return [{
-        'lat': lat,
-        'lon': lon,
-        'worker_no': worker_no,
-        'time': datetime.fromtimestamp(timestamp).strftime('%I:%M:%S %p'),
-        'speed': '{:.1f}{}'.format(speed, UNIT_STRING),
-        'total_seen': total_seen,
-        'visits': visits,
-        'seen_here': seen_here
-    } for worker_no, ((lat, lon), timestamp, speed, total_seen, visits, seen_here) in workers.data]
+def get_worker_markers(workers, since=0):
+    latest, changed = workers.changed_since(since)
+    return {
+        'time': latest,
+        'workers': [{
+            'lat': lat,
+            'lon': lon,
+            'worker_no': worker_no,
+            'time': datetime.fromtimestamp(timestamp).strftime('%I:%M:%S %p'),
+            'speed': '{:.1f}{}'.format(speed, UNIT_STRING),
+            'total_seen': total_seen,
+            'visits': visits,
+            'seen_here': seen_here
+        } for worker_no, (lat, lon, timestamp, speed, total_seen, visits, seen_here, _) in changed]
+    }
 
 
 def sighting_to_marker(pokemon, names=POKEMON, moves=MOVES, damage=DAMAGE):
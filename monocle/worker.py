@@ -1,20 +1,24 @@
-from asyncio import gather, Lock, Semaphore, sleep, CancelledError
+from asyncio import gather, shield, wait_for, Lock, Semaphore, sleep, CancelledError, TimeoutError
 from collections import deque
 from time import time, monotonic
 from queue import Empty
-from itertools import cycle
 from sys import exit
 from distutils.version import StrictVersion
 
 from aiopogo import PGoApi, HashServer, json_loads, exceptions as ex
+from aiopogo.auth_google import AuthGoogle
 from aiopogo.auth_ptc import AuthPtc
 from cyrandom import choice, randint, uniform
 from pogeo import get_distance
 
 from .db import POKESTOP_CACHE, GYM_CACHE, MYSTERY_CACHE, SIGHTING_CACHE, RAID_CACHE, WEATHER_CACHE
-from .utils import round_coords, load_pickle, get_device_info, get_start_coords, Units, randomize_point
+from .inflight import InFlight
+from .proxies import ProxyPool
+from .rpcstats import request_name
+from .records import PokemonRecord, FortRecord, RaidRecord, PokestopRecord, WeatherRecord
+from .utils import get_device_info, get_start_coords, Units, randomize_point
 from .shared import get_logger, LOOP, SessionManager, run_threaded, ACCOUNTS
-from . import altitudes, avatar, bounds, db_proc, spawns, sanitized as conf
+from . import altitudes, avatar, bounds, db_proc, hashbudget, spawns, sanitized as conf
 
 if conf.CACHE_CELLS:
     from array import typecodes
@@ -22,6 +26,7 @@ if conf.CACHE_CELLS:
         from pogeo import get_cell_ids_compact as _pogeo_cell_ids
     else:
         from pogeo import get_cell_ids as _pogeo_cell_ids
+    from .cells import CellTable
 else:
     from pogeo import get_cell_ids as _pogeo_cell_ids
 
@@ -40,6 +45,9 @@ if conf.SPIN_POKESTOPS:
 UNIT = _unit.value
 del _unit
 
+# stands in for the details of gyms that will be fetched later
+NO_DETAILS = {'name': None, 'url': None, 'desc': None}
+
 
 class Worker:
     """Single worker walking on the map"""
@@ -49,28 +57,40 @@ class Worker:
     g = {'seen': 0, 'captchas': 0}
 
     if conf.CACHE_CELLS:
-        cells = load_pickle('cells') or {}
-
-        @classmethod
-        def get_cell_ids(cls, point):
-            rounded = round_coords(point, 4)
-            try:
-                return cls.cells[rounded]
-            except KeyError:
-                cells = _pogeo_cell_ids(rounded)
-                cls.cells[rounded] = cells
-                return cells
+        cells = CellTable(_pogeo_cell_ids)
+        get_cell_ids = staticmethod(cells.get)
     else:
         get_cell_ids = _pogeo_cell_ids
 
     login_semaphore = Semaphore(conf.SIMULTANEOUS_LOGINS, loop=LOOP)
     sim_semaphore = Semaphore(conf.SIMULTANEOUS_SIMULATION, loop=LOOP)
 
+    # set by the overseer if NumPy is available
+    positions = None
+    # set by the overseer if GetMapObjects responses are being captured
+    recorder = None
+    # set by the overseer if MAP_WORKERS is enabled
+    worker_map = None
+    # set by the overseer if DEFER_FORT_DETAILS is enabled
+    fort_details = None
+    # set by the overseer if ENCOUNTER_DISPATCH is enabled
+    encounters = None
+    # encounters and fort details being requested by any worker
+    inflight = InFlight()
+    # set by the overseer if HASH_BUDGET is enabled
+    hash_budget = None
+    # set by the overseer if RPC_STATS is enabled
+    rpc_stats = None
+    # set by the overseer if SPARE_ACCOUNTS is enabled
+    spares = None
+    # set by the overseer if FORT_FINGERPRINTS is enabled
+    fingerprints = None
+
     multiproxy = False
     if conf.PROXIES:
         if len(conf.PROXIES) > 1:
             multiproxy = True
-        proxies = cycle(conf.PROXIES)
+        proxies = ProxyPool(conf.PROXIES)
     else:
         proxies = None
 
@@ -92,6 +112,8 @@ class Worker:
         except KeyError:
             self.location = get_start_coords(worker_no)
         self.altitude = None
+        # assigned by the proxy pool
+        self.proxy = None
         # last time of any request
         self.last_request = self.account.get('time', 0)
         # last time of a request that requires user interaction in the game
@@ -130,7 +152,8 @@ class Worker:
         self.api = PGoApi(device_info=device_info)
         self.api.set_position(*self.location, self.altitude)
         if self.proxies:
-            self.api.proxy = next(self.proxies)
+            self.proxy = self.proxies.assign(self.proxy)
+            self.api.proxy = self.proxy
         try:
             if self.account['provider'] == 'ptc' and 'auth' in self.account:
                 self.api.auth_provider = AuthPtc(username=self.username, password=self.account['password'], timeout=conf.LOGIN_TIMEOUT)
@@ -138,13 +161,20 @@ class Worker:
                 self.api.auth_provider._access_token_expiry = self.account['expiry']
                 if self.api.auth_provider.check_access_token():
                     self.api.auth_provider.authenticated = True
+            elif self.account['provider'] == 'google' and 'refresh' in self.account:
+                self.api.auth_provider = AuthGoogle(proxy=self.proxy, refresh_token=self.account['refresh'])
+                self.api.auth_provider._access_token = self.account.get('auth')
+                self.api.auth_provider._access_token_expiry = self.account.get('expiry', 0)
+                if self.api.auth_provider.check_access_token():
+                    self.api.auth_provider.authenticated = True
         except KeyError:
             pass
+        if not self.download_hash:
+            Worker.download_hash = self.account.get('download_hash', '')
 
     def swap_proxy(self):
-        proxy = self.api.proxy
-        while proxy == self.api.proxy:
-            self.api.proxy = next(self.proxies)
+        self.proxy = self.proxies.assign(self.proxy, leave=True)
+        self.api.proxy = self.proxy
 
     async def login(self, reauth=False):
         """Logs worker in and prepares for scanning"""
@@ -159,12 +189,15 @@ class Worker:
                         username=self.username,
                         password=self.account['password'],
                         provider=self.account.get('provider') or 'ptc',
-                        timeout=conf.LOGIN_TIMEOUT
+                        timeout=conf.LOGIN_TIMEOUT,
+                        refresh_token=self.account.get('refresh')
                     )
             except ex.UnexpectedAuthError as e:
                 await self.swap_account('unexpected auth error')
             except ex.AuthException as e:
                 err = e
+                # the refresh token may have been revoked, use the password next time
+                self.account.pop('refresh', None)
                 await sleep(2, loop=LOOP)
             else:
                 err = None
@@ -179,6 +212,19 @@ class Worker:
         if err:
             raise err
 
+        if self.resumable:
+            self.log.info('Resuming the session of {}', self.username)
+            self.error_code = 'RESUMING'
+            # still check for warnings, bans and an unfinished tutorial
+            tutorial_state = await self.get_player()
+            if (conf.COMPLETE_TUTORIAL and
+                    tutorial_state is not None and
+                    not all(x in tutorial_state for x in (0, 1, 3, 4, 7))):
+                self.log.warning('{} is starting tutorial', self.username)
+                await self.complete_tutorial(tutorial_state)
+            self.error_code = None
+            return True
+
         self.error_code = '°'
         version = 9100
         async with self.sim_semaphore:
@@ -487,7 +533,9 @@ class Worker:
                         else:
                             self.unused_incubators.appendleft(item)
 
-    async def call(self, request, chain=True, buddy=True, settings=True, inbox=True, dl_hash=True, action=None):
+    async def call(self, request, chain=True, buddy=True, settings=True, inbox=True, dl_hash=True, action=None,
+                   priority=hashbudget.SPAWN):
+        stats = None if self.rpc_stats is None else self.rpc_stats[request_name(request)]
         if chain:
             request.check_challenge()
             request.get_hatched_eggs()
@@ -510,12 +558,16 @@ class Worker:
                 await sleep(self.last_action - now, loop=LOOP)
             else:
                 await sleep(0.5, loop=LOOP)
+            if stats is not None:
+                stats.pacing += time() - now
 
         response = None
         err = None
+        started = monotonic()
         for attempt in range(-1, conf.MAX_RETRIES):
+            start = monotonic()
             try:
-                responses = await request.call()
+                responses = await self.send(request, priority, stats)
                 self.last_request = time()
                 err = None
                 break
@@ -584,6 +636,8 @@ class Worker:
                     self.log.warning('{}', e)
                 self.error_code = 'MALFORMED RESPONSE'
                 await self.random_sleep()
+        if stats is not None:
+            stats.retrying += start - started
         if err is not None:
             raise err
 
@@ -627,6 +681,30 @@ class Worker:
             pass
         return responses
 
+    async def send(self, request, priority, stats):
+        """Make one attempt at a request, recording its latency or error"""
+        if self.hash_budget is not None:
+            # time spent waiting for hashes isn't the request's latency
+            await self.hash_budget.acquire(priority)
+        try:
+            start = monotonic()
+            responses = await request.call()
+        except Exception as e:
+            if stats is not None:
+                stats.errors[e.__class__.__name__] += 1
+            if self.proxies and isinstance(e, (ex.ProxyException, ex.NianticTimeoutException)):
+                self.proxies.failure(self.proxy)
+            raise
+        finally:
+            if self.hash_budget is not None:
+                self.hash_budget.release()
+        latency = monotonic() - start
+        if stats is not None:
+            stats.latency.add(latency)
+        if self.proxies:
+            self.proxies.success(self.proxy, latency)
+        return responses
+
     def travel_speed(self, point):
         '''Fast calculation of travel speed to point'''
         time_diff = max(time() - self.last_request, self.scan_delay)
@@ -652,7 +730,7 @@ class Worker:
             try:
                 self.altitude = altitudes.get(point)
             except KeyError:
-                self.altitude = await altitudes.fetch(point)
+                self.altitude = altitudes.fallback()
             self.location = point
             self.api.set_position(*self.location, self.altitude)
             if not self.authenticated:
@@ -706,7 +784,8 @@ class Worker:
             self.error_code = 'IP BANNED'
 
             if self.multiproxy:
-                self.log.warning('Swapping out {} due to IP ban.', self.api.proxy)
+                self.log.warning('Swapping out {} due to IP ban.', self.proxy)
+                self.proxies.ban(self.proxy)
                 self.swap_proxy()
             else:
                 self.log.error('IP banned.')
@@ -746,9 +825,7 @@ class Worker:
             self.error_code = 'EXCEPTION'
         return False
 
-    async def visit_point(self, point, spawn_id, bootstrap,
-            encounter_conf=conf.ENCOUNTER, notify_conf=conf.NOTIFY,
-            more_points=conf.MORE_POINTS):
+    async def visit_point(self, point, spawn_id, bootstrap):
         self.handle.cancel()
         self.error_code = '∞' if bootstrap else '!'
 
@@ -756,7 +833,12 @@ class Worker:
         start = time()
 
         cell_ids = self.get_cell_ids(point)
-        since_timestamp_ms = (0,) * len(cell_ids)
+        if self.fingerprints is not None and conf.GMO_SINCE_TIMESTAMPS:
+            since_timestamp_ms = self.fingerprints.since(cell_ids)
+            since = dict(zip(cell_ids, since_timestamp_ms))
+        else:
+            since_timestamp_ms = (0,) * len(cell_ids)
+            since = None
         request = self.api.create_request()
         request.get_map_objects(cell_id=cell_ids,
                                 since_timestamp_ms=since_timestamp_ms,
@@ -766,7 +848,8 @@ class Worker:
         diff = self.last_gmo + self.scan_delay - time()
         if diff > 0:
             await sleep(diff, loop=LOOP)
-        responses = await self.call(request)
+        responses = await self.call(
+            request, priority=hashbudget.SPAWN if spawn_id else hashbudget.MYSTERY)
         self.last_gmo = self.last_request
 
         try:
@@ -784,27 +867,84 @@ class Worker:
             await self.get_player()
             raise ex.UnexpectedResponseException('Missing GetMapObjects response.')
 
+        if self.recorder is not None:
+            self.recorder.add(point, map_objects)
+
+        if conf.ITEM_LIMITS and self.bag_items >= self.item_capacity:
+            await self.clean_bag()
+
+        pokemon_seen, forts_seen, points_seen = await self.process_map_objects(
+            map_objects, spawn_id, since)
+
+        if (conf.INCUBATE_EGGS and self.unused_incubators
+                and self.eggs and (not conf.SMART_THROTTLE or self.smart_throttle(1))):
+            await self.incubate_eggs()
+
+        if pokemon_seen > 0:
+            self.error_code = ':'
+            self.total_seen += pokemon_seen
+            self.g['seen'] += pokemon_seen
+            self.empty_visits = 0
+        else:
+            self.empty_visits += 1
+            if forts_seen == 0:
+                self.log.warning('Nothing seen by {}. Speed: {:.2f}', self.username, self.speed)
+                self.error_code = '0 SEEN'
+            else:
+                self.error_code = ','
+            if self.empty_visits > 3 and not bootstrap:
+                reason = '{} empty visits'.format(self.empty_visits)
+                await self.swap_account(reason)
+        self.visits += 1
+
+        if self.worker_map is not None:
+            self.worker_map.update(self.worker_no, point, start, self.speed,
+                                   self.total_seen, self.visits, pokemon_seen)
+        self.log.info(
+            'Point processed, {} Pokemon and {} forts seen!',
+            pokemon_seen,
+            forts_seen,
+        )
+
+        self.update_accounts_dict()
+        self.handle = LOOP.call_later(60, self.unset_code)
+        return pokemon_seen + forts_seen + points_seen
+
+    async def process_map_objects(self, map_objects, spawn_id=None, since=None,
+            encounter_conf=conf.ENCOUNTER, notify_conf=conf.NOTIFY,
+            more_points=conf.MORE_POINTS):
+        """Normalize, cache, notify and save everything in a GetMapObjects response
+
+        since maps cell IDs to the since_timestamp_ms they were requested with.
+        Returns the number of Pokemon, forts and spawn points seen.
+        """
         pokemon_seen = 0
         forts_seen = 0
         points_seen = 0
         seen_target = not spawn_id
-
-        if conf.ITEM_LIMITS and self.bag_items >= self.item_capacity:
-            await self.clean_bag()
+        fingerprints = self.fingerprints
+        known = None
 
         for map_cell in map_objects.map_cells:
             request_time_ms = map_cell.current_timestamp_ms
+            if fingerprints is not None:
+                known = fingerprints.get(
+                    map_cell, since.get(map_cell.s2_cell_id, 0) if since else 0).forts
             for pokemon in map_cell.wild_pokemons:
                 pokemon_seen += 1
 
                 normalized = self.normalize_pokemon(pokemon)
-                seen_target = seen_target or normalized['spawn_id'] == spawn_id
+                seen_target = seen_target or normalized.spawn_id == spawn_id
+
+                if self.encounters is not None:
+                    self.queue_encounter(normalized, pokemon, map_objects.time_of_day)
+                    continue
 
                 if (normalized not in SIGHTING_CACHE and
                         normalized not in MYSTERY_CACHE):
                     if (encounter_conf == 'all'
                             or (encounter_conf == 'some'
-                            and normalized['pokemon_id'] in conf.ENCOUNTER_IDS)):
+                            and normalized.pokemon_id in conf.ENCOUNTER_IDS)):
                         try:
                             await self.encounter(normalized, pokemon.spawn_point_id)
                         except CancelledError:
@@ -830,12 +970,22 @@ class Worker:
                 if not fort.enabled:
                     continue
                 forts_seen += 1
+                if known is None:
+                    unchanged = False
+                else:
+                    fingerprint = fingerprints.fingerprint(fort)
+                    unchanged = known.get(fort.id) == fingerprint
+                    if unchanged:
+                        fingerprints.skipped += 1
+                    else:
+                        fingerprints.processed += 1
                 if fort.type == 1:  # pokestops
                     if fort.HasField('lure_info'):
-                        norm = self.normalize_lured(fort, request_time_ms)
                         pokemon_seen += 1
-                        if norm not in SIGHTING_CACHE:
-                            db_proc.add(norm)
+                        if not unchanged:
+                            norm = self.normalize_lured(fort, request_time_ms)
+                            if norm not in SIGHTING_CACHE:
+                                db_proc.add(norm)
                     if (self.pokestops and
                             self.bag_items < self.item_capacity
                             and time() > self.next_spin
@@ -844,47 +994,51 @@ class Worker:
                         cooldown = fort.cooldown_complete_timestamp_ms
                         if not cooldown or time() > cooldown / 1000:
                             await self.spin_pokestop(fort)
+                    if unchanged:
+                        continue
                     if fort not in POKESTOP_CACHE:
-                        fort_details = await self.check_pokestop(fort)
-                        db_proc.add(self.normalize_pokestop(fort, fort_details))
+                        if self.fort_details is None:
+                            fort_details = await self.check_pokestop(fort)
+                            db_proc.add(self.normalize_pokestop(fort, fort_details))
+                        elif fort.id not in self.fort_details:
+                            self.defer_pokestop(fort)
+                    elif known is not None:
+                        known[fort.id] = fingerprint
                 else:
+                    if unchanged:
+                        continue
+                    # nothing to save, so it can be skipped until it changes
+                    current = False
                     if fort not in GYM_CACHE:
-                        raw_gym_info = await self.check_gym(fort)
-                        gym_info = {}
-                        gym_info['name'] = raw_gym_info.name
-                        gym_info['url'] = raw_gym_info.url
-                        gym_info['desc'] = raw_gym_info.description
-                        g = self.normalize_gym(fort, gym_info)
-                        db_proc.add(g)
+                        g = await self.gym_with_details(fort)
                     else:
                         g = GYM_CACHE.get(fort.id)
                         if (g['name'] is None or 
                             g['lat'] != fort.latitude or
                             g['lon'] != fort.longitude):
-                            raw_gym_info = await self.check_gym(fort)
-                            gym_info = {}
-                            gym_info['name'] = raw_gym_info.name
-                            gym_info['url'] = raw_gym_info.url
-                            gym_info['desc'] = raw_gym_info.description
-                            g = self.normalize_gym(fort, gym_info)
-                            db_proc.add(g)
+                            g = await self.gym_with_details(fort, g)
                         elif(g['last_modified'] != fort.last_modified_timestamp_ms // 1000):
                             g = self.normalize_gym(fort, g)
                             db_proc.add(g)
+                        else:
+                            current = True
                     if fort.HasField('raid_info'):
                         if fort not in RAID_CACHE:
+                            current = False
                             if notify_conf:
                                 LOOP.create_task(self.notifier.raid_notify(
                                     fort=g, rawfort=fort))
                             raid = self.normalize_raid(fort)
                             db_proc.add(raid)
+                    if current and known is not None:
+                        known[fort.id] = fingerprint
 
             if more_points:
                 try:
                     for p in map_cell.spawn_points:
                         points_seen += 1
                         p = p.latitude, p.longitude
-                        if spawns.have_point(p) or p not in bounds:
+                        if spawns.have_point(p) or p not in bounds or not spawns.owns(p):
                             continue
                         spawns.cell_points.add(p)
                 except KeyError:
@@ -902,40 +1056,100 @@ class Worker:
                 'seen': seen_target,
                 'spawn_id': spawn_id})
 
-        if (conf.INCUBATE_EGGS and self.unused_incubators
-                and self.eggs and (not conf.SMART_THROTTLE or self.smart_throttle(1))):
-            await self.incubate_eggs()
+        return pokemon_seen, forts_seen, points_seen
 
-        if pokemon_seen > 0:
-            self.error_code = ':'
-            self.total_seen += pokemon_seen
-            self.g['seen'] += pokemon_seen
-            self.empty_visits = 0
+    def queue_encounter(self, normalized, raw, time_of_day,
+            encounter_conf=conf.ENCOUNTER, notify_conf=conf.NOTIFY):
+        """Save and notify a Pokemon, after an idle worker encountered it if needed"""
+        if normalized.encounter_id in self.encounters:
+            # seen by another visit, which will save it
+            return
+        notify = notify_conf and self.notifier.spawn_eligible(normalized)
+        if ((normalized not in SIGHTING_CACHE and normalized not in MYSTERY_CACHE
+                and (encounter_conf == 'all' or (encounter_conf == 'some'
+                and normalized.pokemon_id in conf.ENCOUNTER_IDS)))
+                or (notify and encounter_conf)):
+            encountered = self.encounters.submit(normalized, raw.spawn_point_id)
+            LOOP.create_task(self.save_encountered(encountered, normalized, raw, time_of_day))
+            return
+        if notify:
+            LOOP.create_task(self.notifier.spawn_notify(normalized, raw, time_of_day))
+        db_proc.add(normalized)
+
+    async def save_encountered(self, encountered, normalized, raw, time_of_day,
+            notify_conf=conf.NOTIFY):
+        try:
+            # the job is shared with other sightings of the same Pokemon
+            encountered = await wait_for(shield(encountered, loop=LOOP),
+                                         self.encounters.timeout, loop=LOOP)
+        except TimeoutError:
+            # an encounter that is still running only modifies its own copy
+            self.log.debug('Saving #{} without encountering it.', normalized.pokemon_id)
+        except CancelledError:
+            db_proc.add(normalized)
+            raise
         else:
-            self.empty_visits += 1
-            if forts_seen == 0:
-                self.log.warning('Nothing seen by {}. Speed: {:.2f}', self.username, self.speed)
-                self.error_code = '0 SEEN'
-            else:
-                self.error_code = ','
-            if self.empty_visits > 3 and not bootstrap:
-                reason = '{} empty visits'.format(self.empty_visits)
-                await self.swap_account(reason)
-        self.visits += 1
+            if encountered is not None:
+                normalized = encountered
+        if notify_conf and self.notifier.spawn_eligible(normalized):
+            LOOP.create_task(self.notifier.spawn_notify(normalized, raw, time_of_day))
+        db_proc.add(normalized)
 
-        if conf.MAP_WORKERS:
-            self.worker_dict.update([(self.worker_no,
-                (point, start, self.speed, self.total_seen,
-                self.visits, pokemon_seen))])
-        self.log.info(
-            'Point processed, {} Pokemon and {} forts seen!',
-            pokemon_seen,
-            forts_seen,
-        )
+    async def encounter_nearby(self, pokemon, spawn_id):
+        """Encounter a Pokemon that was seen by another worker's visit
 
-        self.update_accounts_dict()
-        self.handle = LOOP.call_later(60, self.unset_code)
-        return pokemon_seen + forts_seen + points_seen
+        Returns a copy of it with the encounter details, or None.
+        """
+        pokemon = pokemon.copy()
+        await self.encounter(pokemon, spawn_id)
+        self.error_code = None
+        return pokemon if 'move_1' in pokemon else None
+
+    def defer_pokestop(self, pokestop):
+        """Save a pokestop now and queue fetching its details for later"""
+        norm = self.normalize_pokestop(pokestop)
+        known = POKESTOP_CACHE.store.get(pokestop.id)
+        if known and known['name']:
+            # only the lure or location changed
+            norm.name = known['name']
+            norm.url = known['url']
+            norm.desc = known['desc']
+        elif pokestop.id in self.fort_details:
+            # saved again with the details once they're fetched
+            self.fort_details.refresh(pokestop)
+        else:
+            self.fort_details.add(pokestop)
+        db_proc.add(norm)
+
+    async def gym_with_details(self, gym, known=None):
+        """Save a gym, with details fetched now or queued for later"""
+        if self.fort_details is None:
+            g = self.normalize_gym(gym, self.gym_info(await self.check_gym(gym)))
+        else:
+            g = self.normalize_gym(gym, known or NO_DETAILS)
+            if gym.id in self.fort_details:
+                # saved again with the details once they're fetched
+                self.fort_details.refresh(gym)
+            else:
+                self.fort_details.add(gym)
+        db_proc.add(g)
+        return g
+
+    async def fetch_fort_details(self, fort):
+        """Move to a fort whose details were deferred and save them"""
+        point = fort.latitude, fort.longitude
+        try:
+            self.altitude = altitudes.get(point)
+        except KeyError:
+            self.altitude = altitudes.fallback()
+        self.location = point
+        self.api.set_position(*point, self.altitude)
+        self.error_code = '?'
+        if fort.type == 1:
+            db_proc.add(self.normalize_pokestop(fort, await self.check_pokestop(fort)))
+        else:
+            db_proc.add(self.normalize_gym(fort, self.gym_info(await self.check_gym(fort))))
+        self.error_code = None
 
     def smart_throttle(self, requests=1):
         try:
@@ -950,21 +1164,28 @@ class Worker:
             return False
 
     async def check_pokestop(self, pokestop):
+        return await self.inflight(('fort_details', pokestop.id),
+                                   self.request_pokestop_details, pokestop, hashbudget.DETAILS)
+
+    async def check_gym(self, gym):
+        return await self.inflight(('gym_info', gym.id), self.request_gym_info, gym)
+
+    async def request_pokestop_details(self, pokestop, priority):
         request = self.api.create_request()
         request.fort_details(fort_id = pokestop.id,
                              latitude = pokestop.latitude,
                              longitude = pokestop.longitude)
-        responses = await self.call(request, action=1.2)
+        responses = await self.call(request, action=1.2, priority=priority)
         return responses['FORT_DETAILS']
 
-    async def check_gym(self, gym):
+    async def request_gym_info(self, gym):
         request = self.api.create_request()
         request.gym_get_info(gym_id = gym.id,
                              player_lat_degrees = self.location[0],
                              player_lng_degrees = self.location[1],
                              gym_lat_degrees = gym.latitude,
                              gym_lng_degrees = gym.longitude)
-        responses = await self.call(request, action=1.2)
+        responses = await self.call(request, action=1.2, priority=hashbudget.DETAILS)
         return responses['GYM_GET_INFO']
 
     async def spin_pokestop(self, pokestop):
@@ -981,7 +1202,8 @@ class Worker:
             self.error_code = '!'
             return False
 
-        pokestop_details = await self.check_pokestop(pokestop)
+        # opened by the spinning worker itself, like the game would
+        pokestop_details = await self.request_pokestop_details(pokestop, hashbudget.SPIN)
         name = pokestop_details.name
 
         request = self.api.create_request()
@@ -990,7 +1212,7 @@ class Worker:
                             player_longitude = self.location[1],
                             fort_latitude = pokestop_location[0],
                             fort_longitude = pokestop_location[1])
-        responses = await self.call(request, action=2)
+        responses = await self.call(request, action=2, priority=hashbudget.SPIN)
 
         try:
             result = responses['FORT_SEARCH'].result
@@ -1034,9 +1256,24 @@ class Worker:
         self.error_code = '!'
 
     async def encounter(self, pokemon, spawn_id):
-        distance_to_pokemon = get_distance(self.location, (pokemon['lat'], pokemon['lon']))
-
+        """Add the moves and IVs of a Pokemon, sharing any encounter in progress"""
         self.error_code = '~'
+        pdata = await self.inflight(('encounter', pokemon['encounter_id']),
+                                    self.request_encounter, pokemon, spawn_id)
+        if pdata is not None:
+            pokemon['move_1'] = pdata.move_1
+            pokemon['move_2'] = pdata.move_2
+            pokemon['individual_attack'] = pdata.individual_attack
+            pokemon['individual_defense'] = pdata.individual_defense
+            pokemon['individual_stamina'] = pdata.individual_stamina
+            pokemon['height'] = pdata.height_m
+            pokemon['weight'] = pdata.weight_kg
+            pokemon['gender'] = pdata.pokemon_display.gender
+        self.error_code = '!'
+
+    async def request_encounter(self, pokemon, spawn_id):
+        """Returns the Pokemon data from an encounter, or None if it failed"""
+        distance_to_pokemon = get_distance(self.location, (pokemon['lat'], pokemon['lon']))
 
         if distance_to_pokemon > 48:
             percent = 1 - (47 / distance_to_pokemon)
@@ -1060,20 +1297,12 @@ class Worker:
                                     player_latitude=self.location[0],
                                     player_longitude=self.location[1])
 
-        responses = await self.call(request, action=2.25)
+        responses = await self.call(request, action=2.25, priority=hashbudget.ENCOUNTER)
 
         try:
             result = responses['ENCOUNTER'].status
             if result == 1:
-                pdata = responses['ENCOUNTER'].wild_pokemon.pokemon_data
-                pokemon['move_1'] = pdata.move_1
-                pokemon['move_2'] = pdata.move_2
-                pokemon['individual_attack'] = pdata.individual_attack
-                pokemon['individual_defense'] = pdata.individual_defense
-                pokemon['individual_stamina'] = pdata.individual_stamina
-                pokemon['height'] = pdata.height_m
-                pokemon['weight'] = pdata.weight_kg
-                pokemon['gender'] = pdata.pokemon_display.gender
+                return responses['ENCOUNTER'].wild_pokemon.pokemon_data
             elif result == 4:
                 self.log.info('Pokemon that should be encountered has fled')
             elif result == 7:
@@ -1084,7 +1313,6 @@ class Worker:
                 self.log.error('Failed encountering #{}: {}', pokemon['pokemon_id'], result)
         except KeyError:
             self.log.error('Missing encounter response.')
-        self.error_code = '!'
 
     async def clean_bag(self):
         self.error_code = '|'
@@ -1102,7 +1330,7 @@ class Worker:
         for item, count in rec_items.items():
             request = self.api.create_request()
             request.recycle_inventory_item(item_id=item, count=count)
-            responses = await self.call(request, action=2)
+            responses = await self.call(request, action=2, priority=hashbudget.SPIN)
 
             try:
                 if responses['RECYCLE_INVENTORY_ITEM'].result != 1:
@@ -1128,7 +1356,7 @@ class Worker:
             if inc.item_id == 901 or egg.egg_km_walked_target > 9:
                 request = self.api.create_request()
                 request.use_item_egg_incubator(item_id=inc.id, pokemon_id=egg.id)
-                responses = await self.call(request, action=4.5)
+                responses = await self.call(request, action=4.5, priority=hashbudget.SPIN)
 
                 try:
                     ret = responses['USE_ITEM_EGG_INCUBATOR'].result
@@ -1222,9 +1450,14 @@ class Worker:
         if self.player_level:
             self.account['level'] = self.player_level
 
+        if self.download_hash:
+            self.account['download_hash'] = self.download_hash
+
         try:
             self.account['auth'] = self.api.auth_provider._access_token
             self.account['expiry'] = self.api.auth_provider._access_token_expiry
+            if self.api.auth_provider._refresh_token:
+                self.account['refresh'] = self.api.auth_provider._refresh_token
         except AttributeError:
             pass
 
@@ -1270,6 +1503,11 @@ class Worker:
         await self.new_account()
 
     async def new_account(self):
+        if self.spares is not None:
+            spare = self.spares.take()
+            if spare is not None:
+                self.adopt(spare)
+                return
         if (conf.CAPTCHA_KEY
                 and (conf.FAVOR_CAPTCHA or self.extra_queue.empty())
                 and not self.captcha_queue.empty()):
@@ -1301,6 +1539,32 @@ class Worker:
         self.initialize_api()
         self.error_code = None
 
+    def adopt(self, spare):
+        """Take over the account and logged in session of a spare"""
+        if self.proxies:
+            # the spare's proxy is kept, it was already counted
+            self.proxies.release(self.proxy)
+        self.account = spare.account
+        self.username = spare.username
+        self.location = spare.location
+        self.altitude = spare.altitude
+        self.proxy = spare.proxy
+        self.api = spare.api
+        self.empty_visits = 0
+        self.last_request = spare.last_request
+        self.last_action = spare.last_action
+        self.last_gmo = spare.last_gmo
+        self.items = spare.items
+        self.bag_items = sum(self.items.values())
+        self.item_capacity = spare.item_capacity
+        self.inventory_timestamp = spare.inventory_timestamp
+        self.player_level = spare.player_level
+        self.num_captchas = spare.num_captchas
+        self.eggs = spare.eggs
+        self.unused_incubators = spare.unused_incubators
+        self.log.info('Took over spare account {}', self.username)
+        self.error_code = None
+
     def unset_code(self):
         self.error_code = None
 
@@ -1310,96 +1574,100 @@ class Worker:
         tsm = raw.last_modified_timestamp_ms
         tss = round(tsm / 1000)
         tth = raw.time_till_hidden_ms
-        norm = {
-            'type': 'pokemon',
-            'encounter_id': raw.encounter_id,
-            'pokemon_id': raw.pokemon_data.pokemon_id,
-            'lat': raw.latitude,
-            'lon': raw.longitude,
-            'spawn_id': int(raw.spawn_point_id, 16) if spawn_int else raw.spawn_point_id,
-            'seen': tss
-        }
+        norm = PokemonRecord(
+            'pokemon',
+            raw.encounter_id,
+            raw.pokemon_data.pokemon_id,
+            raw.latitude,
+            raw.longitude,
+            int(raw.spawn_point_id, 16) if spawn_int else raw.spawn_point_id)
+        norm.seen = tss
         if tth > 0 and tth <= 90000:
-            norm['expire_timestamp'] = round((tsm + tth) / 1000)
-            norm['time_till_hidden'] = tth / 1000
-            norm['inferred'] = False
+            norm.expire_timestamp = round((tsm + tth) / 1000)
+            norm.time_till_hidden = tth / 1000
+            norm.inferred = False
         else:
-            despawn = spawns.get_despawn_time(norm['spawn_id'], tss)
+            despawn = spawns.get_despawn_time(norm.spawn_id, tss)
             if despawn:
-                norm['expire_timestamp'] = despawn
-                norm['time_till_hidden'] = despawn - tss
-                norm['inferred'] = True
+                norm.expire_timestamp = despawn
+                norm.time_till_hidden = despawn - tss
+                norm.inferred = True
             else:
-                norm['type'] = 'mystery'
+                norm.type = 'mystery'
         if raw.pokemon_data.pokemon_display:
             if raw.pokemon_data.pokemon_display.form:
-                norm['display'] = raw.pokemon_data.pokemon_display.form
+                norm.display = raw.pokemon_data.pokemon_display.form
         return norm
 
     @staticmethod
     def normalize_lured(raw, now):
         lure = raw.lure_info
-        return {
-            'type': 'pokemon',
-            'encounter_id': lure.encounter_id,
-            'pokemon_id': lure.active_pokemon_id,
-            'expire_timestamp': lure.lure_expires_timestamp_ms // 1000,
-            'lat': raw.latitude,
-            'lon': raw.longitude,
-            'spawn_id': 0 if conf.SPAWN_ID_INT else 'LURED',
-            'time_till_hidden': (lure.lure_expires_timestamp_ms - now) / 1000,
-            'inferred': 'pokestop'
-        }
+        norm = PokemonRecord(
+            'pokemon',
+            lure.encounter_id,
+            lure.active_pokemon_id,
+            raw.latitude,
+            raw.longitude,
+            0 if conf.SPAWN_ID_INT else 'LURED')
+        norm.expire_timestamp = lure.lure_expires_timestamp_ms // 1000
+        norm.time_till_hidden = (lure.lure_expires_timestamp_ms - now) / 1000
+        norm.inferred = 'pokestop'
+        return norm
 
     @staticmethod
     def normalize_gym(raw_fort, gym_info):
-        return {
-            'type': 'fort',
-            'external_id': raw_fort.id,
-            'lat': raw_fort.latitude,
-            'lon': raw_fort.longitude,
-            'name': gym_info['name'],
-            'url': gym_info['url'],
-            'desc': gym_info['desc'],
-            'team': raw_fort.owned_by_team,
-            'prestige': raw_fort.gym_points,
-            'guard_pokemon_id': raw_fort.guard_pokemon_id,
-            'last_modified': raw_fort.last_modified_timestamp_ms // 1000,
-            'slots_available': raw_fort.gym_display.slots_available
-        }
+        return FortRecord(
+            raw_fort.id,
+            raw_fort.latitude,
+            raw_fort.longitude,
+            gym_info['name'],
+            gym_info['url'],
+            gym_info['desc'],
+            raw_fort.owned_by_team,
+            raw_fort.gym_points,
+            raw_fort.guard_pokemon_id,
+            raw_fort.last_modified_timestamp_ms // 1000,
+            raw_fort.gym_display.slots_available)
 
     @staticmethod
     def normalize_raid(raw):
+        return RaidRecord(
+            raw.id,
+            raw.raid_info.raid_end_ms // 1000,
+            raw.raid_info.raid_pokemon.pokemon_id if raw.raid_info.raid_pokemon else 0,
+            external_id=raw.raid_info.raid_seed,
+            lat=raw.latitude,
+            lon=raw.longitude,
+            level=raw.raid_info.raid_level,
+            move_1=raw.raid_info.raid_pokemon.move_1 if raw.raid_info.raid_pokemon else 0,
+            move_2=raw.raid_info.raid_pokemon.move_2 if raw.raid_info.raid_pokemon else 0,
+            time_spawn=raw.raid_info.raid_spawn_ms // 1000,
+            time_battle=raw.raid_info.raid_battle_ms // 1000)
+
+    @staticmethod
+    def gym_info(raw_gym_info):
         return {
-            'type': 'raid',
-            'external_id': raw.raid_info.raid_seed,
-            'fort_external_id': raw.id,
-            'lat': raw.latitude,
-            'lon': raw.longitude,
-            'level': raw.raid_info.raid_level,
-            'pokemon_id': raw.raid_info.raid_pokemon.pokemon_id if raw.raid_info.raid_pokemon else 0,
-            'move_1': raw.raid_info.raid_pokemon.move_1 if raw.raid_info.raid_pokemon else 0,
-            'move_2': raw.raid_info.raid_pokemon.move_2 if raw.raid_info.raid_pokemon else 0,
-            'time_spawn': raw.raid_info.raid_spawn_ms // 1000,
-            'time_battle': raw.raid_info.raid_battle_ms // 1000,
-            'time_end': raw.raid_info.raid_end_ms // 1000
+            'name': raw_gym_info.name,
+            'url': raw_gym_info.url,
+            'desc': raw_gym_info.description
         }
 
     @staticmethod
-    def normalize_pokestop(raw_fort, raw_fort_details):
+    def normalize_pokestop(raw_fort, raw_fort_details=None):
         lure_start = 0
         if 501 in raw_fort.active_fort_modifier: #501 is the code for lure
             lure_start = raw_fort.last_modified_timestamp_ms // 1000
-        return {
-            'type': 'pokestop',
-            'external_id': raw_fort.id,
-            'lat': raw_fort.latitude,
-            'lon': raw_fort.longitude,
-            'name': raw_fort_details.name,
-            'url': raw_fort_details.image_urls[0],
-            'desc': raw_fort_details.description,
-            'lure_start': lure_start,
-        }
+        if raw_fort_details is None:
+            return PokestopRecord(raw_fort.id, raw_fort.latitude, raw_fort.longitude,
+                                  None, lure_start=lure_start)
+        return PokestopRecord(
+            raw_fort.id,
+            raw_fort.latitude,
+            raw_fort.longitude,
+            raw_fort_details.name,
+            raw_fort_details.image_urls[0],
+            raw_fort_details.description,
+            lure_start)
 
     @staticmethod
     def normalize_weather(raw, time_of_day):
@@ -1410,20 +1678,38 @@ class Worker:
                 warn = warn or a.warn_weather
                 if a.severity > alert_severity:
                     alert_severity = a.severity
-        return {
-            'type': 'weather',
-            's2_cell_id': raw.s2_cell_id,
-            'condition': raw.gameplay_weather.gameplay_condition,
-            'alert_severity': alert_severity,
-            'warn': warn,
-            'day': time_of_day
-        }
+        return WeatherRecord(
+            raw.s2_cell_id,
+            raw.gameplay_weather.gameplay_condition,
+            alert_severity,
+            warn,
+            time_of_day)
 
     @staticmethod
     async def random_sleep(minimum=10.1, maximum=14, loop=LOOP):
         """Sleeps for a bit"""
         await sleep(uniform(minimum, maximum), loop=loop)
 
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, point):
+        self._location = point
+        if self.positions is not None:
+            self.positions.set_location(self.worker_no, point)
+
+    @property
+    def last_request(self):
+        return self._last_request
+
+    @last_request.setter
+    def last_request(self, timestamp):
+        self._last_request = timestamp
+        if self.positions is not None:
+            self.positions.set_last_request(self.worker_no, timestamp)
+
     @property
     def start_time(self):
         return self.api.start_time
@@ -1442,6 +1728,48 @@ class Worker:
             msg=msg
         )
 
+    @property
+    def resumable(self):
+        """Whether logging in can skip the app simulation
+
+        True if the account has been through it before and made a request
+        within RESUME_SESSIONS seconds, like an app brought back to the
+        foreground rather than started again.
+        """
+        return (conf.RESUME_SESSIONS
+                and ('template_time' in self.account or not conf.APP_SIMULATION)
+                and time() - self.last_request < conf.RESUME_SESSIONS)
+
+    def login_order(self):
+        """Sort key putting the accounts that will log in the quickest first"""
+        return (not self.resumable,
+                'refresh' not in self.account,
+                'asset_time' not in self.account)
+
+    async def warm_up(self):
+        """Log in ahead of the first visit, leaving any errors to it"""
+        async with self.busy:
+            if self.authenticated:
+                return
+            try:
+                try:
+                    self.altitude = altitudes.get(self.location)
+                except KeyError:
+                    self.altitude = altitudes.fallback()
+                self.api.set_position(*self.location, self.altitude)
+                await self.login()
+            except CancelledError:
+                raise
+            except Exception as e:
+                self.log.warning('{} while logging in {} ahead of time: {}',
+                                 e.__class__.__name__, self.username, e)
+                # the first visit logs in again, and handles the error if it recurs
+                try:
+                    self.api.auth_provider.authenticated = False
+                except AttributeError:
+                    pass
+                self.error_code = None
+
     @property
     def authenticated(self):
         try:
@@ -0,0 +1,86 @@
+"""Worker positions for the workers map
+
+The scanner collects the position of every worker after each visit and
+periodically publishes all of them as one JSON snapshot file, which the web
+server reads instead of asking the scanner for every request. Each worker
+carries the time of the snapshot in which it last changed, so that clients
+can ask for only what changed since the snapshot they already have.
+"""
+
+from glob import glob
+from json import dump, load
+from os import replace, stat
+from os.path import join
+from time import time
+
+from . import sanitized as conf
+
+
+def snapshot_path(index=None):
+    if index is None:
+        return join(conf.DIRECTORY, 'workers.json')
+    return join(conf.DIRECTORY, 'workers-{}.json'.format(index))
+
+
+class WorkerMap:
+    """Collects worker positions in-process and publishes them in batches"""
+    def __init__(self, index=None):
+        self.path = snapshot_path(index)
+        # worker_no: [lat, lon, time, speed, total seen, visits, seen here, changed]
+        self.workers = {}
+        self.changed = set()
+
+    def update(self, worker_no, point, timestamp, speed, total_seen, visits, seen_here):
+        self.workers[worker_no] = [point[0], point[1], timestamp, speed,
+                                   total_seen, visits, seen_here, 0]
+        self.changed.add(worker_no)
+
+    def snapshot(self):
+        """Stamp the changed workers and return a copy to be written"""
+        now = time()
+        for worker_no in self.changed:
+            self.workers[worker_no][7] = now
+        self.changed.clear()
+        return {'time': now, 'workers': {k: v.copy() for k, v in self.workers.items()}}
+
+    def write(self, snapshot):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wt') as f:
+            dump(snapshot, f, separators=(',', ':'))
+        replace(temporary, self.path)
+
+
+class SnapshotReader:
+    """Reads the snapshots of every scanner process, reloading changed files"""
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.pattern = join(conf.DIRECTORY, 'workers*.json')
+        # path: (modification time, snapshot)
+        self.cache = {}
+
+    def snapshots(self):
+        for path in glob(self.pattern):
+            try:
+                mtime = stat(path).st_mtime
+                cached = self.cache.get(path)
+                if cached is None or cached[0] != mtime:
+                    with open(path, 'rt') as f:
+                        cached = self.cache[path] = mtime, load(f)
+            except (OSError, ValueError):
+                continue
+            yield cached[1]
+
+    def changed_since(self, since=0):
+        """Returns the time of the newest snapshot and the workers changed after since"""
+        latest = since
+        workers = []
+        oldest = time() - self.max_age
+        for snapshot in self.snapshots():
+            if snapshot['time'] < oldest:
+                # left behind by a scanner that isn't running
+                continue
+            latest = max(latest, snapshot['time'])
+            workers.extend((int(worker_no), info)
+                           for worker_no, info in snapshot['workers'].items()
+                           if info[7] > since)
+        return latest, workers
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""Feed captured GetMapObjects responses through Monocle's processing
+
+Replays a file written with GMO_CAPTURE through normalization, the caches,
+the notifier and the database processor, without accounts or network
+access. Encounters and fort details are answered by the simulated API from
+benchmark.py, and notifications are counted instead of sent.
+"""
+
+import monocle.sanitized as conf
+
+from argparse import ArgumentParser
+from asyncio import gather, sleep, Queue as AsyncQueue, Task, wait_for, TimeoutError
+from json import dump
+from logging import WARNING
+from os.path import join
+from queue import Queue
+from time import monotonic, process_time
+
+from benchmark import configure, create_altitudes
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('capture', help='File written with GMO_CAPTURE')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='Replay at this multiple of the original speed (default: as fast as possible)')
+    parser.add_argument('--workers', type=int, default=10,
+                        help='Number of responses processed at the same time')
+    parser.add_argument('--directory',
+                        help='Where to put pickles, logs and the database (default: a new temporary directory)')
+    parser.add_argument('--db', help='Database URL (default: SQLite in the directory)')
+    parser.add_argument('--fingerprints', action='store_true',
+                        help='Skip forts that are unchanged since they were last processed')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        default=WARNING)
+    args = parser.parse_args()
+    args.spare_accounts = 0
+    return args
+
+
+async def process(worker, point, raw, idle, totals):
+    from aiopogo.pogoprotos.networking.responses.get_map_objects_response_pb2 import GetMapObjectsResponse
+    from monocle import altitudes
+
+    try:
+        map_objects = GetMapObjectsResponse()
+        map_objects.ParseFromString(raw)
+        worker.location = point
+        try:
+            worker.altitude = altitudes.get(point)
+        except KeyError:
+            worker.altitude = altitudes.fallback()
+        seen = await worker.process_map_objects(map_objects)
+        for i, number in enumerate(seen):
+            totals[i] += number
+    except Exception as e:
+        worker.log.exception('A wild {} appeared while replaying!', e.__class__.__name__)
+    finally:
+        idle.put_nowait(worker)
+
+
+async def replay(path, workers, speed):
+    """Returns the number of responses replayed and the things seen in them"""
+    from monocle.capture import read_captures
+    from monocle.shared import LOOP
+
+    idle = AsyncQueue(loop=LOOP)
+    for worker in workers:
+        idle.put_nowait(worker)
+    # Pokemon, forts, spawn points
+    totals = [0, 0, 0]
+    tasks = set()
+    count = 0
+    first = start = None
+    for timestamp, point, raw in read_captures(path):
+        if speed:
+            if first is None:
+                first, start = timestamp, monotonic()
+            delay = (timestamp - first) / speed - (monotonic() - start)
+            if delay > 0:
+                await sleep(delay, loop=LOOP)
+        worker = await idle.get()
+        task = LOOP.create_task(process(worker, point, raw, idle, totals))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        count += 1
+    if tasks:
+        await gather(*tasks, loop=LOOP)
+    return count, totals
+
+
+def main():
+    args = parse_args()
+    conf.GRID = (1, args.workers)
+    directory = configure(args)
+    create_altitudes()
+
+    from aiopogo import close_sessions
+    from scan import exception_handler, configure_logger
+    from monocle.shared import LOOP, get_logger, SessionManager, ACCOUNTS
+    from monocle.db import Base, _engine, GYM_CACHE, RAID_CACHE, POKESTOP_CACHE
+    from monocle.notifier import Notifier
+    from monocle.simulator import Simulator, SpawnField
+    from monocle.worker import Worker
+    from monocle import db_proc
+
+    configure_logger(filename=join(directory, 'replay.log'))
+    get_logger().setLevel(args.log_level)
+    LOOP.set_exception_handler(exception_handler)
+    Base.metadata.create_all(_engine)
+
+    # only encounters and fort details are requested, answer them instantly
+    simulator = Simulator(SpawnField(0, 0), latency=0, jitter=0)
+    simulator.install()
+    notifier = Notifier(loop=LOOP)
+    simulator.silence_notifier(notifier)
+
+    Worker.extra_queue = Queue()
+    Worker.captcha_queue = Queue()
+    for account in ACCOUNTS.values():
+        Worker.extra_queue.put(account)
+    workers = tuple(Worker(worker_no=x, notifier=notifier) for x in range(args.workers))
+    if args.fingerprints:
+        from monocle.cells import CellFingerprints
+        Worker.fingerprints = CellFingerprints()
+
+    db_proc.start()
+    RAID_CACHE.preload()
+    POKESTOP_CACHE.preload()
+    GYM_CACHE.preload()
+
+    print('Replaying {}, writing to {}'.format(args.capture, directory))
+    start = monotonic()
+    start_cpu = process_time()
+    try:
+        count, totals = LOOP.run_until_complete(replay(args.capture, workers, args.speed))
+    except KeyboardInterrupt:
+        print('Interrupted, stopping early.')
+        count = None
+    finally:
+        elapsed = monotonic() - start
+        cpu = process_time() - start_cpu
+        pending = gather(*Task.all_tasks(loop=LOOP), return_exceptions=True)
+        try:
+            LOOP.run_until_complete(wait_for(pending, 40))
+        except TimeoutError:
+            print('Coroutine completion timed out, moving on.')
+        LOOP.run_until_complete(notifier.close_senders())
+
+        drain_start = monotonic()
+        db_proc.stop()
+        db_proc.join()
+        drain_time = monotonic() - drain_start
+
+        SessionManager.close()
+        close_sessions()
+        LOOP.close()
+
+    if count is None:
+        return
+    results = {
+        'responses': count,
+        'seconds': round(elapsed, 2),
+        'responses_per_second': round(count / elapsed, 2),
+        'cpu_seconds': round(cpu, 2),
+        'cpu_ms_per_response': round(cpu / count * 1000, 3) if count else None,
+        'pokemon': totals[0],
+        'forts': totals[1],
+        'spawn_points': totals[2],
+        'db_items': db_proc.count,
+        'db_drain_seconds': round(drain_time, 2),
+        'requests': simulator.requests,
+        'notifications': simulator.notifications,
+        'forts_skipped': Worker.fingerprints.skipped if args.fingerprints else None
+    }
+    print('Replayed {responses} responses in {seconds}s ({responses_per_second}/s)\n'
+          'CPU: {cpu_seconds}s, {cpu_ms_per_response}ms per response\n'
+          'Seen: {pokemon} Pokemon, {forts} forts, {spawn_points} spawn points\n'
+          'DB items: {db_items}, drained in {db_drain_seconds}s\n'
+          'Requests: {requests}, notifications: {notifications}'.format(**results))
+    if args.fingerprints:
+        print('Forts skipped as unchanged: {forts_skipped}'.format(**results))
+    if args.json:
+        with open(args.json, 'wt') as f:
+            dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,23 +10,26 @@ try:
 except ImportError:
     pass
 
+from multiprocessing import Process
 from multiprocessing.managers import BaseManager, DictProxy
 from queue import Queue, Full
 from argparse import ArgumentParser
-from signal import signal, SIGINT, SIGTERM, SIG_IGN
+from signal import signal, SIGINT, SIGTERM
 from logging import getLogger, basicConfig, WARNING, INFO
 from logging.handlers import RotatingFileHandler
 from os.path import exists, join
 from sys import platform
+from threading import Thread
 from time import monotonic, sleep
 
 from sqlalchemy.exc import DBAPIError
 from aiopogo import close_sessions, activate_hash_server
 
 from monocle.shared import LOOP, get_logger, SessionManager, ACCOUNTS
-from monocle.utils import get_address, dump_pickle
+from monocle.utils import get_address
 from monocle.worker import Worker
-from monocle.overseer import Overseer
+from monocle.overseer import Overseer, queue_accounts
+from monocle.shards import Shard
 from monocle.db import GYM_CACHE, RAID_CACHE, POKESTOP_CACHE
 from monocle import altitudes, db_proc, spawns
 
@@ -60,7 +63,7 @@ class CustomQueue(Queue):
 
 _captcha_queue = CustomQueue()
 _extra_queue = Queue()
-_worker_dict = {}
+_shard_status = {}
 
 def get_captchas():
     return _captcha_queue
@@ -68,11 +71,26 @@ def get_captchas():
 def get_extras():
     return _extra_queue
 
-def get_workers():
-    return _worker_dict
+def get_shard_status():
+    return _shard_status
 
-def mgr_init():
-    signal(SIGINT, SIG_IGN)
+class LocalManager:
+    """Hands out this process's queues directly instead of proxies to them"""
+    captcha_queue = staticmethod(get_captchas)
+    extra_queue = staticmethod(get_extras)
+    shard_status = staticmethod(get_shard_status)
+
+
+def serve_manager(manager):
+    """Serve the queues to other processes from a thread of this one
+
+    solve_captchas.py and shard processes connect to the manager
+    address as before, but the scanner itself uses the queues without a
+    round trip to a manager process.
+    """
+    server = manager.get_server()
+    Thread(target=server.serve_forever, name='manager', daemon=True).start()
+    return server
 
 
 def parse_args():
@@ -100,6 +118,12 @@ def parse_args():
         help='Do not load spawns from pickle',
         action='store_false'
     )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=1,
+        help='Split the map and worker grid across this many scanner processes'
+    )
     return parser.parse_args()
 
 
@@ -126,9 +150,21 @@ def exception_handler(loop, context):
         print('Exception in exception handler.')
 
 
-def cleanup(overseer, manager):
+def register_manager():
+    AccountManager.register('captcha_queue', callable=get_captchas)
+    AccountManager.register('extra_queue', callable=get_extras)
+    AccountManager.register('shard_status', callable=get_shard_status,
+                            proxytype=DictProxy)
+
+
+def cleanup(overseer):
+    sharded = overseer.shard is not None
     try:
-        overseer.print_handle.cancel()
+        try:
+            overseer.print_handle.cancel()
+        except AttributeError:
+            # the status bar isn't shown
+            pass
         overseer.running = False
         print('Exiting, please wait until all tasks finish')
 
@@ -148,15 +184,23 @@ def cleanup(overseer, manager):
         LOOP.run_until_complete(overseer.cleanup())
 
         db_proc.stop()
-        overseer.refresh_dict()
+        if sharded:
+            # the parent process merges the returned accounts and dumps the pickles
+            overseer.return_accounts()
+            # accounts that were removed or benched aren't returned, save them here
+            ACCOUNTS.save()
+            if conf.CACHE_CELLS:
+                Worker.cells.close()
+        else:
+            overseer.refresh_dict()
 
-        print('Dumping pickles...')
-        dump_pickle('accounts', ACCOUNTS)
-        altitudes.pickle()
-        if conf.CACHE_CELLS:
-            dump_pickle('cells', Worker.cells)
+            print('Dumping pickles...')
+            ACCOUNTS.save()
+            altitudes.pickle()
+            if conf.CACHE_CELLS:
+                Worker.cells.close()
 
-        spawns.pickle()
+            spawns.pickle()
         while not db_proc.queue.empty():
             pending = db_proc.queue.qsize()
             # Spaces at the end are important, as they clear previously printed
@@ -165,13 +209,127 @@ def cleanup(overseer, manager):
             sleep(.5)
     finally:
         print('Closing pipes, sessions, and event loop...')
-        manager.shutdown()
         SessionManager.close()
         close_sessions()
         LOOP.close()
         print('Done.')
 
 
+def run(overseer, args):
+    LOOP.set_exception_handler(exception_handler)
+
+    overseer.start(args.status_bar)
+    launcher = LOOP.create_task(overseer.launch(args.bootstrap, args.pickle))
+    activate_hash_server(conf.HASH_KEY)
+
+    RAID_CACHE.preload()
+    POKESTOP_CACHE.preload()
+    GYM_CACHE.preload()
+
+    if platform != 'win32':
+        LOOP.add_signal_handler(SIGINT, launcher.cancel)
+        LOOP.add_signal_handler(SIGTERM, launcher.cancel)
+    try:
+        LOOP.run_until_complete(launcher)
+    except (KeyboardInterrupt, SystemExit):
+        launcher.cancel()
+    finally:
+        cleanup(overseer)
+
+
+def run_shard(index, total, args):
+    """Entry point of a child scanner process"""
+    configure_logger(filename=join(conf.DIRECTORY, 'scan-{}.log'.format(index)))
+    get_logger().setLevel(args.log_level)
+
+    register_manager()
+    manager = AccountManager(address=get_address(), authkey=conf.AUTHKEY)
+    manager.connect()
+
+    args.status_bar = False
+    run(Overseer(manager, shard=Shard(index, total)), args)
+
+
+def print_shard_status(status, total, _start=monotonic()):
+    output = ['\x1b[2J\x1b[HMonocle running for {:.0f}s with {} processes'.format(
+        monotonic() - _start, total)]
+    visits = skipped = redundant = seen = 0
+    for index in range(total):
+        try:
+            shard = status[index]
+        except KeyError:
+            output.append('\nProcess {}: starting'.format(index + 1))
+            continue
+        visits += shard['visits']
+        skipped += shard['skipped']
+        redundant += shard['redundant']
+        seen += shard['seen']
+        output.append(
+            '\nProcess {}: {} workers, {} coroutines, {} queued visits, {} DB items pending\n'
+            'Known spawns: {}, unknown: {}, visits: {}, skipped: {}, seen: {}{}'.format(
+                index + 1, shard['workers'], shard['coroutines'], shard['queued'],
+                shard['db_queue'], shard['known'], shard['unknown'], shard['visits'],
+                shard['skipped'], shard['seen'],
+                ', CAPTCHAs are needed to proceed.' if shard['paused'] else ''))
+        output.extend(shard['dots'])
+        output.extend('\t'.join(shard['messages'][i:i + 4])
+                      for i in range(0, len(shard['messages']), 4))
+    output.append('\nTotal visits: {}, skipped: {}, unnecessary: {}, seen: {}'.format(
+        visits, skipped, redundant, seen))
+    print('\n'.join(output))
+
+
+def run_shards(args):
+    """Start a scanner process per shard and aggregate their status"""
+    log = get_logger('shards')
+    queue_accounts(_captcha_queue, _extra_queue)
+    # shards save the accounts they change, which mustn't be overwritten later
+    ACCOUNTS.save()
+    status = _shard_status
+
+    processes = tuple(Process(target=run_shard, args=(i, args.processes, args),
+                              name='monocle-{}'.format(i))
+                      for i in range(args.processes))
+    for process in processes:
+        process.start()
+
+    def terminate(signum, frame):
+        for process in processes:
+            process.terminate()
+    if platform != 'win32':
+        signal(SIGTERM, terminate)
+
+    try:
+        while any(process.is_alive() for process in processes):
+            if args.status_bar:
+                try:
+                    print_shard_status(status, args.processes)
+                except Exception as e:
+                    log.exception('{} occurred while printing status.', e.__class__.__name__)
+            sleep(conf.REFRESH_RATE)
+    except KeyboardInterrupt:
+        print('Exiting, please wait until all processes finish')
+    finally:
+        for process in processes:
+            process.join()
+
+        # merge the accounts handed back by every shard
+        for queue in (_extra_queue, _captcha_queue):
+            while not queue.empty():
+                account = queue.get()
+                ACCOUNTS[account['username']] = account
+        print('Dumping pickles...')
+        ACCOUNTS.save()
+        altitudes.pickle()
+        try:
+            # each shard only knew its part of the map, reload all of it
+            spawns.update()
+            spawns.pickle()
+        except Exception as e:
+            log.exception('A wild {} appeared while pickling spawns!', e.__class__.__name__)
+        print('Done.')
+
+
 def main():
     args = parse_args()
     log = get_logger()
@@ -183,41 +341,23 @@ def main():
         configure_logger(filename=None)
     log.setLevel(args.log_level)
 
-    AccountManager.register('captcha_queue', callable=get_captchas)
-    AccountManager.register('extra_queue', callable=get_extras)
-    if conf.MAP_WORKERS:
-        AccountManager.register('worker_dict', callable=get_workers,
-                                proxytype=DictProxy)
+    register_manager()
     address = get_address()
     manager = AccountManager(address=address, authkey=conf.AUTHKEY)
     try:
-        manager.start(mgr_init)
+        serve_manager(manager)
     except (OSError, EOFError) as e:
         if platform == 'win32' or not isinstance(address, str):
             raise OSError('Another instance is running with the same manager address. Stop that process or change your MANAGER_ADDRESS.') from e
         else:
             raise OSError('Another instance is running with the same socket. Stop that process or: rm {}'.format(address)) from e
 
-    LOOP.set_exception_handler(exception_handler)
-
-    overseer = Overseer(manager)
-    overseer.start(args.status_bar)
-    launcher = LOOP.create_task(overseer.launch(args.bootstrap, args.pickle))
-    activate_hash_server(conf.HASH_KEY)
-
-    RAID_CACHE.preload()
-    POKESTOP_CACHE.preload()
-    GYM_CACHE.preload()
-
-    if platform != 'win32':
-        LOOP.add_signal_handler(SIGINT, launcher.cancel)
-        LOOP.add_signal_handler(SIGTERM, launcher.cancel)
-    try:
-        LOOP.run_until_complete(launcher)
-    except (KeyboardInterrupt, SystemExit):
-        launcher.cancel()
-    finally:
-        cleanup(overseer, manager)
+    if args.processes > 1:
+        if conf.LEASE_PARTITIONS:
+            raise ValueError('LEASE_PARTITIONS cannot be combined with --processes.')
+        run_shards(args)
+    else:
+        run(Overseer(LocalManager()), args)
 
 
 if __name__ == '__main__':
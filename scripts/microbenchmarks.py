@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmarks for the code that runs for every visit or sighting.
+
+Prints the time per operation of each benchmark and optionally writes them
+to a JSON file, which can be compared against a later run with --compare.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+from asyncio import Lock
+from pathlib import Path
+from random import Random
+
+from aiopogo.pogoprotos.map.pokemon.wild_pokemon_pb2 import WildPokemon
+from aiopogo.pogoprotos.map.fort.fort_data_pb2 import FortData
+from aiopogo.pogoprotos.map.fort.fort_type_pb2 import GYM, CHECKPOINT
+
+MONOCLE_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(MONOCLE_DIR))
+#pylint:disable=wrong-import-position
+from monocle import bounds, spawns, sanitized as conf
+from monocle.db import MYSTERY_CACHE, POKESTOP_CACHE, RAID_CACHE, SIGHTING_CACHE, combine_key
+from monocle.notifier import Notifier
+from monocle.overseer import Overseer
+from monocle.positions import WorkerPositions
+from monocle.shared import LOOP
+from monocle.worker import Worker
+
+
+RNG = Random(0)
+# number of distinct inputs each benchmark cycles through
+SAMPLES = 1000
+
+
+def parse_command_line():
+    """Parse command line options.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-o', '--output',
+        help='write the results to this JSON file'
+    )
+    parser.add_argument(
+        '-c', '--compare',
+        help='compare the results with those in this JSON file'
+    )
+    parser.add_argument(
+        '-f', '--filter',
+        help='only run benchmarks whose names contain this'
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=5,
+        help='number of times to repeat each benchmark, the fastest is kept'
+    )
+    return parser.parse_args()
+
+
+def module_namespace(instance):
+    """Return the globals of a module that replaced itself with an instance.
+    """
+    return type(instance).__init__.__globals__
+
+
+def random_point():
+    return (RNG.uniform(bounds.south, bounds.north),
+            RNG.uniform(bounds.west, bounds.east))
+
+
+def make_wild(now_ms, known=True):
+    lat, lon = random_point()
+    wild = WildPokemon(
+        encounter_id=RNG.getrandbits(63),
+        last_modified_timestamp_ms=now_ms,
+        latitude=lat,
+        longitude=lon,
+        spawn_point_id='{:x}'.format(RNG.getrandbits(40) | 1 << 40),
+        time_till_hidden_ms=RNG.randint(1000, 89000) if known else -1,
+        )
+    wild.pokemon_data.pokemon_id = RNG.randint(1, 386)
+    return wild
+
+
+def make_fort(now_ms, gym=False, raid=False):
+    lat, lon = random_point()
+    fort = FortData(
+        id='{:032x}.16'.format(RNG.getrandbits(128)),
+        latitude=lat,
+        longitude=lon,
+        enabled=True,
+        last_modified_timestamp_ms=now_ms,
+        type=GYM if gym else CHECKPOINT,
+        )
+    if gym:
+        fort.owned_by_team = RNG.randint(0, 3)
+        fort.gym_display.slots_available = RNG.randint(0, 5)
+    if raid:
+        fort.raid_info.raid_seed = RNG.getrandbits(63)
+        fort.raid_info.raid_spawn_ms = now_ms
+        fort.raid_info.raid_battle_ms = now_ms + 3600000
+        fort.raid_info.raid_end_ms = now_ms + 5400000
+        fort.raid_info.raid_level = RNG.randint(1, 5)
+        fort.raid_info.raid_pokemon.pokemon_id = RNG.randint(1, 386)
+    return fort
+
+
+def each(function, inputs):
+    """Return a callable that calls function once with every input.
+    """
+    def run():
+        for args in inputs:
+            function(*args)
+    return run
+
+
+def normalize_benchmarks():
+    now_ms = int(time.time() * 1000)
+    known = [(make_wild(now_ms),) for _ in range(SAMPLES)]
+    unknown = [(make_wild(now_ms, known=False),) for _ in range(SAMPLES)]
+    gym_info = {'name': 'Gym', 'url': 'https://example.com/gym.jpg', 'desc': 'A gym'}
+    gyms = [(make_fort(now_ms, gym=True), gym_info) for _ in range(SAMPLES)]
+    raids = [(make_fort(now_ms, gym=True, raid=True),) for _ in range(SAMPLES)]
+    yield 'normalize_pokemon.known', each(Worker.normalize_pokemon, known), SAMPLES
+    yield 'normalize_pokemon.unknown', each(Worker.normalize_pokemon, unknown), SAMPLES
+    yield 'normalize_gym', each(Worker.normalize_gym, gyms), SAMPLES
+    yield 'normalize_raid', each(Worker.normalize_raid, raids), SAMPLES
+
+
+def cache_benchmarks(size=20000):
+    now_ms = int(time.time() * 1000)
+    now = now_ms // 1000
+
+    # populate the stores directly, adding would schedule removals on the loop
+    sightings = [Worker.normalize_pokemon(make_wild(now_ms)) for _ in range(size)]
+    for sighting in sightings:
+        SIGHTING_CACHE.store[sighting['spawn_id']] = sighting['expire_timestamp']
+    mysteries = [{'encounter_id': RNG.getrandbits(63), 'spawn_id': RNG.getrandbits(40),
+                  'seen': now} for _ in range(size)]
+    for mystery in mysteries:
+        MYSTERY_CACHE.store[combine_key(mystery)] = [now, now]
+    raids = [make_fort(now_ms, gym=True, raid=True) for _ in range(size)]
+    for raid in raids:
+        RAID_CACHE.store[raid.id] = {
+            'fort_external_id': raid.id,
+            'time_end': raid.raid_info.raid_end_ms // 1000,
+            'pokemon_id': raid.raid_info.raid_pokemon.pokemon_id}
+    pokestops = [make_fort(now_ms) for _ in range(size)]
+    for pokestop in pokestops:
+        POKESTOP_CACHE.store[pokestop.id] = {
+            'external_id': pokestop.id, 'name': 'Pokestop', 'lat': pokestop.latitude,
+            'lon': pokestop.longitude, 'lure_start': 0}
+
+    def contains(cache, hits, misses):
+        inputs = [(x,) for x in RNG.sample(hits, SAMPLES // 2) + misses[:SAMPLES // 2]]
+        RNG.shuffle(inputs)
+        return each(cache.__contains__, inputs)
+
+    yield ('SIGHTING_CACHE.contains', contains(SIGHTING_CACHE, sightings,
+           [Worker.normalize_pokemon(make_wild(now_ms)) for _ in range(SAMPLES)]), SAMPLES)
+    yield ('MYSTERY_CACHE.contains', contains(MYSTERY_CACHE, mysteries,
+           [{'encounter_id': RNG.getrandbits(63), 'spawn_id': RNG.getrandbits(40), 'seen': now}
+            for _ in range(SAMPLES)]), SAMPLES)
+    yield ('RAID_CACHE.contains', contains(RAID_CACHE, raids,
+           [make_fort(now_ms, gym=True, raid=True) for _ in range(SAMPLES)]), SAMPLES)
+    yield ('POKESTOP_CACHE.contains', contains(POKESTOP_CACHE, pokestops,
+           [make_fort(now_ms) for _ in range(SAMPLES)]), SAMPLES)
+
+
+def bounds_benchmarks():
+    namespace = module_namespace(bounds)
+    points = [(random_point(),) for _ in range(SAMPLES)]
+    rect = namespace['RectBounds']()
+    yield 'bounds.RectBounds.contains', each(rect.__contains__, points), SAMPLES
+
+    try:
+        from shapely.geometry import MultiPolygon, Point, Polygon
+        from shapely.prepared import prep
+    except ImportError:
+        print('shapely is not available, skipping polygon bounds.')
+        return
+    # PolyBounds only imports these if BOUNDARIES is set
+    namespace.setdefault('Point', Point)
+    namespace.setdefault('prep', prep)
+    PolyBounds = namespace['PolyBounds']
+    MultiPolyBounds = namespace['MultiPolyBounds']
+
+    south, west, north, east = rect.south, rect.west, rect.north, rect.east
+    middle = (west + east) / 2
+    # jagged outlines, a square would be too easy
+    left = Polygon([(south, west), (north, west), (north, middle)]
+                   + [(south + (north - south) * i / 40, middle - (middle - west) * (i % 2) / 4)
+                      for i in range(40, 0, -1)])
+    right = Polygon([(south, middle), (north, middle), (north, east), (south, east)])
+    poly = PolyBounds(left)
+    yield 'bounds.PolyBounds.contains', each(poly.__contains__, points), SAMPLES
+
+    multipolygon = MultiPolygon([left, right])
+    multi = MultiPolyBounds.__new__(MultiPolyBounds)
+    PolyBounds.__init__(multi, multipolygon)
+    multi.multi = True
+    multi.polygons = [PolyBounds(x) for x in multipolygon.geoms]
+    yield 'bounds.MultiPolyBounds.contains', each(multi.__contains__, points), SAMPLES
+
+
+def best_worker_benchmarks(sizes=(100, 1000, 5000)):
+    points = [(random_point(),) for _ in range(SAMPLES // 10)]
+    now = time.time()
+    for size in sizes:
+        Worker.positions = None
+        positions = WorkerPositions(range(size), Worker.scan_delay) if WorkerPositions.available() else None
+        workers = []
+        for worker_no in range(size):
+            worker = Worker.__new__(Worker)
+            worker.worker_no = worker_no
+            worker.busy = Lock(loop=LOOP)
+            Worker.positions = positions
+            worker.location = random_point()
+            worker.last_request = now - RNG.uniform(10, 120)
+            workers.append(worker)
+        overseer = Overseer.__new__(Overseer)
+        overseer.workers = tuple(workers)
+
+        Worker.positions = None
+        yield ('best_worker.loop[{}]'.format(size),
+               each(overseer.find_worker, points), len(points))
+        if positions is not None:
+            Worker.positions = positions
+            yield ('best_worker.vectorized[{}]'.format(size),
+                   each(overseer.find_worker_vectorized, points), len(points))
+    Worker.positions = None
+
+
+def have_point_benchmarks(known=20000, unknown=2000, cells=5000):
+    MoreSpawns = module_namespace(spawns)['MoreSpawns']
+    more_spawns = MoreSpawns()
+    points = [random_point() for _ in range(known + unknown + cells)]
+    for point in points[:known]:
+        more_spawns.known[point] = None
+    more_spawns.unknown.update(points[known:known + unknown])
+    more_spawns.cell_points.update(points[known + unknown:])
+    inputs = [(x,) for x in RNG.sample(points, SAMPLES // 20)]
+    inputs.extend((random_point(),) for _ in range(SAMPLES // 20))
+    yield 'spawns.have_point', each(more_spawns.have_point, inputs), len(inputs)
+
+
+def notifier_benchmarks():
+    notifier = Notifier(loop=LOOP)
+    if not notifier._channelmap:
+        print('No notification channels are configured, notifier benchmarks only cover the empty path.')
+    now_ms = int(time.time() * 1000)
+    pokemon = [(Worker.normalize_pokemon(make_wild(now_ms)),) for _ in range(SAMPLES)]
+    yield 'notifier.spawn_eligible', each(notifier.spawn_eligible, pokemon), SAMPLES
+
+
+BENCHMARKS = (
+    normalize_benchmarks,
+    cache_benchmarks,
+    bounds_benchmarks,
+    best_worker_benchmarks,
+    have_point_benchmarks,
+    notifier_benchmarks,
+)
+
+
+def measure(function, operations, repeat):
+    """Return the fastest time per operation in nanoseconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / operations * 1e9
+
+
+def main():
+    """Program entry point.
+    """
+    options = parse_command_line()
+    previous = {}
+    if options.compare:
+        with open(options.compare) as f:
+            previous = json.load(f)['results']
+
+    results = {}
+    for group in BENCHMARKS:
+        for name, function, operations in group():
+            if options.filter and options.filter not in name:
+                continue
+            nanoseconds = measure(function, operations, options.repeat)
+            results[name] = round(nanoseconds, 1)
+            line = '{:<36} {:>14,.1f} ns'.format(name, nanoseconds)
+            if name in previous:
+                line += '  {:+.1%}'.format(nanoseconds / previous[name] - 1)
+            print(line)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'time': round(time.time()),
+                'results': results
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
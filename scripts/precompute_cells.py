@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+import sys
+
+from pathlib import Path
+from time import monotonic
+
+monocle_dir = Path(__file__).resolve().parents[1]
+sys.path.append(str(monocle_dir))
+
+from monocle.cells import CellTable
+
+try:
+    from pogeo import get_cell_ids_compact as get_cell_ids
+except ImportError:
+    from pogeo import get_cell_ids
+
+table = CellTable(get_cell_ids)
+if table.map is None:
+    raise SystemExit('The cell ID table is not available for this map, see scan.log.')
+
+print('Calculating cell IDs for {} points...'.format(table.rows * table.columns))
+start = monotonic()
+filled = table.fill()
+print('Calculated {} in {:.1f}s, the others were already known.'.format(filled, monotonic() - start))
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 
-from pickle import load
+import sys
+
 from pprint import PrettyPrinter
 from pathlib import Path
 from datetime import datetime
 
-pickle_path = Path(__file__).resolve().parents[1] / 'pickles' / 'accounts.pickle'
+monocle_dir = Path(__file__).resolve().parents[1]
+sys.path.append(str(monocle_dir))
+
+from monocle.accounts import AccountStore
 
-with pickle_path.open('rb') as f:
-    accounts = load(f)
+accounts = dict(AccountStore(monocle_dir / 'pickles' / 'accounts.sqlite'))
 
 for account in accounts.values():
     if 'time' in account:
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
-from pickle import load
-from pprint import PrettyPrinter
+import sys
+
 from pathlib import Path
 
-pickle_path = Path(__file__).resolve().parents[1] / 'pickles' / 'accounts.pickle'
+monocle_dir = Path(__file__).resolve().parents[1]
+sys.path.append(str(monocle_dir))
+
+from monocle.accounts import AccountStore
 
-with pickle_path.open('rb') as f:
-    accounts = load(f)
+accounts = AccountStore(monocle_dir / 'pickles' / 'accounts.sqlite')
 
 for username, account in accounts.items():
     if 'level' in account:
@@ -33,7 +33,7 @@ setup(
         'landmarks': ['shapely>=1.3.0'],
         'boundaries': ['shapely>=1.3.0'],
         'manual_captcha': ['selenium>=3.0'],
-        'performance': ['uvloop>=0.7.0', 'cchardet>=1.1.0', 'aiodns>=1.1.0', 'ujson>=1.35'],
+        'performance': ['uvloop>=0.7.0', 'cchardet>=1.1.0', 'aiodns>=1.1.0', 'ujson>=1.35', 'numpy>=1.11'],
         'mysql': ['mysqlclient>=1.3'],
         'postgres': ['psycopg2>=2.6'],
         'images': ['pycairo>=1.10.0'],
@@ -71,7 +71,7 @@ async def main():
             try:
                 alt = altitudes.get((lat, lon))
             except KeyError:
-                alt = await altitudes.fetch((lat, lon))
+                alt = altitudes.fallback()
 
             try:
                 device_info = get_device_info(account)
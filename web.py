@@ -120,7 +120,8 @@ if conf.MAP_WORKERS:
 
     @app.route('/workers_data')
     def workers_data():
-        return jsonify(get_worker_markers(workers))
+        since = request.args.get('since', 0, type=float)
+        return jsonify(get_worker_markers(workers, since))
 
 
     @app.route('/workers')
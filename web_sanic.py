@@ -82,7 +82,11 @@ if conf.MAP_WORKERS:
 
     @app.get('/workers_data')
     async def workers_data(request):
-        return json(get_worker_markers(workers))
+        try:
+            since = float(request.args.get('since', 0))
+        except ValueError:
+            since = 0
+        return json(get_worker_markers(workers, since))
 
 
     @app.get('/workers')